@@ -0,0 +1,122 @@
+import argparse
+import json
+import re
+from collections import ChainMap
+
+from deck_registry import DeckRegistry, deck_argument, keyword_of
+from keyword_table import KeywordTable
+
+try:
+    from metaphone import doublemetaphone  # pip install metaphone
+except ImportError:
+    doublemetaphone = None
+
+#Compiles the answer matching index used by the quiz (script.js).
+#Instead of building the cartesian product of every name, alias and plural of
+#every expanded group on each question, the quiz resolves the spoken words to
+#component ids with one phrase table and compares the result with the accepted
+#answers of the character, stored as sorted id lists (multisets).
+#The phonetic fallback works the same way on Double Metaphone codes, which are
+#computed here once for every name instead of in the browser on every answer.
+#Components from other decks ("<deck>::<keyword>") are answered with their
+#keyword and aliases from that deck.
+#  python answer_index.py [--deck ID]  ->  answer_index.json of the deck
+
+index_filename = "answer_index.json"
+
+
+def strip_punct(text):
+    """Same normalisation as stripPunct in script.js."""
+    return re.sub(r"[.,!?;:]", "", text).lower()
+
+
+def guess_plurals(word):
+    """Guessed plural forms of a word (at most 3)."""
+    guesses = [word + "s"]
+    lower = word.lower()
+    if re.search(r"(s|x|z|ch|sh)$", lower):
+        guesses.append(word + "es")
+    if re.search(r"[^aeiou]y$", lower):
+        guesses.append(word[:-1] + "ies")
+    if re.search(r"fe?$", lower):
+        guesses.append(re.sub(r"fe?$", "ves", word, count=1))
+    return list(dict.fromkeys(guesses))[:3]
+
+
+def names_of(component, database):
+    """Keyword, aliases and guessed plurals a component can be answered with."""
+    names = [keyword_of(component)] + list(database.get(component, {}).get("Aliases", []))
+    extended = list(names)
+    for name in names:
+        extended.extend(guess_plurals(name))
+    return list(dict.fromkeys(extended))
+
+
+def phonetic_key(name):
+    """Primary Double Metaphone code of every spoken word of a name, joined by spaces."""
+    words = strip_punct(re.sub(r"\(.*?\)", "", name)).split()
+    codes = [doublemetaphone(word)[0] for word in words]
+    return " ".join(code for code in codes if code)
+
+
+def build_answer_index(database, references=None):
+    """
+    Returns the index as a JSON-able dict:
+      components: id -> keyword
+      phrases:    normalised spoken phrase -> ids of the components it names
+      answers:    keyword -> accepted answers as sorted id lists
+      phonetic:   phonetic key of a name -> ids of the components it names
+                  (left out if the metaphone package is not installed)
+    references: entries of other decks the components point at (DeckRegistry.references)
+    """
+    table = KeywordTable()
+    answers = {}
+    for key, entry in database.items():
+        groups = entry.get("expanded_components", [])
+        answers[key] = [sorted(table.encode(group)) for group in groups]
+    if references:
+        database = ChainMap(database, references) # for the names of the components
+
+    phrases = {}
+    for component_id, component in enumerate(table.keywords):
+        for name in names_of(component, database):
+            ids = phrases.setdefault(strip_punct(name), [])
+            if component_id not in ids:
+                ids.append(component_id)
+
+    index = {"components": table.keywords, "phrases": phrases, "answers": answers}
+
+    if doublemetaphone is not None:
+        phonetic = {}
+        for component_id, component in enumerate(table.keywords):
+            for name in names_of(component, database):
+                key = phonetic_key(name)
+                if not key:
+                    continue
+                ids = phonetic.setdefault(key, [])
+                if component_id not in ids:
+                    ids.append(component_id)
+        index["phonetic"] = phonetic
+    else:
+        print("⚠ metaphone is not installed, the answer index has no phonetic fallback")
+    return index
+
+
+def write_answer_index(database, filename=index_filename, references=None):
+    index = build_answer_index(database, references)
+    with open(filename, "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False, separators=(",", ":"))
+    return index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile the answer matching index of a deck")
+    deck_argument(parser)
+    args = parser.parse_args()
+
+    with DeckRegistry() as registry:
+        database = registry.store(args.deck).load()
+        references = registry.references(args.deck, database)
+        filename = registry.deck_path(args.deck, index_filename)
+    index = write_answer_index(database, filename, references)
+    print(f"✅ {len(index['answers'])} characters, {len(index['phrases'])} phrases written to {filename}")
@@ -0,0 +1,334 @@
+import argparse
+import gc
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmark_expansion import expandable, synthetic_database
+from component_cleanup import clean_obsoletes
+from component_graph import ComponentGraph, CycleError
+from database_store import DatabaseStore
+from decomposition import decompose
+from expansion import Expander, compile_graph
+
+#Benchmark suite for the database pipeline.
+#Every stage runs a few times on the real database and on synthetic Heisig-like
+#decks (benchmark_expansion.synthetic_database) of 1x, 10x and 100x its size. The
+#fastest and the median time are reported, the peak memory (tracemalloc) comes from
+#one more run. Each stage runs in its own forked process, so a stage that runs out
+#of time or memory is recorded as such instead of ending the suite. The results go
+#to a JSON file, --compare prints the change against the file of an earlier commit.
+#  python benchmark.py --json bench.json
+#  python benchmark.py --scales 1 10 --depth 5 --fanout 3 --compare bench.json
+
+BASE_SIZE = 3228 # entries of the real database, synthetic decks are multiples of it
+# Smaller differences are noise and never count as a regression
+NOISE_SECONDS = 0.001
+NOISE_BYTES = 1_000_000
+
+STAGES = {}
+
+
+def stage(name):
+    """
+    Register a stage. The function gets the BenchmarkDeck, does the setup that is
+    not timed and returns the timed run() -> dict of counts for the report.
+    It is called again before every run, so run() may change what it gets.
+    """
+    def register(setup):
+        STAGES[name] = {"setup": setup, "description": (setup.__doc__ or "").strip()}
+        return setup
+    return register
+
+
+class BenchmarkDeck:
+    """
+    A database for the benchmark in its own temporary directory (database.json and
+    the synchronised store), so the stages never touch the real files.
+    """
+
+    def __init__(self, name, database, info):
+        self.name = name
+        self.database = database
+        self.info = dict(info, entries=len(database))
+        self.directory = tempfile.mkdtemp(prefix="benchmark_")
+        self.json_path = os.path.join(self.directory, "database.json")
+        with open(self.json_path, "w", encoding="utf-8") as f:
+            json.dump(database, f, ensure_ascii=False, indent=2)
+        DatabaseStore(self.json_path).close()
+
+    def close(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self.database = None # the next deck can be large
+
+
+# -------------------- Stages --------------------
+
+@stage("load")
+def load_stage(deck):
+    """Open the store and load every entry (DatabaseStore.load)."""
+    def run():
+        with DatabaseStore(deck.json_path) as store:
+            return {"entries": len(store.load())}
+    return run
+
+
+@stage("view")
+def view_stage(deck):
+    """Open the store and read one entry through the compiled deck (DatabaseStore.view)."""
+    with DatabaseStore(deck.json_path) as store:
+        store.view().close() # builds the deck file once
+    key = next(iter(deck.database))
+
+    def run():
+        with DatabaseStore(deck.json_path) as store:
+            view = store.view()
+            entry = dict(view[key])
+            view.close()
+        return {"fields": len(entry)}
+    return run
+
+
+@stage("dump")
+def dump_stage(deck):
+    """Export the store: database.json, the content build and the deck file (DatabaseStore.export)."""
+    store = DatabaseStore(deck.json_path)
+
+    def run():
+        store.export(force=True)
+        store.close()
+        return {"entries": len(deck.database)}
+    return run
+
+
+@stage("build_tree")
+def build_tree_stage(deck):
+    """Component graph with transitive closure, cycle check and topological order (compile_graph)."""
+    def run():
+        try:
+            return {"nodes": len(compile_graph(deck.database).order)}
+        except CycleError as error:
+            return {"cycles": len(error.cycles)}
+    return run
+
+
+@stage("decompose")
+def decompose_stage(deck):
+    """Decomposition tree of every entry from its primary components (decompose)."""
+    edges = {key: [c for group in entry.get("primary_components", []) for c in group if c != key]
+             for key, entry in deck.database.items()}
+    graph = ComponentGraph(edges)
+
+    def run():
+        return {"trees": sum(1 for key in edges if decompose(key, edges, graph))}
+    return run
+
+
+@stage("expand")
+def expand_stage(deck):
+    """Every answer of every entry (Expander.prepare and expand, like create expanded components.py)."""
+    try:
+        graph = compile_graph(deck.database)
+    except CycleError:
+        graph = None # like create expanded components.py without --strict
+    keys = expandable(deck.database)
+
+    def run():
+        expander = Expander(deck.database, graph)
+        if graph is not None:
+            expander.prepare(keys)
+        return {"keys": len(keys), "answers": sum(len(expander.expand(key)) for key in keys)}
+    return run
+
+
+@stage("clean_obsoletes")
+def clean_obsoletes_stage(deck):
+    """Drop answer groups that are a strict subset of another one (clean_obsoletes on expanded_components)."""
+    database = {key: {"expanded_components": [list(group) for group in entry.get("expanded_components", [])]}
+                for key, entry in deck.database.items()}
+
+    def run():
+        return {"modified": len(clean_obsoletes(database, field="expanded_components"))}
+    return run
+
+
+# -------------------- Engine --------------------
+
+def measure(name, deck, repeat):
+    """Time a stage repeat times, then take its peak memory in one more run."""
+    setup = STAGES[name]["setup"]
+    seconds = []
+    for _ in range(repeat):
+        run = setup(deck)
+        gc.collect()
+        start = time.perf_counter()
+        result = run()
+        seconds.append(time.perf_counter() - start)
+        del run
+    run = setup(deck)
+    gc.collect()
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    ordered = sorted(seconds)
+    return {
+        "seconds": ordered[0],
+        "median": ordered[len(ordered) // 2],
+        "runs": seconds,
+        "peak_bytes": peak,
+        "result": result,
+    }
+
+
+def _measure_in_child(sender, name, deck, repeat):
+    try:
+        sender.send(measure(name, deck, repeat))
+    except Exception as error:
+        sender.send({"error": f"{type(error).__name__}: {error}"})
+    sender.close()
+
+
+def measure_isolated(name, deck, repeat, timeout):
+    """measure() in a forked process, a timeout or a crash (e.g. out of memory) becomes an error entry."""
+    if "fork" not in multiprocessing.get_all_start_methods():
+        try:
+            return measure(name, deck, repeat)
+        except Exception as error:
+            return {"error": f"{type(error).__name__}: {error}"}
+
+    context = multiprocessing.get_context("fork") # the deck is inherited, not pickled
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=_measure_in_child, args=(sender, name, deck, repeat))
+    process.start()
+    sender.close()
+    result = None
+    if receiver.poll(timeout):
+        try:
+            result = receiver.recv()
+        except EOFError:
+            pass # the process died without an answer
+    else:
+        result = {"error": f"timeout after {timeout} s"}
+    process.join(5)
+    if process.is_alive():
+        process.kill()
+        process.join()
+    if result is None:
+        reason = " (killed, most likely out of memory)" if process.exitcode == -9 else ""
+        result = {"error": f"exit code {process.exitcode}{reason}"}
+    return result
+
+
+def git_commit():
+    try:
+        output = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.stdout.strip()
+
+
+def compare(old, new, tolerance):
+    """Print the change of every stage in both reports, returns the number of regressions."""
+    regressions = 0
+    for deck_name, deck in new["decks"].items():
+        old_deck = old.get("decks", {}).get(deck_name)
+        if old_deck is None:
+            continue
+        print(f"{deck_name} (against {old.get('commit') or 'the old report'})")
+        for name, result in deck["stages"].items():
+            before = old_deck["stages"].get(name)
+            if before is None or "error" in before or "error" in result:
+                continue
+            time_ratio = result["seconds"] / before["seconds"] if before["seconds"] else 1.0
+            memory_ratio = result["peak_bytes"] / before["peak_bytes"] if before["peak_bytes"] else 1.0
+            slower_time = time_ratio > 1 + tolerance and result["seconds"] - before["seconds"] > NOISE_SECONDS
+            more_memory = memory_ratio > 1 + tolerance and result["peak_bytes"] - before["peak_bytes"] > NOISE_BYTES
+            slower = slower_time or more_memory
+            faster = time_ratio < 1 / (1 + tolerance) and before["seconds"] - result["seconds"] > NOISE_SECONDS
+            marker = "⚠" if slower else "✅" if faster else " "
+            regressions += slower
+            print(f"{marker} {name:16s} time {time_ratio:6.2f}x  memory {memory_ratio:6.2f}x")
+    return regressions
+
+
+def benchmark_decks(database_path, scales, depth, fanout, seed):
+    """The real database (if given), then one synthetic deck per scale, generated when its turn comes."""
+    if database_path:
+        with open(database_path, "r", encoding="utf-8") as f:
+            yield BenchmarkDeck(os.path.basename(database_path), json.load(f), {"path": database_path})
+    for scale in scales:
+        name = f"synthetic x{scale} depth {depth} fanout {fanout}"
+        database = synthetic_database(BASE_SIZE * scale, depth, fanout, seed)
+        yield BenchmarkDeck(name, database, {"scale": scale, "depth": depth, "fanout": fanout, "seed": seed})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time and memory of the database pipeline stages")
+    parser.add_argument("--database", default="database.json", help="real database to include ('' to skip it)")
+    parser.add_argument("--scales", type=int, nargs="*", default=[1, 10, 100],
+                        help=f"synthetic deck sizes as multiples of {BASE_SIZE} entries")
+    parser.add_argument("--depth", type=int, default=4, help="levels of the synthetic decomposition DAG")
+    parser.add_argument("--fanout", type=int, default=2, help="components per synthetic character")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES), help="only run these stages")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per stage")
+    parser.add_argument("--timeout", type=float, default=600, help="seconds per stage before it is stopped")
+    parser.add_argument("--json", metavar="FILE", default="benchmark.json", help="where the results are written")
+    parser.add_argument("--compare", metavar="FILE", help="earlier results to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="relative slow down (time or memory) that counts as a regression")
+    parser.add_argument("--list", action="store_true", help="list the stages and exit")
+    args = parser.parse_args()
+
+    if args.list:
+        for name, info in STAGES.items():
+            print(f"{name:16s} {info['description']}")
+        sys.exit(0)
+
+    stages = args.stages or list(STAGES)
+    report = {
+        "commit": git_commit(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "decks": {},
+    }
+
+    for deck in benchmark_decks(args.database, args.scales, args.depth, args.fanout, args.seed):
+        print(f"\n{deck.name}: {deck.info['entries']} entries")
+        results = {}
+        try:
+            for name in stages:
+                result = results[name] = measure_isolated(name, deck, args.repeat, args.timeout)
+                if "error" in result:
+                    print(f"❌ {name:16s} {result['error']}")
+                else:
+                    counts = ", ".join(f"{k} {v}" for k, v in result["result"].items())
+                    print(f"  {name:16s} {result['seconds'] * 1000:10.1f} ms (median {result['median'] * 1000:.1f})"
+                          f"  peak {result['peak_bytes'] / 1e6:8.1f} MB  {counts}")
+        finally:
+            deck.close()
+        report["decks"][deck.name] = dict(deck.info, stages=results)
+
+    with open(args.json, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n✅ results written to {args.json}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        print()
+        regressions = compare(baseline, report, args.tolerance)
+        if regressions:
+            print(f"❌ {regressions} stage(s) slower than the tolerance of {args.tolerance:.0%}")
+            sys.exit(1)
@@ -0,0 +1,127 @@
+import argparse
+import json
+import os
+import random
+import time
+
+from expansion import Expander, available_cores, children_of, expand_parallel, parallel_plan
+
+#Compares the serial and the process pool expansion on the real database or on
+#a synthetic deck that is several times larger. With --min-speedup it is a check:
+#it fails when the parallel run is not that much faster or its output differs.
+#  python benchmark_expansion.py --scale 10 --workers 4
+#  python benchmark_expansion.py --scale 3 --workers 4 --min-speedup 1.5
+
+
+def synthetic_database(size, depth=4, fanout=2, seed=0):
+    """
+    A Heisig-like decomposition DAG: the first level are atomic characters, every
+    further level is built from fanout components of the level below. The entries
+    have the fields of the real database, expanded_components holds made up answers
+    (see synthetic_answers).
+    """
+    rng = random.Random(seed)
+    per_level = max(1, size // (depth + 1))
+    database = {}
+    previous = []
+    for level in range(depth + 1):
+        current = []
+        for i in range(per_level):
+            key = f"l{level}:{i}"
+            if level == 0:
+                primary_components = [[key]]
+            else:
+                primary_components = [rng.sample(previous, min(fanout, len(previous)))]
+            number = str(len(database) + 1)
+            database[key] = {
+                "hanzi": chr(0x4E00 + len(database) % 0x5000),
+                "Aliases": [],
+                "isHanzi": True,
+                "isActive": True,
+                "Number": number,
+                "Sequenz": number,
+                "primary_components": primary_components,
+                "expanded_components": synthetic_answers(key, primary_components[0], database, rng),
+            }
+            current.append(key)
+        previous = current
+    return database
+
+
+def synthetic_answers(key, group, database, rng):
+    """
+    Answers like in expanded_components without expanding: the group, the group with
+    one component replaced by its own components and, now and then, a strict subset
+    (obsolete) and the group in another order (duplicate) for the clean up passes.
+    """
+    if group == [key]:
+        return [[key]]
+    answers = [list(group)]
+    for i, component in enumerate(group):
+        children = database[component]["primary_components"][0]
+        if children != [component]:
+            answers.append(group[:i] + children + group[i + 1:])
+    if len(group) > 1 and rng.random() < 0.3:
+        answers.append(group[:-1])
+    if rng.random() < 0.3:
+        answers.append(group[::-1])
+    return answers
+
+
+def expandable(database):
+    return [key for key, entry in database.items() if entry["primary_components"] != [[key]]]
+
+
+def time_serial(database, keys):
+    start = time.perf_counter()
+    expander = Expander(database)
+    results = {key: expander.expand(key) for key in keys}
+    return time.perf_counter() - start, results
+
+
+def time_parallel(database, keys, workers):
+    start = time.perf_counter()
+    results = expand_parallel(database, keys, workers)
+    return time.perf_counter() - start, results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serial vs parallel expansion benchmark")
+    parser.add_argument("--database", help="expand a JSON database instead of a synthetic deck")
+    parser.add_argument("--scale", type=int, default=10, help="synthetic deck size as multiple of 3228 entries")
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--fanout", type=int, default=2)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--min-speedup", type=float, help="fail below this speedup (needs as many cores as workers)")
+    args = parser.parse_args()
+
+    if args.database:
+        with open(args.database, "r", encoding="utf-8") as f:
+            database = json.load(f)
+    else:
+        database = synthetic_database(3228 * args.scale, args.depth, args.fanout)
+    keys = expandable(database)
+
+    serial_time, serial_results = time_serial(database, keys)
+    parallel_time, parallel_results = time_parallel(database, keys, args.workers)
+
+    levels, owner = parallel_plan(database, keys, args.workers)
+    sent = {child for node, worker in owner.items() for child in children_of(node, database)
+            if child in owner and owner[child] != worker}
+    speedup = serial_time / parallel_time
+    identical = serial_results == parallel_results
+
+    print(f"{len(keys)} keys expanded, {len(owner)} nodes in {len(levels)} levels, "
+          f"{len(sent)} passed between workers")
+    print(f"serial:              {serial_time:8.3f} s")
+    print(f"parallel ({args.workers} workers): {parallel_time:8.3f} s")
+    print(f"speedup:             {speedup:8.2f}x")
+    print("identical output:", identical)
+
+    if args.min_speedup is not None:
+        cores = available_cores()
+        if cores < args.workers:
+            print(f"⚠ only {cores} core(s) for {args.workers} workers, the speedup is not representative")
+        if not identical or speedup < args.min_speedup:
+            raise SystemExit(f"❌ expected identical output and a speedup of at least {args.min_speedup}x")
+        print(f"✅ speedup of at least {args.min_speedup}x")
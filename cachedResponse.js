@@ -0,0 +1,32 @@
+// Cached responses: a payload is serialized once, compressed once per encoding and
+// sent with an ETag, so an unchanged payload costs the client a 304.
+const crypto = require('crypto');
+const zlib = require('zlib');
+
+function cachedResponse(body, etag = null) {
+    etag = etag || '"' + crypto.createHash('sha1').update(body).digest('base64url') + '"';
+    return { body, etag, encoded: {} };
+}
+
+// Default cacheControl: always revalidate, the ETag makes that cheap
+function sendCached(req, res, cached, cacheControl = 'no-cache') {
+    res.set('ETag', cached.etag);
+    res.set('Cache-Control', cacheControl);
+    res.set('Vary', 'Accept-Encoding');
+    res.type('application/json');
+    const ifNoneMatch = (req.headers['if-none-match'] || '').split(/\s*,\s*/);
+    if (ifNoneMatch.includes(cached.etag)) return res.status(304).end();
+
+    const accept = req.headers['accept-encoding'] || '';
+    const encoding = /\bbr\b/.test(accept) ? 'br' : /\bgzip\b/.test(accept) ? 'gzip' : null;
+    if (!encoding) return res.send(cached.body);
+    if (!cached.encoded[encoding]) {
+        cached.encoded[encoding] = encoding === 'br'
+            ? zlib.brotliCompressSync(cached.body, { params: { [zlib.constants.BROTLI_PARAM_QUALITY]: 5 } })
+            : zlib.gzipSync(cached.body);
+    }
+    res.set('Content-Encoding', encoding);
+    res.send(cached.encoded[encoding]);
+}
+
+module.exports = { cachedResponse, sendCached };
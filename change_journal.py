@@ -0,0 +1,81 @@
+import json
+import os
+
+#Append-only journal for interactive editing sessions.
+#Every decision is appended as one small JSON line (and fsync'ed), so a crash
+#loses at most the entry that was being written. The journal is compacted into
+#the DatabaseStore from time to time, together with the resume cursor, so the
+#stored data and the position to resume from are always written in one commit.
+
+
+class ChangeJournal:
+    """
+    path: The journal file (one JSON record per line)
+    cursor_name: Name of the store meta value that holds the resume cursor
+
+    A record looks like {"cursor": 12, "key": "one", "changes": {"Aliases": [...]}}.
+    Changes always hold the full new value of a field, so replaying a record twice
+    gives the same result.
+    """
+
+    def __init__(self, path, cursor_name="cursor"):
+        self.path = path
+        self.cursor_name = cursor_name
+        self._file = None
+        self.pending = 0  # number of records since the last compaction
+
+    def append(self, cursor, key=None, changes=None):
+        """Append one record and make sure it is on disk before returning."""
+        record = {"cursor": cursor}
+        if key is not None:
+            record["key"] = key
+            record["changes"] = changes or {}
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.pending += 1
+
+    def records(self):
+        """All complete records in the journal (a half written last line is ignored)."""
+        if not os.path.exists(self.path):
+            return []
+        records = []
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    break  # torn write from a crash, nothing after it can be trusted
+        return records
+
+    def compact(self, store):
+        """
+        Apply the journal to the store, commit it together with the cursor and empty the journal.
+        Returns the cursor to resume from (None if neither journal nor store know one).
+        """
+        cursor = store.get_meta(self.cursor_name)
+        records = self.records()
+        for record in records:
+            cursor = record["cursor"]
+            if "key" not in record:
+                continue
+            entry = store.get(record["key"])
+            entry.update(record["changes"])
+            store.put(record["key"], entry)
+        if records:
+            store.set_meta(self.cursor_name, cursor)
+            store.commit()
+
+        # Only now the journal can go, replaying it again would not change anything
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.pending = 0
+        return None if cursor is None else int(cursor)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,153 @@
+from collections import defaultdict
+
+from component_graph import ComponentGraph
+from component_index import ComponentIndex, flat_set
+from keyword_table import KeywordTable
+
+#Clean up passes over the component groups of a field (used by modifications.py).
+#Every group is turned into a bitmask of keyword ids, so "strict subset of another
+#group" and "same group in another order" are single integer operations. The ids
+#are interned per entry: with deck wide ids every mask would be as wide as the
+#deck and each mask operation would cost O(deck size).
+
+
+def clean_obsoletes(database, keys=None, index=None, field="components"):
+    """Remove component groups that are a strict subset of another group (only for keys if given)."""
+    modified = []
+
+    for key in database if keys is None else keys:
+        entry = database[key]
+        groups = entry.get(field, [])
+        new_groups = []
+
+        # Convert each group to a bitmask of keyword ids for easy subset checking. The ids
+        # are handed out per entry, so a mask has one bit per component of the entry
+        table = KeywordTable()
+        group_masks = [table.mask(group) for group in groups]
+
+        for i, g in enumerate(group_masks):
+            # Check if there exists another group that strictly contains g
+            redundant = any(g & other == g and g != other for j, other in enumerate(group_masks) if i != j)
+            if not redundant:
+                new_groups.append(groups[i])
+
+        if len(new_groups) != len(groups):
+            entry[field] = new_groups
+            if index is not None:
+                index.update(key, field, groups, new_groups)
+            modified.append(key)
+
+    return modified
+
+
+def remove_duplicate_component_groups(database, keys=None, index=None, field="components"):
+    modified = []
+
+    for key in database if keys is None else keys:
+        entry = database[key]
+        groups = entry.get(field, [])
+        seen = set()
+        new_groups = []
+        table = KeywordTable() # ids per entry, see clean_obsoletes
+
+        for group in groups:
+            # Use the bitmask to ignore order (so ["a","b"] == ["b","a"])
+            group_key = table.mask(group)
+            if group_key not in seen:
+                seen.add(group_key)
+                new_groups.append(group)
+
+        if len(new_groups) != len(groups):
+            entry[field] = new_groups
+            if index is not None:
+                index.update(key, field, groups, new_groups)
+            modified.append(key)
+
+    return modified
+
+
+def clean_implied(database, graph=None, field="components", keys=None, index=None):
+    """
+    Remove every component that is already a component of another member of the
+    same group, with the pairs taken from the component graph (primary_components
+    by default) instead of hand written a/b rules.
+
+    On a cycle every member covers the others, so an entry whose groups hold
+    the key itself or a keyword of a cycle is left alone.
+    Returns (modified keys, skipped keys).
+    """
+    if graph is None:
+        graph = ComponentGraph.from_database(database)
+    circular = {keyword for cycle in graph.cycles() for keyword in cycle}
+    modified = []
+    skipped = []
+
+    for key in database if keys is None else keys:
+        entry = database[key]
+        groups = entry.get(field, [])
+        if groups != [[key]] and any(key in group or not circular.isdisjoint(group) for group in groups):
+            skipped.append(key)
+            continue
+        new_groups = [graph.minimal(group) for group in groups]
+        if new_groups != groups:
+            entry[field] = new_groups
+            if index is not None:
+                index.update(key, field, groups, new_groups)
+            modified.append(key)
+
+    return modified, skipped
+
+
+def load_rules(path):
+    """Read (redundant, implying) pairs from a tab separated file, lines starting with # are ignored."""
+    rules = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if not line.strip() or line.startswith("#"):
+                continue
+            a, b = [s.strip() for s in line.split("\t")[:2]]
+            rules.append((a, b))
+    return rules
+
+
+def apply_rules(database, rules, field="primary_components", index=None):
+    """
+    Apply many clean_doubles rules (a, b) in a single traversal.
+    The rules are applied in order per entry, which gives the same result as calling
+    clean_doubles once per rule. Obsolete and duplicate groups are cleaned once at the end.
+    Returns the number of entries each rule changed and the list of changed keys.
+    """
+    if index is None:
+        index = ComponentIndex(database, [field])
+
+    # Removing components never adds a pair, so only entries that contain a pair now can be hit
+    rules_by_component = defaultdict(list)
+    candidates = set()
+    for n, (a, b) in enumerate(rules):
+        rules_by_component[a].append(n)
+        rules_by_component[b].append(n)
+        candidates.update(index.containing(field, a, b))
+
+    hits = [0] * len(rules)
+    modified = []
+    for key in sorted(candidates, key=index.position.__getitem__):
+        entry = database[key]
+        groups = entry.get(field, [])
+        present = flat_set(groups)
+        removed = set()
+        relevant = sorted({n for c in present for n in rules_by_component.get(c, [])})
+        for n in relevant:
+            a, b = rules[n]
+            if a in present and b in present:
+                present.discard(a)
+                removed.add(a)
+                hits[n] += 1
+        if removed:
+            entry[field] = [[c for c in group if c not in removed] for group in groups]
+            index.update(key, field, groups, entry[field])
+            modified.append(key)
+
+    clean_obsoletes(database, modified, index, field)
+    remove_duplicate_component_groups(database, modified, index, field)
+    return hits, modified
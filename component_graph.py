@@ -0,0 +1,243 @@
+from keyword_table import KeywordTable
+
+#Transitive closure of the component graph as integer bitsets.
+#Every node gets an id (KeywordTable) and the set of all components below it is
+#stored as one int with a bit per id. "Is x implied by y" is then a single
+#bitwise AND instead of a list membership scan that is repeated for every keyword,
+#and the transitive reduction (the minimal components of a node or of a group)
+#follows from the closure directly.
+#compile() checks the graph for cycles (strongly connected components) and
+#stores a topological order and the depth of every node, so bottom-up passes can
+#run as one linear sweep without recursion.
+
+
+class CycleError(ValueError):
+    """The component graph is not a DAG, cycles lists the keywords of every cycle."""
+
+    def __init__(self, cycles):
+        self.cycles = cycles
+        super().__init__(f"{len(cycles)} circular decomposition(s): "
+                         + "; ".join(" <-> ".join(cycle) for cycle in cycles))
+
+
+class ComponentGraph:
+    """
+    edges: dict node -> components of the node (components that are not keys
+    themselves are leaves)
+    """
+
+    def __init__(self, edges):
+        self.table = KeywordTable(edges)
+        self.edges = [self.table.encode(dict.fromkeys(edges[node])) for node in edges]
+        for _ in range(len(self.table) - len(self.edges)):
+            self.edges.append(())
+        self.below = self._close()
+        self.order = None # set by compile()
+        self.depth = None
+
+    @classmethod
+    def from_database(cls, database, field="primary_components"):
+        """
+        Graph of the component groups of a database field (all groups of an entry
+        together). Atomic characters ([[key]]) have no components.
+        """
+        edges = {}
+        for key, entry in database.items():
+            groups = entry.get(field, [])
+            edges[key] = [] if groups == [[key]] else [c for group in groups for c in group]
+        return cls(edges)
+
+    @classmethod
+    def from_roots(cls, database, roots, field="primary_components"):
+        """
+        Like from_database, but only roots and everything below them, so only
+        those entries are read (e.g. a few typed components of a large deck).
+        """
+        edges = {}
+        todo = list(roots)
+        while todo:
+            key = todo.pop()
+            if key in edges:
+                continue
+            groups = database[key].get(field, []) if key in database else []
+            edges[key] = [] if groups == [[key]] else [c for group in groups for c in group]
+            todo.extend(edges[key])
+        return cls(edges)
+
+    def _close(self):
+        """below[id] = bitset of every node reachable from id (id itself only if it is on a cycle)."""
+        order = []
+        state = [0] * len(self.edges) # 0 new, 1 on the stack, 2 done
+        for root in range(len(self.edges)):
+            if state[root]:
+                continue
+            state[root] = 1
+            stack = [(root, iter(self.edges[root]))]
+            while stack:
+                node, children = stack[-1]
+                for child in children:
+                    if not state[child]:
+                        state[child] = 1
+                        stack.append((child, iter(self.edges[child])))
+                        break
+                else:
+                    state[node] = 2
+                    order.append(node)
+                    stack.pop()
+
+        # Post order: children come first, so one sweep is exact for a DAG.
+        # Cycles need more sweeps until nothing changes.
+        below = [0] * len(self.edges)
+        changed = True
+        while changed:
+            changed = False
+            for node in order:
+                bits = 0
+                for child in self.edges[node]:
+                    bits |= (1 << child) | below[child]
+                if bits != below[node]:
+                    below[node] = bits
+                    changed = True
+        return below
+
+    def _bit(self, node):
+        id_ = self.table.ids.get(node)
+        return 0 if id_ is None else 1 << id_
+
+    def descendants(self, node):
+        """Bitset of every component below node."""
+        id_ = self.table.ids.get(node)
+        return 0 if id_ is None else self.below[id_]
+
+    def implies(self, y, x):
+        """True if x is (directly or indirectly) a component of y."""
+        return bool(self.descendants(y) & self._bit(x))
+
+    def minimal(self, group):
+        """
+        Transitive reduction of a group: the members that are not a component of
+        another member (order is kept). Members implied only by themselves stay.
+        """
+        covered = 0
+        for c in group:
+            covered |= self.descendants(c)
+        result = []
+        for c in group:
+            bit = self._bit(c)
+            if covered & bit and any(self.descendants(o) & bit for o in group if o != c):
+                continue
+            result.append(c)
+        return result
+
+    def reduction(self, node):
+        """Minimal components of node."""
+        id_ = self.table.ids.get(node)
+        if id_ is None:
+            return []
+        return self.minimal(self.table.decode(self.edges[id_]))
+
+    # -------------------- Compiled graph --------------------
+
+    def strongly_connected_components(self):
+        """
+        Tarjan's algorithm (iterative) over the ids. The components come out
+        children first, i.e. in reverse topological order.
+        """
+        index = [None] * len(self.edges)
+        low = [0] * len(self.edges)
+        on_stack = [False] * len(self.edges)
+        stack = []
+        components = []
+        counter = 0
+        for root in range(len(self.edges)):
+            if index[root] is not None:
+                continue
+            index[root] = low[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack[root] = True
+            work = [(root, iter(self.edges[root]))]
+            while work:
+                node, children = work[-1]
+                for child in children:
+                    if index[child] is None:
+                        index[child] = low[child] = counter
+                        counter += 1
+                        stack.append(child)
+                        on_stack[child] = True
+                        work.append((child, iter(self.edges[child])))
+                        break
+                    elif on_stack[child]:
+                        low[node] = min(low[node], index[child])
+                else:
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        low[parent] = min(low[parent], low[node])
+                    if low[node] == index[node]:
+                        component = []
+                        while True:
+                            member = stack.pop()
+                            on_stack[member] = False
+                            component.append(member)
+                            if member == node:
+                                break
+                        components.append(component)
+        return components
+
+    def cycles(self, components=None):
+        """Keywords of every cycle (strongly connected components with more than one node or a self reference)."""
+        if components is None:
+            components = self.strongly_connected_components()
+        return [self.table.decode(component) for component in components
+                if len(component) > 1 or component[0] in self.edges[component[0]]]
+
+    def compile(self):
+        """
+        Fail fast with a CycleError listing all cycles, otherwise store
+        order (ids, children before parents) and depth (per id, 0 for leaves).
+        """
+        components = self.strongly_connected_components()
+        cycles = self.cycles(components)
+        if cycles:
+            raise CycleError(cycles)
+        self.order = [component[0] for component in components]
+        self.depth = [0] * len(self.edges)
+        for node in self.order:
+            for child in self.edges[node]:
+                if self.depth[child] + 1 > self.depth[node]:
+                    self.depth[node] = self.depth[child] + 1
+        return self
+
+    def closure_of(self, keys):
+        """Bitset of keys and everything below them."""
+        bits = 0
+        for key in keys:
+            bits |= self._bit(key) | self.descendants(key)
+        return bits
+
+    def sweep(self, keys=None):
+        """Keywords in compiled order (children first), restricted to keys and everything below them."""
+        if self.order is None:
+            self.compile()
+        if keys is None:
+            return self.table.decode(self.order)
+        needed = self.closure_of(keys)
+        return [self.table.keywords[id_] for id_ in self.order if needed >> id_ & 1]
+
+
+if __name__ == "__main__":
+    import json
+    import sys
+
+    # python component_graph.py [database.json] -> checks primary_components for cycles
+    with open(sys.argv[1] if len(sys.argv) > 1 else "database.json", "r", encoding="utf-8") as f:
+        database = json.load(f)
+    graph = ComponentGraph.from_database(database)
+    try:
+        graph.compile()
+    except CycleError as error:
+        for cycle in error.cycles:
+            print("❌ circular:", " <-> ".join(cycle))
+        sys.exit(1)
+    print(f"✅ {len(graph.order)} nodes, no cycles, maximum depth {max(graph.depth, default=0)}")
@@ -0,0 +1,59 @@
+from collections import defaultdict
+
+#Inverted index from a component to the entries that use it.
+#Lets the clean_* passes in modifications.py jump straight to the entries that
+#contain a given pair of components instead of flattening all groups of all
+#entries for every pair.
+
+FIELDS = ("components", "primary_components", "expanded_components")
+
+
+def flat_set(groups):
+    """All components of a list of component groups."""
+    return {c for group in groups for c in group}
+
+
+class ComponentIndex:
+    """
+    database: The JSON database (keyword -> entry)
+    fields: The component group fields that are indexed
+
+    parents[field][component] is the set of keywords whose field contains component.
+    The index has to be told about every edit of an indexed field with update().
+    """
+
+    def __init__(self, database, fields=FIELDS):
+        self.fields = tuple(fields)
+        self.parents = {field: defaultdict(set) for field in self.fields}
+        self.position = {}  # keyword -> position in the database, keeps results in database order
+        for key, entry in database.items():
+            self.add(key, entry)
+
+    def add(self, key, entry):
+        self.position.setdefault(key, len(self.position))
+        for field in self.fields:
+            for component in flat_set(entry.get(field, [])):
+                self.parents[field][component].add(key)
+
+    def update(self, key, field, old_groups, new_groups):
+        """Record that entry key changed field from old_groups to new_groups."""
+        if field not in self.parents:
+            return
+        old = flat_set(old_groups)
+        new = flat_set(new_groups)
+        parents = self.parents[field]
+        for component in old - new:
+            parents[component].discard(key)
+            if not parents[component]:
+                del parents[component]
+        for component in new - old:
+            parents[component].add(key)
+
+    def containing(self, field, *components):
+        """Keywords whose field contains all of components, in database order."""
+        parents = self.parents[field]
+        sets = sorted((parents.get(c, set()) for c in components), key=len)
+        if not sets:
+            return []
+        keys = set(sets[0]).intersection(*sets[1:])
+        return sorted(keys, key=self.position.__getitem__)
@@ -1,174 +1,131 @@
+import argparse
 import json
-import pandas as pd
-from itertools import product
-
-def build_tree(char_key, data, visited=None):
-    """
-    Recursively builds a decomposition tree as a nested dictionary.
-    
-    char_key: The key in the JSON database
-    data: The JSON database
-    visited: Keeps track of visited nodes to avoid infinite loops
-    """
-    if visited is None:
-        visited = set()
-
-    if char_key in visited:
-        return f"{char_key} (circular)"
-    visited.add(char_key)
-    #print(char_key)
-
-    primary_components = data[char_key]["primary_components"]
-
-    # Atomic character: just return its name
-    if len(primary_components) == 1 and primary_components[0] == [char_key]:
-        return {}#char_key
-    
-    # Recursive decomposition
-    tree = {}
-    # Take the first group of components
-    for component in primary_components[0]:
-        tree[component] = build_tree(component, data, visited.copy())
-    
-    return tree
+from collections import ChainMap
+from component_graph import CycleError
+from deck_registry import DeckRegistry, deck_argument
+from expansion import Expander, available_cores, compile_graph, dirty_ancestors, expand_parallel, fingerprints
+from answer_index import index_filename, write_answer_index
+from lint import lint, summary
 
 def flatten(lst):
     """Simple flatten: list of lists -> flat list"""
     return [x for sub in lst for x in sub]
 
-# Pretty printing of decomposition tree
-def print_tree(tree, indent=0):
-    for key in tree.keys():
-        print("    " * indent + key)
-        if isinstance(tree[key], dict) and len(tree[key]) > 1:
-            print_tree(tree[key], indent + 1)
-
-def expand(node):
-    """
-    Expand a forest (dict of one or more nodes) into all valid descriptions.
-    A valid description is a flattened list of labels where each node is either:
-      - kept as-is, or
-      - replaced by the expansions of ALL its children (chosen from one group if there are multiple).
-    Tree conventions:
-      - Forest: {name: children, ...}
-      - children:
-          {} or non-dict -> leaf
-          {child_name: child_children, ...} -> single component group (AND of children)
-          [ { ... }, { ... }, ... ] -> multiple alternative component groups (OR of groups)
-    Returns: list[list[str]]
-    """
-
-    def is_leaf(children):
-        return not isinstance(children, dict) and not isinstance(children, list) or \
-               (isinstance(children, dict) and len(children) == 0)
-
-    def expand_forest(forest):
-        """Expand a forest (dict of siblings) -> list of flattened lists."""
-        if not forest:
-            return [[]]
-        per_sibling = [expand_node(name, children) for name, children in forest.items()]
-        combos = []
-        for combo in product(*per_sibling):
-            # combo is like [[...expansion of sib1...], [...expansion of sib2...], ...]
-            flat = [token for part in combo for token in part]
-            combos.append(flat)
-        return combos
-
-    def expand_node(name, children):
-        """Expand a single node -> list of flattened lists."""
-        # Option 1: keep this node
-        keep = [[name]]
-
-        # Leaf -> only keep-self
-        if is_leaf(children):
-            return keep
-
-        # Non-leaf -> Option 2: replace by children expansions
-        # Children may be:
-        #   - dict (single group of children; AND them)
-        #   - list of dicts (multiple alternative groups; OR across them)
-        replace = []
-
-        if isinstance(children, dict):
-            # Single group
-            replace = expand_forest(children)
-        elif isinstance(children, list):
-            # Multiple groups (alternatives): union of each group's forest expansion
-            for group in children:
-                replace.extend(expand_forest(group))
+
+def beyond_limit(entry, sequenz_limit):
+    """Entries at or above the Sequenz limit keep their imported components."""
+    return sequenz_limit is not None and int(entry["Sequenz"]) >= sequenz_limit
+
+
+Answer_limit = None # Optional cap of answers per character, the answers are then streamed instead of built in full
+Length_limit = None # Optional maximum number of components per answer
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build expanded_components from primary_components")
+    parser.add_argument("--changed", action="store_true",
+                        help="only re-expand keys edited since the last run and their ancestors")
+    parser.add_argument("--keys", nargs="+", metavar="KEY",
+                        help="only re-expand these keys and their ancestors")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="expand in this many processes, at most one per core (same result as the serial run)")
+    parser.add_argument("--strict", action="store_true",
+                        help="stop on circular decompositions (default: report them, the circular component is a leaf)")
+    deck_argument(parser)
+    args = parser.parse_args()
+
+    registry = DeckRegistry()
+    store = registry.store(args.deck)
+    database = store.load()
+
+    # Heisig Sequenz up to which secondary answers are build. Above it secondary = primary = components_backup
+    Sequenz_limit = registry.setting(args.deck, "sequenz_limit") # None: expand every entry
+
+    # Characters above the limit keep their imported components, this has to happen
+    # before any expansion so that their parents see the same primary_components
+    for key, entry in database.items():
+        if beyond_limit(entry, Sequenz_limit):
+            entry["primary_components"] = entry["components_backup"]
+            entry["expanded_components"] = entry["components_backup"]
+
+    # Components may point into other decks, their entries are read (lazily) from there
+    references = registry.references(args.deck, database)
+    linked = ChainMap(database, references) if references else database
+    if references:
+        print(f"{len(references)} components from other decks")
+
+    # Circular decompositions are reported up front. Without a DAG there is no
+    # topological sweep, the circular component is then expanded as a leaf
+    try:
+        graph = compile_graph(linked)
+    except CycleError as error:
+        marker = "❌" if args.strict else "⚠"
+        for cycle in error.cycles:
+            print(f"{marker} circular:", " <-> ".join(cycle))
+        if args.strict:
+            raise SystemExit("Fix the circular decompositions above or run without --strict.")
+        graph = None
+
+    expander = Expander(linked, graph) # every node is expanded once and reused by all its parents
+
+    # Find out what has to be recomputed (everything, unless asked for an incremental run)
+    current = fingerprints(linked)
+    previous = json.loads(store.get_meta("expansion_fingerprints", "null"))
+    edited = None
+    if args.keys:
+        edited = args.keys
+    elif args.changed and previous is not None:
+        edited = [key for key in linked if previous.get(key) != current[key]]
+    elif args.changed:
+        print("No earlier run recorded, expanding everything.")
+
+    targets = database.keys()
+    seeds = {}
+    if edited is not None:
+        targets = dirty_ancestors(edited, linked)
+        for key, entry in database.items():
+            # Unchanged keys below the dirty ones keep their stored answers
+            if key not in targets and not beyond_limit(entry, Sequenz_limit) and entry["primary_components"] != [[key]]:
+                seeds[key] = entry.get("expanded_components", [])
+                expander.seed(key, seeds[key])
+        print(f"{len(edited)} edited, re-expanding {len(targets)} of {len(database)} keys")
+
+    to_expand = [key for key, entry in database.items()
+                 if key in targets and not beyond_limit(entry, Sequenz_limit) and entry["primary_components"] != [[key]]]
+    parallel_results = {}
+    workers = min(args.workers, available_cores())
+    if workers < args.workers:
+        print(f"⚠ {args.workers} workers asked, but only {available_cores()} core(s) available, using {workers}")
+    if workers > 1:
+        parallel_results = expand_parallel(linked, to_expand, workers, seeds, Answer_limit, Length_limit)
+    elif graph is not None and Answer_limit is None and Length_limit is None:
+        expander.prepare(to_expand) # one sweep in topological order
+
+    changed = []
+    for key, entry in database.items():
+        if key not in targets or beyond_limit(entry, Sequenz_limit):
+            continue
+        previous_answers = entry.get("expanded_components")
+        primary_components = entry.get("primary_components",[])
+        primary_components_flatten = flatten(primary_components)
+        # Extract all keywords inside keyword:"..." or hanzi:...
+        if len(primary_components) == 1 and primary_components[0] == [key]:
+            entry["expanded_components"] = entry["primary_components"]
         else:
-            # Any other unexpected type -> treat as leaf
-            return keep
-
-        # keep + replace
-        return keep + replace
-
-    # node can be a single-node dict or a forest; treat uniformly as forest
-    results = expand_forest(node)
-
-    # (Optional) deduplicate results while preserving order
-    seen, deduped = set(), []
-    for lst in results:
-        t = tuple(lst)
-        if t not in seen:
-            seen.add(t)
-            deduped.append(lst)
-    return deduped
-
-def unique_answers(answers):
-    """Remove duplicates and return sorted unique expansions."""
-    # use tuple to make them hashable
-    unique = {tuple(ans) for ans in answers}
-    # back to list of lists
-    deduped = [list(ans) for ans in unique]
-    # sort by length first, then lexicographically
-    deduped.sort(key=lambda x: (len(x), x))
-    return deduped
-
-
-
-
-filename = "database.json" #Database name
-
-Sequenz_limit = 1347 # Heisig Sequenz up to which secondary answers are build. Above it secondary = primary = components_backup
-
-with open(filename, "r", encoding="utf-8") as f:
-    database = json.load(f)
-
-decomposition_trees = {}
-
-for key, entry in database.items():
-    if key == "particle:walking stick":
-        1 == 1
-    if int(entry["Sequenz"]) >= Sequenz_limit:
-        entry["primary_components"] = entry["components_backup"]
-        entry["expanded_components"] = entry["components_backup"]
-        continue
-    primary_components = entry.get("primary_components",[])
-    primary_components_flatten = flatten(primary_components)
-    # Extract all keywords inside keyword:"..." or hanzi:...
-    if len(primary_components) == 1 and primary_components[0] == [key]:
-        print(key)
-        entry["expanded_components"] = entry["primary_components"]
-        continue  # Skip atomic characters
-
-    tree = build_tree(key, database)
-    decomposition_trees[key] = tree
-
-    # Generate all possible answers
-    all_answers = expand(tree)
-    all_answers = unique_answers(all_answers)
-    """
-    print("---------------------")
-    print(key)
-    print("---------------------")
-    print_tree(tree)
-    print("list of possible answers")
-    print(all_answers)
-    """
-    entry["expanded_components"] = all_answers
-
-
-with open(filename, "w", encoding="utf-8") as f:
-    json.dump(database, f, ensure_ascii=False, indent=2)
+            # Generate all possible answers
+            if key in parallel_results:
+                entry["expanded_components"] = parallel_results[key]
+            else:
+                entry["expanded_components"] = expander.expand(key, Answer_limit, Length_limit)
+        if entry["expanded_components"] != previous_answers:
+            changed.append(key)
+
+    print("changed:", changed)
+
+    store.set_meta("expansion_fingerprints", json.dumps(current, ensure_ascii=False))
+    store.save(database) # only the changed entries are written
+    store.export()
+    registry.close() # the store and the decks the references were read from
+
+    write_answer_index(database, registry.deck_path(args.deck, index_filename), references) # keep the quiz's answer matching in sync
 
+    print("lint:", summary(lint(database, references=references))) # python lint.py for the details
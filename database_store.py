@@ -0,0 +1,249 @@
+import json
+import os
+import sqlite3
+
+from deck_binary import Deck, write_deck
+from deck_files import build_content, split_database, state_filename, update_state
+
+#Indexed storage for the database used by the maintenance scripts.
+#database.json stays the file the quiz server reads, but the scripts work on a
+#SQLite copy next to it (database.sqlite) with one row per keyword. Reading or
+#changing a single entry only touches that row and a commit only writes the
+#entries that actually changed. The store only holds content, the scheduling
+#state is kept by the quiz server in state.json (see deck_files.py).
+
+
+class DatabaseStore:
+    """
+    Keyword -> entry store backed by SQLite.
+
+    json_path: The JSON database the store is synchronised with
+    db_path: The SQLite file, defaults to the JSON name with a .sqlite suffix
+
+    The SQLite copy is rebuilt from the JSON file whenever the JSON file was
+    changed by someone else (e.g. the quiz server). export() writes the JSON
+    file back once the scripts are done.
+    """
+
+    def __init__(self, json_path="database.json", db_path=None):
+        self.json_path = json_path
+        self.db_path = db_path or os.path.splitext(json_path)[0] + ".sqlite"
+        self.deck_path = os.path.splitext(json_path)[0] + ".deck"
+        self.connection = sqlite3.connect(self.db_path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, position INTEGER NOT NULL, entry TEXT NOT NULL)"
+        )
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)"
+        )
+        self.connection.commit()
+
+        self._pending = {}   # key -> entry waiting for the next commit
+        self._pending_meta = {}
+        self._snapshots = {}  # key -> serialized entry as it was read, used by save()
+        self._keys = None
+
+        self._sync_from_json()
+
+    # -------------------- JSON synchronisation --------------------
+
+    def _json_signature(self):
+        stat = os.stat(self.json_path)
+        return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+    def _sync_from_json(self):
+        if not os.path.exists(self.json_path):
+            return
+        signature = self._json_signature()
+        if self.get_meta("json_signature") == signature:
+            return
+        if self.get_meta("exported", "1") == "0":
+            raise RuntimeError(
+                f"{self.json_path} was changed while {self.db_path} holds changes that were never "
+                f"exported. Export or delete {self.db_path} before continuing."
+            )
+
+        with open(self.json_path, "r", encoding="utf-8") as f:
+            database = json.load(f)
+
+        with self.connection:
+            self.connection.execute("DELETE FROM entries")
+            self.connection.executemany(
+                "INSERT INTO entries (key, position, entry) VALUES (?, ?, ?)",
+                ((key, position, _serialize(entry)) for position, (key, entry) in enumerate(database.items())),
+            )
+            self._write_meta({"json_signature": signature, "exported": "1"})
+        self._keys = None
+
+    def export(self, force=False):
+        """
+        Write the store back to the JSON file and build the content file for the
+        quiz (only if something changed since the last export).
+        """
+        self.commit()
+        if not force and self.get_meta("exported", "1") == "1" and os.path.exists(self.json_path):
+            return False
+
+        database = {key: json.loads(text) for key, text in self.connection.execute(
+            "SELECT key, entry FROM entries ORDER BY position")}
+
+        # State fields still in an entry (from before the split or from database_base.json)
+        # go to the state file, but never over state the server already has
+        directory = os.path.dirname(self.json_path)
+        content, state = split_database(database)
+        leftover = {key: fields for key, fields in state.items() if fields}
+        if leftover:
+            update_state(leftover, os.path.join(directory, state_filename), overwrite=False)
+            with self.connection:
+                self.connection.executemany("UPDATE entries SET entry = ? WHERE key = ?",
+                                            ((_serialize(content[key]), key) for key in leftover))
+            for key in leftover:
+                self._snapshots.pop(key, None)
+
+        tmp_path = self.json_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(content, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.json_path)
+        build_content(content, directory)
+        signature = self._json_signature()
+        write_deck(content, self.deck_path, signature)
+
+        with self.connection:
+            self._write_meta({"json_signature": signature, "exported": "1"})
+        return True
+
+    def view(self):
+        """
+        Read only, lazily decoded view of the store (a deck_binary.Deck), for
+        scripts that only look at a few entries. Changes still go through put().
+        The deck file is rebuilt if it is older than the store.
+        """
+        self.commit()
+        current = self.get_meta("exported", "1") == "1" and os.path.exists(self.json_path)
+        signature = self._json_signature() if current else ""
+        if current and os.path.exists(self.deck_path):
+            try:
+                deck = Deck(self.deck_path)
+            except ValueError:
+                pass
+            else:
+                if deck.signature == signature:
+                    return deck
+                deck.close()
+        write_deck(self.load(), self.deck_path, signature)
+        return Deck(self.deck_path)
+
+    # -------------------- Entries --------------------
+
+    def keys(self):
+        """All keywords in database order."""
+        if self._keys is None:
+            self._keys = [key for (key,) in self.connection.execute("SELECT key FROM entries ORDER BY position")]
+        return list(self._keys)
+
+    def __contains__(self, key):
+        return key in self._pending or self._stored(key)
+
+    def _stored(self, key):
+        return self.connection.execute("SELECT 1 FROM entries WHERE key = ?", (key,)).fetchone() is not None
+
+    def __len__(self):
+        return len(self.keys())
+
+    def get(self, key, default=None):
+        """Return the entry for key (a fresh dict, changes need put())."""
+        if key in self._pending:
+            return json.loads(_serialize(self._pending[key]))
+        row = self.connection.execute("SELECT entry FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return default
+        self._snapshots[key] = row[0]
+        return json.loads(row[0])
+
+    def put(self, key, entry):
+        """Stage an entry, it is written on the next commit()."""
+        self._pending[key] = entry
+
+    def load(self):
+        """Load every entry into an ordered dict, e.g. for passes over the whole database."""
+        database = {}
+        for key, text in self.connection.execute("SELECT key, entry FROM entries ORDER BY position"):
+            self._snapshots[key] = text
+            database[key] = json.loads(text)
+        return database
+
+    def save(self, database):
+        """
+        Stage and commit all entries of database that differ from what was read.
+        Returns the list of changed keys.
+        """
+        changed = []
+        for key, entry in database.items():
+            text = _serialize(entry)
+            if self._snapshots.get(key) != text:
+                self._pending[key] = entry
+                changed.append(key)
+        self.commit()
+        return changed
+
+    def commit(self):
+        """Atomically write all staged entries. Returns the written keys."""
+        if not self._pending and not self._pending_meta:
+            return []
+
+        written = list(self._pending)
+        rows = [(key, _serialize(entry)) for key, entry in self._pending.items()]
+        with self.connection:
+            new_keys = [key for key, _ in rows if not self._stored(key)]
+            if new_keys:
+                (last,) = self.connection.execute("SELECT COALESCE(MAX(position), -1) FROM entries").fetchone()
+                self.connection.executemany(
+                    "INSERT INTO entries (key, position, entry) VALUES (?, ?, '')",
+                    ((key, last + 1 + i) for i, key in enumerate(new_keys)),
+                )
+                self._keys = None
+            self.connection.executemany("UPDATE entries SET entry = ? WHERE key = ?",
+                                        ((text, key) for key, text in rows))
+            meta = dict(self._pending_meta)
+            if rows:
+                meta["exported"] = "0"
+            self._write_meta(meta)
+
+        for key, text in rows:
+            self._snapshots[key] = text
+        self._pending = {}
+        self._pending_meta = {}
+        return written
+
+    # -------------------- Meta data --------------------
+
+    def get_meta(self, name, default=None):
+        if name in self._pending_meta:
+            return self._pending_meta[name]
+        row = self.connection.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return default if row is None else row[0]
+
+    def set_meta(self, name, value):
+        """Stage a meta value, it is written in the same transaction as the next commit()."""
+        self._pending_meta[name] = str(value)
+
+    def _write_meta(self, values):
+        self.connection.executemany("INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)", values.items())
+
+    def close(self):
+        self.commit()
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.connection.close()
+
+
+def _serialize(entry):
+    return json.dumps(entry, ensure_ascii=False, separators=(",", ":"))
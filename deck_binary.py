@@ -0,0 +1,328 @@
+import json
+import mmap
+import os
+from array import array
+from collections.abc import Mapping
+
+#Compiled, memory-mapped copy of the database for the scripts that only read a
+#few entries. Loading database.json (or every row of the store) parses all ~3k
+#entries into dicts before any work is done. The deck file is opened with mmap
+#instead: nothing is parsed up front and an entry is only decoded, field by field,
+#when it is accessed. DatabaseStore.export() writes it next to the JSON file.
+#
+#Layout (all numbers are native uint32, all sections 4 byte aligned):
+#  header          MAGIC, VERSION, counts and the byte offsets of the sections
+#  string offsets  n_strings + 1 offsets into the string data
+#  string data     every distinct string once, UTF-8
+#  records         RECORD_WORDS words per entry in database order: key string,
+#                  presence/bool bits, field order string, then the words of
+#                  each field in FIELDS
+#  key order       entry indices sorted by the UTF-8 bytes of the key (binary search)
+#  group offsets   n_groups + 1 offsets into the items, one group per component
+#                  group and per list of aliases
+#  items           string ids of the groups
+#Values of other fields (or of a field in FIELDS with an unexpected type) are
+#kept as JSON text in the extra string of the record.
+
+MAGIC = 0x4B44_5A48 # "HZDK" on little endian machines
+VERSION = 1
+NONE = 0xFFFF_FFFF
+
+# Field -> kind, in record order. STRING: one string id, BOOL: a bit of the flags,
+# LIST: one group, GROUPS: (first group, count)
+FIELDS = [
+    ("hanzi", "STRING"),
+    ("Number", "STRING"),
+    ("Sequenz", "STRING"),
+    ("isHanzi", "BOOL"),
+    ("isActive", "BOOL"),
+    ("Aliases", "LIST"),
+    ("primary_components", "GROUPS"),
+    ("expanded_components", "GROUPS"),
+    ("components", "GROUPS"),
+    ("components_backup", "GROUPS"),
+]
+
+# field -> (kind, bit, word) with the presence bit (value bit for BOOL is bit + 16)
+# and the first word of the field in a record
+LAYOUT = {}
+_word = 3 # 0: key, 1: presence and bool bits, 2: field order
+for _bit, (_field, _kind) in enumerate(FIELDS):
+    LAYOUT[_field] = (_kind, _bit, _word)
+    _word += {"STRING": 1, "BOOL": 0, "LIST": 1, "GROUPS": 2}[_kind]
+EXTRA_WORD = _word
+RECORD_WORDS = _word + 1
+
+HEADER_WORDS = 16
+SIGNATURE_STRING = 0 # string 0 holds the signature of the source the deck was built from
+
+
+def _fits(kind, value):
+    if kind == "STRING":
+        return isinstance(value, str)
+    if kind == "BOOL":
+        return isinstance(value, bool)
+    if kind == "LIST":
+        return isinstance(value, list) and all(isinstance(item, str) for item in value)
+    return (isinstance(value, list) and all(isinstance(group, list) for group in value)
+            and all(isinstance(item, str) for group in value for item in group))
+
+
+def write_deck(database, path, signature=""):
+    """Compile database (keyword -> entry) into a deck file at path (atomic)."""
+    strings = {}
+
+    def intern(text):
+        id_ = strings.get(text)
+        if id_ is None:
+            id_ = strings[text] = len(strings)
+        return id_
+
+    intern(signature)
+    records = array("I")
+    group_offsets = array("I", [0])
+    items = array("I")
+    keys = []
+    for key, entry in database.items():
+        keys.append(key)
+        record = [NONE] * RECORD_WORDS
+        record[0] = intern(key)
+        record[2] = intern("\t".join(entry)) # only a few distinct orders, each stored once
+        flags = 0
+        extra = {}
+        for field, value in entry.items():
+            layout = LAYOUT.get(field)
+            if layout is None or not _fits(layout[0], value):
+                extra[field] = value
+                continue
+            kind, bit, word = layout
+            flags |= 1 << bit
+            if kind == "STRING":
+                record[word] = intern(value)
+            elif kind == "BOOL":
+                flags |= value << (bit + 16)
+            elif kind == "LIST":
+                record[word] = len(group_offsets) - 1
+                items.extend(intern(item) for item in value)
+                group_offsets.append(len(items))
+            else:
+                record[word], record[word + 1] = len(group_offsets) - 1, len(value)
+                for group in value:
+                    items.extend(intern(item) for item in group)
+                    group_offsets.append(len(items))
+        record[1] = flags
+        if extra:
+            record[EXTRA_WORD] = intern(json.dumps(extra, ensure_ascii=False, separators=(",", ":")))
+        records.extend(record)
+
+    encoded = [text.encode("utf-8") for text in strings]
+    string_offsets = array("I", [0])
+    for data in encoded:
+        string_offsets.append(string_offsets[-1] + len(data))
+    string_data = b"".join(encoded)
+    string_data += b"\0" * (-len(string_data) % 4)
+    key_order = array("I", sorted(range(len(keys)), key=lambda i: encoded[records[i * RECORD_WORDS]]))
+
+    sections = [string_offsets.tobytes(), string_data, records.tobytes(), key_order.tobytes(),
+                group_offsets.tobytes(), items.tobytes()]
+    header = array("I", [MAGIC, VERSION, len(keys), len(strings), len(group_offsets) - 1, len(items)])
+    position = HEADER_WORDS * 4
+    for section in sections:
+        header.append(position)
+        position += len(section)
+    header.extend([0] * (HEADER_WORDS - len(header)))
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header.tobytes())
+        for section in sections:
+            f.write(section)
+    os.replace(tmp_path, path)
+
+
+class Deck(Mapping):
+    """
+    Read only keyword -> EntryView mapping over a deck file (in database order).
+    Fields are decoded on access, every access returns fresh lists.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+        header = view[:HEADER_WORDS * 4].cast("I")
+        if header[0] != MAGIC or header[1] != VERSION:
+            raise ValueError(f"{path} is not a deck file of version {VERSION} (rebuild it with DatabaseStore.export)")
+        self._length = header[2]
+        starts = list(header[6:12]) + [len(view)]
+        self._string_offsets = view[starts[0]:starts[1]].cast("I")
+        self._string_data = view[starts[1]:starts[2]]
+        self._data_start, self._data_end = starts[1], starts[2]
+        self._records = view[starts[2]:starts[3]].cast("I")
+        self._key_order = view[starts[3]:starts[4]].cast("I")
+        self._group_offsets = view[starts[4]:starts[5]].cast("I")
+        self._items = view[starts[5]:starts[6]].cast("I")
+        header.release()
+        view.release()
+        self._strings = {} # decoded strings by id, keywords repeat a lot
+        self._index = {}   # key -> entry index, filled by lookups
+
+    @property
+    def signature(self):
+        """Signature of the source the deck was built from (see write_deck)."""
+        return self.string(SIGNATURE_STRING)
+
+    def string(self, id_):
+        text = self._strings.get(id_)
+        if text is None:
+            text = self._strings[id_] = self._raw(id_).decode("utf-8")
+        return text
+
+    def _raw(self, id_):
+        return bytes(self._string_data[self._string_offsets[id_]:self._string_offsets[id_ + 1]])
+
+    def _find(self, key):
+        """Entry index of key (binary search over the sorted keys), None if missing."""
+        index = self._index.get(key)
+        if index is not None:
+            return index
+        target = key.encode("utf-8")
+        low, high = 0, self._length
+        while low < high:
+            middle = (low + high) // 2
+            candidate = self._key_order[middle]
+            raw = self._raw(self._records[candidate * RECORD_WORDS])
+            if raw < target:
+                low = middle + 1
+            elif raw > target:
+                high = middle
+            else:
+                self._index[key] = candidate
+                return candidate
+        return None
+
+    def __getitem__(self, key):
+        index = self._find(key) if isinstance(key, str) else None
+        if index is None:
+            raise KeyError(key)
+        return EntryView(self, index)
+
+    def __contains__(self, key):
+        return isinstance(key, str) and self._find(key) is not None
+
+    def __iter__(self):
+        for index in range(self._length):
+            yield self.string(self._records[index * RECORD_WORDS])
+
+    def __len__(self):
+        return self._length
+
+    def items(self):
+        for index in range(self._length):
+            yield self.string(self._records[index * RECORD_WORDS]), EntryView(self, index)
+
+    def _field(self, index, field, default):
+        base = index * RECORD_WORDS
+        layout = LAYOUT.get(field)
+        if layout is None:
+            return self._extra(base).get(field, default)
+        kind, bit, word = layout
+        flags = self._records[base + 1]
+        if not flags & (1 << bit):
+            return self._extra(base).get(field, default)
+        if kind == "STRING":
+            return self.string(self._records[base + word])
+        if kind == "BOOL":
+            return bool(flags & (1 << (bit + 16)))
+        offsets = self._group_offsets
+        if kind == "LIST":
+            group = self._records[base + word]
+            return [self.string(id_) for id_ in self._items[offsets[group]:offsets[group + 1]]]
+        start, count = self._records[base + word], self._records[base + word + 1]
+        return [[self.string(id_) for id_ in self._items[offsets[group]:offsets[group + 1]]]
+                for group in range(start, start + count)]
+
+    def may_contain(self, text):
+        """
+        False if no string of the deck contains text (one scan of the raw string
+        data). True can also come from two neighbouring strings.
+        """
+        return self._mmap.find(text.encode("utf-8"), self._data_start, self._data_end) != -1
+
+    def strings(self, field):
+        """
+        Every distinct string in a LIST or GROUPS field over all entries (e.g. all
+        used components), read from the items without decoding any entry.
+        """
+        kind, bit, word = LAYOUT[field]
+        records, offsets = self._records, self._group_offsets
+        ids = set()
+        found = set()
+        for index in range(self._length):
+            base = index * RECORD_WORDS
+            if not records[base + 1] & (1 << bit):
+                value = self._extra(base).get(field) # missing or not stored as groups
+                if isinstance(value, list):
+                    found.update(item for group in (value if kind == "GROUPS" else [value])
+                                 if isinstance(group, list) for item in group if isinstance(item, str))
+                continue
+            start = records[base + word]
+            count = 1 if kind == "LIST" else records[base + word + 1]
+            ids.update(self._items[offsets[start]:offsets[start + count]])
+        found.update(self.string(id_) for id_ in ids)
+        return found
+
+    def _extra(self, base):
+        id_ = self._records[base + EXTRA_WORD]
+        return {} if id_ == NONE else json.loads(self.string(id_))
+
+    def _fields(self, index):
+        """Field names of the entry in their original order."""
+        order = self.string(self._records[index * RECORD_WORDS + 2])
+        return order.split("\t") if order else []
+
+    def close(self):
+        for view in (self._string_offsets, self._string_data, self._records,
+                     self._key_order, self._group_offsets, self._items):
+            view.release()
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+_MISSING = object()
+
+
+class EntryView(Mapping):
+    """One entry of a Deck, read only. dict(view) gives an editable copy."""
+
+    __slots__ = ("_deck", "_index")
+
+    def __init__(self, deck, index):
+        self._deck = deck
+        self._index = index
+
+    def __getitem__(self, field):
+        value = self._deck._field(self._index, field, _MISSING)
+        if value is _MISSING:
+            raise KeyError(field)
+        return value
+
+    def get(self, field, default=None):
+        return self._deck._field(self._index, field, default)
+
+    def __contains__(self, field):
+        return self._deck._field(self._index, field, _MISSING) is not _MISSING
+
+    def __iter__(self):
+        return iter(self._deck._fields(self._index))
+
+    def __len__(self):
+        return len(self._deck._fields(self._index))
+
+    def __repr__(self):
+        return f"EntryView({dict(self)!r})"
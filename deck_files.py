@@ -0,0 +1,120 @@
+import hashlib
+import json
+import os
+
+#Content and state of the deck live in separate files.
+#  database.json          curation content, edited by the Python scripts (DatabaseStore)
+#  content/<hash>.json    compact build of database.json, named by its content hash.
+#                         It never changes, so the quiz can cache it forever.
+#  deck.json              manifest that points at the current content build
+#  state.json             scheduling state per card, written by the quiz server
+#The pipeline never writes state and the server never writes content, so a
+#graded answer only rewrites the (small) state file and a curation script can
+#not clobber review progress.
+#  python deck_files.py [--deck ID]  -> move the state out of database.json and build the content
+
+STATE_FIELDS = [
+    "interval", "repetition", "ease", "nextReview", "isDue", "dueIn",
+    "isMarked", "skipped", "wasSkipped", "isFalseNegative", "falseNegativeAnswer",
+    "stability", "difficulty",
+]  # same list as STATE_FIELDS in server.js
+
+manifest_filename = "deck.json"
+content_dirname = "content"
+state_filename = "state.json"
+
+
+def split_entry(entry):
+    """(content, state) of one database entry."""
+    content = {field: value for field, value in entry.items() if field not in STATE_FIELDS}
+    state = {field: value for field, value in entry.items() if field in STATE_FIELDS}
+    return content, state
+
+
+def split_database(database):
+    """(content, state) of the database, both keyword -> dict in database order."""
+    content, state = {}, {}
+    for key, entry in database.items():
+        content[key], state[key] = split_entry(entry)
+    return content, state
+
+
+def _write_atomic(path, text):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def build_content(content, directory="."):
+    """
+    Write the content build and point the manifest at it.
+    Older builds are removed. Returns the manifest.
+    """
+    text = json.dumps(content, ensure_ascii=False, separators=(",", ":"))
+    content_hash = hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+    content_dir = os.path.join(directory, content_dirname)
+    os.makedirs(content_dir, exist_ok=True)
+    filename = content_hash + ".json"
+    if not os.path.exists(os.path.join(content_dir, filename)):
+        _write_atomic(os.path.join(content_dir, filename), text)
+
+    manifest = {"hash": content_hash, "content": f"{content_dirname}/{filename}", "entries": len(content)}
+    _write_atomic(os.path.join(directory, manifest_filename), json.dumps(manifest, indent=2))
+    for name in os.listdir(content_dir):
+        if name.endswith(".json") and name != filename:
+            os.remove(os.path.join(content_dir, name))
+    return manifest
+
+
+def read_state(path=state_filename):
+    """keyword -> state, empty if there is no state file yet."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_state(state, path=state_filename):
+    """One card per line (like the server writes it), so a diff shows the reviewed cards."""
+    lines = (json.dumps(key, ensure_ascii=False) + ":" + json.dumps(fields, ensure_ascii=False, separators=(",", ":"))
+             for key, fields in state.items())
+    _write_atomic(path, "{\n" + ",\n".join(lines) + "\n}\n")
+
+
+def update_state(changes, path=state_filename, overwrite=True):
+    """
+    Merge keyword -> fields into the state file.
+    With overwrite=False only fields a card does not have yet are set (used to
+    adopt state that was still stored in database.json). Returns the changed keys.
+    """
+    state = read_state(path)
+    changed = []
+    for key, fields in changes.items():
+        card = state.setdefault(key, {})
+        new = {field: value for field, value in fields.items() if overwrite or field not in card}
+        if any(field not in card or card[field] != value for field, value in new.items()):
+            card.update(new)
+            changed.append(key)
+    if changed:
+        write_state(state, path)
+    return changed
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from database_store import DatabaseStore
+    from deck_registry import DeckRegistry, database_filename, deck_argument
+
+    parser = argparse.ArgumentParser(description="Move the state out of the database and build the content")
+    parser.add_argument("database", nargs="?", help="database file (default: the one of the deck)")
+    deck_argument(parser)
+    args = parser.parse_args()
+
+    store = DatabaseStore(args.database or DeckRegistry().deck_path(args.deck, database_filename))
+    store.export(force=True)
+    store.close()
+    with open(os.path.join(os.path.dirname(store.json_path), manifest_filename), "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    print(f"✅ {manifest['entries']} entries in {manifest['content']}")
@@ -0,0 +1,228 @@
+import argparse
+import json
+import os
+import re
+
+from database_store import DatabaseStore
+from deck_binary import Deck
+
+#Registry of the decks (decks.json).
+#Every dataset (Heisig Simplified, Traditional, Kanji, a custom network) is a deck
+#with its own directory holding its own database.json, store, content build,
+#state.json, review log and answer index, so the pipeline of one deck never reads
+#or writes the files of another one. Settings that used to be constants in the
+#scripts (like the Heisig Sequenz limits) are stored per deck.
+#A component may point into another deck as "<deck>::<keyword>". Such references
+#are resolved lazily: only the decks that are actually referenced are opened,
+#through their compiled deck file (deck_binary), and only the referenced entries
+#are decoded (see DeckRegistry.references).
+#  python deck_registry.py                               -> list the decks
+#  python deck_registry.py add kanji "Remembering the Kanji" --sequenz-limit 2200
+#  python deck_registry.py default kanji
+
+registry_filename = "decks.json"
+database_filename = "database.json"
+
+SEPARATOR = "::"
+DECK_ID_PATTERN = re.compile(r"^[a-z0-9][a-z0-9_-]*$") # also used in the URLs of the server
+REFERENCE_FIELDS = ["primary_components", "expanded_components", "components", "components_backup"]
+
+
+class UnknownDeckError(ValueError):
+    """A deck id that is not in the registry."""
+
+
+def split_reference(reference):
+    """(deck, keyword) of a "<deck>::<keyword>" reference, (None, reference) for a plain keyword."""
+    deck, separator, keyword = reference.partition(SEPARATOR)
+    if not separator or not DECK_ID_PATTERN.match(deck):
+        return None, reference
+    return deck, keyword
+
+
+def keyword_of(reference):
+    """The keyword of a component without its deck, e.g. for the names the quiz accepts."""
+    return split_reference(reference)[1]
+
+
+def references_of(entry):
+    """Every component of the entry that points into another deck."""
+    return {c for field in REFERENCE_FIELDS for group in entry.get(field) or [] if isinstance(group, list)
+            for c in group if SEPARATOR in c}
+
+
+class DeckRegistry:
+    """
+    The decks of decks.json and their stores, which are opened on first use.
+
+    path: The registry file, deck directories are relative to it. Without the
+    file there is one deck, "default", in the same directory (the layout from
+    before the registry).
+    """
+
+    def __init__(self, path=registry_filename):
+        self.path = path
+        self.directory = os.path.dirname(os.path.abspath(path))
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                registry = json.load(f)
+        else:
+            registry = {"default": "default", "decks": {"default": {"name": "Default", "directory": "."}}}
+        self.decks = registry["decks"]
+        self.default = registry.get("default") or next(iter(self.decks))
+        self._stores = {}
+        self._views = {}
+
+    def resolve(self, deck_id=None):
+        """The deck id itself, or the default deck for None."""
+        deck_id = deck_id or self.default
+        if deck_id not in self.decks:
+            raise UnknownDeckError(f"Unknown deck '{deck_id}', known decks: {', '.join(self.decks)}")
+        return deck_id
+
+    def setting(self, deck_id, name, default=None):
+        return self.decks[self.resolve(deck_id)].get(name, default)
+
+    def deck_directory(self, deck_id=None):
+        return os.path.normpath(os.path.join(self.directory, self.setting(deck_id, "directory", ".")))
+
+    def deck_path(self, deck_id, filename):
+        """Path of one of the deck's files, e.g. deck_path("kanji", "state.json")."""
+        return os.path.join(self.deck_directory(deck_id), filename)
+
+    # -------------------- Stores --------------------
+
+    def store(self, deck_id=None):
+        """The DatabaseStore of the deck, opened on first use and kept until close()."""
+        deck_id = self.resolve(deck_id)
+        store = self._stores.get(deck_id)
+        if store is None:
+            store = self._stores[deck_id] = DatabaseStore(self.deck_path(deck_id, database_filename))
+        return store
+
+    def view(self, deck_id=None):
+        """Read only view (deck_binary.Deck) of the deck, opened on first use."""
+        deck_id = self.resolve(deck_id)
+        view = self._views.get(deck_id)
+        if view is None:
+            view = self._views[deck_id] = self.store(deck_id).view()
+        return view
+
+    def close(self):
+        for view in self._views.values():
+            view.close()
+        for store in self._stores.values():
+            store.close()
+        self._views.clear()
+        self._stores.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    # -------------------- References --------------------
+
+    def split(self, reference, deck_id):
+        """(deck, keyword) of a component used in deck_id. Unknown deck prefixes are part of the keyword."""
+        deck, keyword = split_reference(reference)
+        if deck is None or deck not in self.decks:
+            return deck_id, reference
+        return deck, keyword
+
+    def qualify(self, reference, source, target):
+        """A component used in deck source, written as seen from deck target."""
+        deck, keyword = self.split(reference, source)
+        return keyword if deck == target else f"{deck}{SEPARATOR}{keyword}"
+
+    def references(self, deck_id, database):
+        """
+        Entries of other decks the database refers to, directly or through other
+        referenced entries, as qualified reference -> entry. Their components are
+        qualified as seen from deck_id, so the result can be chained with the
+        database (ChainMap(database, references)) for the graph passes.
+        References to missing keywords are left out (lint reports them).
+        """
+        deck_id = self.resolve(deck_id)
+        found = {}
+        if isinstance(database, Deck): # the strings of the fields, without decoding every entry
+            if not database.may_contain(SEPARATOR):
+                return found
+            todo = [c for field in REFERENCE_FIELDS for c in database.strings(field) if SEPARATOR in c]
+        else:
+            todo = [c for entry in database.values() for c in references_of(entry)]
+        while todo:
+            reference = todo.pop()
+            if reference in found:
+                continue
+            deck, keyword = self.split(reference, deck_id)
+            if deck == deck_id:
+                continue
+            view = self.view(deck)
+            if keyword not in view:
+                continue
+            entry = dict(view[keyword])
+            for field in REFERENCE_FIELDS:
+                if isinstance(entry.get(field), list):
+                    entry[field] = [[self.qualify(c, deck, deck_id) for c in group] for group in entry[field]]
+            found[reference] = entry
+            todo.extend(references_of(entry))
+        return found
+
+    # -------------------- Editing --------------------
+
+    def add(self, deck_id, name, directory=None, **settings):
+        """Register a new deck (with an empty database if its directory has none) and save the registry."""
+        if not DECK_ID_PATTERN.match(deck_id):
+            raise ValueError(f"Deck ids are lower case letters, digits, '-' and '_', not '{deck_id}'")
+        if deck_id in self.decks:
+            raise ValueError(f"Deck '{deck_id}' already exists")
+        self.decks[deck_id] = {"name": name, "directory": directory or f"decks/{deck_id}", **settings}
+        json_path = self.deck_path(deck_id, database_filename)
+        os.makedirs(os.path.dirname(json_path), exist_ok=True)
+        if not os.path.exists(json_path):
+            with open(json_path, "w", encoding="utf-8") as f:
+                f.write("{}\n")
+        self.save()
+
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"default": self.default, "decks": self.decks}, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        os.replace(tmp_path, self.path)
+
+
+def deck_argument(parser):
+    """Add the --deck option every pipeline script takes."""
+    parser.add_argument("--deck", help="deck of decks.json to work on (default: the registry's default deck)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="List and register decks")
+    commands = parser.add_subparsers(dest="command")
+    add_parser = commands.add_parser("add", help="register a new deck")
+    add_parser.add_argument("id")
+    add_parser.add_argument("name")
+    add_parser.add_argument("--directory", help="default: decks/<id>")
+    add_parser.add_argument("--sequenz-limit", type=int, help="Sequenz up to which answers are expanded")
+    add_parser.add_argument("--active-limit", type=int, help="Sequenz up to which imported cards are active")
+    default_parser = commands.add_parser("default", help="set the default deck")
+    default_parser.add_argument("id")
+    args = parser.parse_args()
+
+    registry = DeckRegistry()
+    if args.command == "add":
+        settings = {name: value for name, value in
+                    (("sequenz_limit", args.sequenz_limit), ("active_limit", args.active_limit)) if value is not None}
+        registry.add(args.id, args.name, args.directory, **settings)
+        print(f"✅ Deck '{args.id}' registered in {registry.deck_directory(args.id)}")
+    elif args.command == "default":
+        registry.default = registry.resolve(args.id)
+        registry.save()
+        print(f"✅ Default deck: {args.id}")
+    else:
+        for deck_id, settings in registry.decks.items():
+            marker = "*" if deck_id == registry.default else " "
+            print(f"{marker} {deck_id:20s} {settings.get('name', '')}  ({registry.deck_directory(deck_id)})")
@@ -0,0 +1,271 @@
+// Decks of the quiz server. Every deck of decks.json (see deck_registry.py) has its
+// own directory with its content build, state.json, review log and answer index,
+// and its own copy of everything the server keeps in memory. A deck is only read
+// when it is first requested, so the decks that are not studied in a session cost
+// nothing, and a write to one deck never touches the files of another.
+const fs = require('fs');
+const path = require('path');
+const crypto = require('crypto');
+const { DueQueue } = require('./dueQueue');
+const { cachedResponse } = require('./cachedResponse');
+
+// -------------------- Database in memory --------------------
+// Content and scheduling state are separate files (see deck_files.py). The content
+// build is written by the Python pipeline and never by the server, it is read again
+// when deck.json points at a new build. The state is kept in memory, updates change
+// it and schedule a write: all updates within WRITE_DELAY_MS end up in one write of
+// state.json to a temp file, which is then renamed over it (atomic). When state.json
+// was replaced by someone else (e.g. fsrs.py) it is read again and the updates that
+// were not written yet are applied on top.
+// db is the merged view (content + state of every card) the quiz works on.
+const WRITE_DELAY_MS = 200;
+
+// Same list as STATE_FIELDS in deck_files.py
+const STATE_FIELDS = ['interval', 'repetition', 'ease', 'nextReview', 'isDue', 'dueIn',
+    'isMarked', 'skipped', 'wasSkipped', 'isFalseNegative', 'falseNegativeAnswer',
+    'stability', 'difficulty'];
+
+// Quiz payload: only the due quizzable cards and only the fields the quiz uses
+const QUIZ_FIELDS = ['hanzi', 'interval', 'repetition', 'ease', 'nextReview', 'isDue',
+    'isFalseNegative', 'falseNegativeAnswer', 'skipped', 'isMarked'];
+
+function mtimeOf(file) {
+    try {
+        return fs.statSync(file).mtimeMs;
+    } catch (err) {
+        return null;
+    }
+}
+
+function pickState(fields) {
+    const picked = {};
+    for (const field of STATE_FIELDS) {
+        if (field in fields) picked[field] = fields[field];
+    }
+    return picked;
+}
+
+// One card per line (like deck_files.write_state), so a diff shows the reviewed cards
+function serializeState(state) {
+    const lines = Object.entries(state).map(([key, fields]) => JSON.stringify(key) + ':' + JSON.stringify(fields));
+    return '{\n' + lines.join(',\n') + '\n}\n';
+}
+
+class Deck {
+    constructor(id, settings, directory) {
+        this.id = id;
+        this.name = settings.name || id;
+        this.directory = directory;
+        this.dbPath = this.file('database.json');     // content, see loadContent
+        this.manifestPath = this.file('deck.json');   // content build of deck_files.py
+        this.statePath = this.file('state.json');     // scheduling state, written here
+        this.reviewLogPath = this.file('reviews.jsonl'); // append-only, read by review_log.py
+        this.answerIndexPath = this.file('answer_index.json');
+        this.quizStatusPath = this.file('quiz_status.json');
+        this.tmpPath = this.statePath + '.server.tmp';
+
+        this.content = null;            // cached response of the content build, plus hash and entries
+        this.contentSignature = null;
+        this.state = null;              // key -> state fields
+        this.stateMtime = null;
+        this.db = null;
+        this.quizCache = null;          // see quizPayload
+        this.dueQueue = new DueQueue(); // quizzable cards by nextReview, kept in sync with db
+        this.pending = new Map();       // key -> state, updates not on disk yet
+        this.waiting = [];              // requests waiting for the next write
+        this.writeTimer = null;
+        this.writeChain = Promise.resolve();
+        this.answerIndexCache = null;
+        this.backupMtime = null;
+    }
+
+    file(name) {
+        return path.join(this.directory, name);
+    }
+
+    // Returns true when the content changed. Without a build (deck_files.py was never
+    // run) database.json itself is the content.
+    loadContent() {
+        const manifestMtime = mtimeOf(this.manifestPath);
+        const signature = manifestMtime !== null ? `deck:${manifestMtime}` : `database:${fs.statSync(this.dbPath).mtimeMs}`;
+        if (signature === this.contentSignature) return false;
+        let body, hash;
+        if (manifestMtime !== null) {
+            const manifest = JSON.parse(fs.readFileSync(this.manifestPath, 'utf8'));
+            if (this.content && manifest.hash === this.content.hash) {
+                this.contentSignature = signature;
+                return false;
+            }
+            body = fs.readFileSync(this.file(manifest.content), 'utf8');
+            hash = manifest.hash;
+        } else {
+            body = fs.readFileSync(this.dbPath, 'utf8');
+            hash = crypto.createHash('sha1').update(body).digest('hex').slice(0, 16);
+        }
+        this.content = cachedResponse(body, `"${hash}"`);
+        this.content.hash = hash;
+        this.content.entries = JSON.parse(body);
+        this.contentSignature = signature;
+        return true;
+    }
+
+    // Returns true when state.json was read again
+    loadState() {
+        const mtime = mtimeOf(this.statePath);
+        if (this.state !== null && mtime === this.stateMtime) return false;
+        this.state = mtime === null ? {} : JSON.parse(fs.readFileSync(this.statePath, 'utf8'));
+        this.stateMtime = mtime;
+        for (const [key, fields] of this.pending) this.state[key] = fields;
+        return true;
+    }
+
+    getDatabase() {
+        const contentChanged = this.loadContent();
+        const stateChanged = this.loadState();
+        if (this.db === null || contentChanged || stateChanged) {
+            this.db = {};
+            for (const [key, entry] of Object.entries(this.content.entries)) {
+                this.db[key] = { ...entry, ...this.state[key] };
+            }
+            this.dueQueue = DueQueue.fromDatabase(this.db);
+            this.quizCache = null;
+        }
+        return this.db;
+    }
+
+    // The given state fields of each card are replaced. Content fields and unknown
+    // keys are ignored, the content belongs to the Python pipeline.
+    updateEntries(entries) {
+        const database = this.getDatabase();
+        for (const [key, fields] of Object.entries(entries)) {
+            if (!(key in database)) continue;
+            const changes = pickState(fields);
+            this.state[key] = { ...this.state[key], ...changes };
+            database[key] = { ...database[key], ...changes };
+            this.pending.set(key, this.state[key]);
+            this.dueQueue.update(key, database[key]); // O(log n) per card
+        }
+        this.quizCache = null;
+        return this.persist();
+    }
+
+    // Resolves once a write that contains every update made so far is on disk
+    persist() {
+        return new Promise((resolve, reject) => {
+            this.waiting.push({ resolve, reject });
+            if (!this.writeTimer) this.writeTimer = setTimeout(() => this.flush(), WRITE_DELAY_MS);
+        });
+    }
+
+    flush() {
+        this.writeTimer = null;
+        const batch = this.waiting;
+        this.waiting = [];
+        // Writes run one after another, each one serializes the current state
+        this.writeChain = this.writeChain.then(() => this.writeState()).then(
+            () => batch.forEach(w => w.resolve()),
+            err => batch.forEach(w => w.reject(err)));
+    }
+
+    async writeState() {
+        this.getDatabase(); // pick up changes made by someone else before overwriting them
+        const written = new Map(this.pending);
+        await fs.promises.writeFile(this.tmpPath, serializeState(this.state));
+        await fs.promises.rename(this.tmpPath, this.statePath);
+        this.stateMtime = (await fs.promises.stat(this.statePath)).mtimeMs;
+        for (const [key, fields] of written) {
+            if (this.pending.get(key) === fields) this.pending.delete(key);
+        }
+    }
+
+    // Cached until the next write or until the next card becomes due
+    quizPayload() {
+        const database = this.getDatabase();
+        const now = Date.now();
+        if (this.quizCache && now < this.quizCache.validUntil) return this.quizCache;
+        const due = this.dueQueue.due(now);
+        const cards = {};
+        for (const key of due) {
+            const entry = database[key];
+            const card = {};
+            for (const field of QUIZ_FIELDS) {
+                if (field in entry) card[field] = entry[field];
+            }
+            card.answer = entry.expanded_components[0]; // shown when the answer was wrong
+            cards[key] = card;
+        }
+        this.quizCache = cachedResponse(JSON.stringify({ due, cards }));
+        this.quizCache.validUntil = this.dueQueue.nextDue(now);
+        return this.quizCache;
+    }
+
+    // The answer index (answer_index.py) is needed for grading, cached until the file
+    // changes. Throws when the deck has no index yet.
+    answerIndex() {
+        const mtime = fs.statSync(this.answerIndexPath).mtimeMs;
+        if (!this.answerIndexCache || this.answerIndexCache.mtime !== mtime) {
+            this.answerIndexCache = cachedResponse(fs.readFileSync(this.answerIndexPath, 'utf8'));
+            this.answerIndexCache.mtime = mtime;
+        }
+        return this.answerIndexCache;
+    }
+
+    // Back up the state (only when it changed since the last backup), the content is in git
+    backupState() {
+        if (this.stateMtime === null || this.backupMtime === this.stateMtime) return;
+        this.backupMtime = this.stateMtime;
+        fs.copyFile(this.statePath, this.file('state_backup.json'), backupErr => {
+            if (backupErr) console.error('Failed to create backup:', backupErr);
+        });
+    }
+}
+
+// decks.json as written by deck_registry.py. Without it the server directory is the
+// only deck (the layout from before the registry). The file is read again when a
+// deck is requested that it did not know yet, so new decks need no restart.
+class DeckRegistry {
+    constructor(directory) {
+        this.directory = directory;
+        this.path = path.join(directory, 'decks.json');
+        this.mtime = undefined;
+        this.decks = new Map(); // id -> Deck, created on first request
+        this.load();
+    }
+
+    load() {
+        const mtime = mtimeOf(this.path);
+        if (mtime === this.mtime) return;
+        this.mtime = mtime;
+        const registry = mtime === null
+            ? { default: 'default', decks: { default: { name: 'Default', directory: '.' } } }
+            : JSON.parse(fs.readFileSync(this.path, 'utf8'));
+        this.settings = registry.decks;
+        this.default = registry.default || Object.keys(registry.decks)[0];
+    }
+
+    // The deck (the default deck for no id), null if there is no such deck
+    get(id = null) {
+        id = id || this.default;
+        if (!(id in this.settings)) this.load();
+        if (!(id in this.settings)) return null;
+        let deck = this.decks.get(id);
+        if (!deck) {
+            const settings = this.settings[id];
+            deck = new Deck(id, settings, path.resolve(this.directory, settings.directory || '.'));
+            this.decks.set(id, deck);
+        }
+        return deck;
+    }
+
+    list() {
+        this.load();
+        return Object.entries(this.settings).map(([id, settings]) => ({
+            id,
+            name: settings.name || id,
+            default: id === this.default,
+            loaded: this.decks.has(id),
+        }));
+    }
+}
+
+module.exports = { Deck, DeckRegistry, STATE_FIELDS };
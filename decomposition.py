@@ -0,0 +1,30 @@
+#Decomposition trees of the import (make database json.py expands the same trees with an Expander).
+#A tree is a nested dict component -> subtree, leaves map to {}. Only the minimal
+#components of a character (ComponentGraph.minimal) become its children.
+
+
+def decompose(char, db, graph):
+    """
+    Decomposition tree of char.
+    db: keyword -> every component keyword of it (ComponentsSearch), graph: ComponentGraph(db)
+    """
+    comps_list = db.get(char, [])
+    
+    # If no components → return leaf
+    if not comps_list:
+        return {char: {}}   # empty dict, not set
+    
+    elif len(comps_list) <= 2:
+        # each component is a leaf
+        return {c: {} for c in comps_list}
+    else:
+        # Drop every component that is already a component of another one (bitset check)
+        minimal = graph.minimal(comps_list)
+        return {a: decompose(a, db, graph) for a in minimal}
+
+# Pretty printing of decomposition tree
+def print_tree(tree, indent=0):
+    for key in tree.keys():
+        print("    " * indent + key)
+        if isinstance(tree[key], dict) and len(tree[key]) > 1:
+            print_tree(tree[key], indent + 1)
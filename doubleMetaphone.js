@@ -0,0 +1,353 @@
+// Double Metaphone for the quiz's phonetic fallback, vendored next to script.js so
+// the browser always has it (nothing from node_modules is served). It is a line
+// by line port of the Python "metaphone" package (0.6) that answer_index.py builds
+// the phonetic keys with, quirks included, so the codes of a spoken word match the
+// codes in the answer index exactly.
+//
+// Copyright (c) 2007 Andrew Collins, Chris Leong
+// Copyright (c) 2009 Matthew Somerville
+// Copyright (c) 2010 Maximillian Dornseif, Richard Barran
+// Copyright (c) 2012 Duncan McGreggor
+// All rights reserved.
+//
+// Redistribution and use in source and binary forms, with or without
+// modification, are permitted provided that the following conditions are met:
+// * Redistributions of source code must retain the above copyright notice, this
+//   list of conditions and the following disclaimer.
+// * Redistributions in binary form must reproduce the above copyright notice,
+//   this list of conditions and the following disclaimer in the documentation
+//   and/or other materials provided with the distribution.
+// Neither the name "Metaphone" nor the names of its contributors may be used to
+// endorse or promote products derived from this software without specific prior
+// written permission.
+//
+// THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
+// ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+// WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+// DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+// FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+// DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+// SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+// CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+// OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+// OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+const VOWELS = ['A', 'E', 'I', 'O', 'U', 'Y'];
+const SILENT_STARTERS = ['GN', 'KN', 'PN', 'WR', 'PS'];
+const PREPAD = '--';
+const POSTPAD = '------';
+
+// [primary, secondary] codes of the input, secondary is '' when it equals primary
+// (like doublemetaphone() of the Python package)
+export function doubleMetaphone(input) {
+  const upper = input.replace(/[Çç]/g, 's').normalize('NFD').replace(/\p{Mn}/gu, '').toUpperCase();
+  // padded, so the rules can look beyond the start and the end of the word
+  const buffer = PREPAD + upper + POSTPAD;
+  const start = PREPAD.length;
+  const end = start + upper.length - 1;
+  const slavoGermanic = /W|K|CZ/.test(upper);
+  // Python indexing: slices clamp like String.slice
+  const at = i => buffer.charAt(i);
+  const sub = (from, to) => buffer.slice(from, to);
+  const isVowel = i => VOWELS.includes(at(i));
+
+  let position = start;
+  let primary = '';
+  let secondary = '';
+  // [code, advance] for both codes, or [primary, secondary, advance]
+  let next = [null, 1];
+
+  if (SILENT_STARTERS.includes(sub(start, start + 2))) position += 1;
+  if (at(start) === 'X') {
+    primary = secondary = 'S';
+    position += 1;
+  }
+
+  const rules = {
+    B() {
+      next = at(position + 1) === 'B' ? ['P', 2] : ['P', 1];
+    },
+    C() {
+      if (position > start + 1
+          && !isVowel(position - 2)
+          && sub(position - 1, position + 2) === 'ACH'
+          && at(position + 2) !== 'I'
+          && (at(position + 2) !== 'E' || ['BACHER', 'MACHER'].includes(sub(position - 2, position + 4)))) {
+        next = ['K', 2];
+      } else if (position === start && sub(start, start + 6) === 'CAESAR') {
+        next = ['S', 2];
+      } else if (sub(position, position + 4) === 'CHIA') {
+        next = ['K', 2];
+      } else if (sub(position, position + 2) === 'CH') {
+        if (position > start && sub(position, position + 4) === 'CHAE') {
+          next = ['K', 'X', 2];
+        } else if (position === start
+            && (['HARAC', 'HARIS'].includes(sub(position + 1, position + 6))
+                || ['HOR', 'HYM', 'HIA', 'HEM'].includes(sub(position + 1, position + 4)))
+            && sub(start, start + 5) !== 'CHORE') {
+          next = ['K', 2];
+        } else if (['VAN ', 'VON '].includes(sub(start, start + 4))
+            || sub(start, start + 3) === 'SCH'
+            || ['ORCHES', 'ARCHIT', 'ORCHID'].includes(sub(position - 2, position + 4))
+            || ['T', 'S'].includes(at(position + 2))
+            || ((['A', 'O', 'U', 'E'].includes(at(position - 1)) || position === start)
+                && ['L', 'R', 'N', 'M', 'B', 'H', 'F', 'V', 'W'].includes(at(position + 2)))) {
+          next = ['K', 2];
+        } else if (position > start) {
+          next = sub(start, start + 2) === 'MC' ? ['K', 2] : ['X', 'K', 2];
+        } else {
+          next = ['X', 2];
+        }
+      } else if (sub(position, position + 2) === 'CZ' && sub(position - 2, position + 2) !== 'WICZ') {
+        next = ['S', 'X', 2];
+      } else if (sub(position + 1, position + 4) === 'CIA') {
+        next = ['X', 3];
+      } else if (sub(position, position + 2) === 'CC' && !(position === start + 1 && at(start) === 'M')) {
+        if (['I', 'E', 'H'].includes(at(position + 2)) && sub(position + 2, position + 4) !== 'HU') {
+          if ((position === start + 1 && at(start) === 'A')
+              || ['UCCEE', 'UCCES'].includes(sub(position - 1, position + 4))) {
+            next = ['KS', 3];
+          } else {
+            next = ['X', 3];
+          }
+        } else {
+          next = ['K', 2];
+        }
+      } else if (['CK', 'CG', 'CQ'].includes(sub(position, position + 2))) {
+        next = ['K', 2];
+      } else if (['CI', 'CE', 'CY'].includes(sub(position, position + 2))) {
+        next = ['CIO', 'CIE', 'CIA'].includes(sub(position, position + 3)) ? ['S', 'X', 2] : ['S', 2];
+      } else if ([' C', ' Q', ' G'].includes(sub(position + 1, position + 3))) {
+        next = ['K', 3];
+      } else if (['C', 'K', 'Q'].includes(at(position + 1)) && !['CE', 'CI'].includes(sub(position + 1, position + 3))) {
+        next = ['K', 2];
+      } else {
+        next = ['K', 1];
+      }
+    },
+    D() {
+      if (sub(position, position + 2) === 'DG') {
+        next = ['I', 'E', 'Y'].includes(at(position + 2)) ? ['J', 3] : ['TK', 2];
+      } else if (['DT', 'DD'].includes(sub(position, position + 2))) {
+        next = ['T', 2];
+      } else {
+        next = ['T', 1];
+      }
+    },
+    F() {
+      next = at(position + 1) === 'F' ? ['F', 2] : ['F', 1];
+    },
+    G() {
+      if (at(position + 1) === 'H') {
+        if (position > start && !isVowel(position - 1)) {
+          next = ['K', 2];
+        } else if (position < start + 3) {
+          if (position === start) next = at(position + 2) === 'I' ? ['J', 2] : ['K', 2];
+        } else if ((position > start + 1 && ['B', 'H', 'D'].includes(at(position - 2)))
+            || (position > start + 2 && ['B', 'H', 'D'].includes(at(position - 3)))
+            || (position > start + 3 && ['B', 'H'].includes(at(position - 4)))) {
+          next = [null, 2];
+        } else if (position > start + 2 && at(position - 1) === 'U'
+            && ['C', 'G', 'L', 'R', 'T'].includes(at(position - 3))) {
+          next = ['F', 2];
+        } else if (position > start && at(position - 1) !== 'I') {
+          next = ['K', 2];
+        }
+      } else if (at(position + 1) === 'N') {
+        if (position === start + 1 && isVowel(start) && !slavoGermanic) {
+          next = ['KN', 'N', 2];
+        } else if (sub(position + 2, position + 4) !== 'EY' && at(position + 1) !== 'Y' && !slavoGermanic) {
+          next = ['N', 'KN', 2];
+        } else {
+          next = ['KN', 2];
+        }
+      } else if (sub(position + 1, position + 3) === 'LI' && !slavoGermanic) {
+        next = ['KL', 'L', 2];
+      } else if (position === start
+          && (at(position + 1) === 'Y'
+              || ['ES', 'EP', 'EB', 'EL', 'EY', 'IB', 'IL', 'IN', 'IE', 'EI', 'ER'].includes(sub(position + 1, position + 3)))) {
+        next = ['K', 'J', 2];
+      } else if ((sub(position + 1, position + 3) === 'ER' || at(position + 1) === 'Y')
+          && !['DANGER', 'RANGER', 'MANGER'].includes(sub(start, start + 6))
+          && !['E', 'I'].includes(at(position - 1))
+          && !['RGY', 'OGY'].includes(sub(position - 1, position + 2))) {
+        next = ['K', 'J', 2];
+      } else if (['E', 'I', 'Y'].includes(at(position + 1)) || ['AGGI', 'OGGI'].includes(sub(position - 1, position + 3))) {
+        if (['VON ', 'VAN '].includes(sub(start, start + 4))
+            || sub(start, start + 3) === 'SCH'
+            || sub(position + 1, position + 3) === 'ET') {
+          next = ['K', 2];
+        } else {
+          next = sub(position + 1, position + 5) === 'IER ' ? ['J', 2] : ['J', 'K', 2];
+        }
+      } else if (at(position + 1) === 'G') {
+        next = ['K', 2];
+      } else {
+        next = ['K', 1];
+      }
+    },
+    H() {
+      next = (position === start || isVowel(position - 1)) && isVowel(position + 1) ? ['H', 2] : [null, 1];
+    },
+    J() {
+      if (sub(position, position + 4) === 'JOSE' || sub(start, start + 4) === 'SAN ') {
+        next = (position === start && at(position + 4) === ' ') || sub(start, start + 4) === 'SAN ' ? ['H'] : ['J', 'H'];
+      } else if (position === start && sub(position, position + 4) !== 'JOSE') {
+        next = ['J', 'A'];
+      } else if (isVowel(position - 1) && !slavoGermanic && ['A', 'O'].includes(at(position + 1))) {
+        next = ['J', 'H'];
+      } else if (position === end) {
+        next = ['J', ' '];
+      } else if (!['L', 'T', 'K', 'S', 'N', 'M', 'B', 'Z'].includes(at(position + 1))
+          && !['S', 'K', 'L'].includes(at(position - 1))) {
+        next = ['J'];
+      } else {
+        next = [null];
+      }
+      next = next.concat(at(position + 1) === 'J' ? 2 : 1);
+    },
+    K() {
+      next = at(position + 1) === 'K' ? ['K', 2] : ['K', 1];
+    },
+    L() {
+      if (at(position + 1) === 'L') {
+        if ((position === end - 2 && ['ILLO', 'ILLA', 'ALLE'].includes(sub(position - 1, position + 3)))
+            || ((['AS', 'OS'].includes(sub(end - 1, end + 1)) || ['A', 'O'].includes(at(end)))
+                && sub(position - 1, position + 3) === 'ALLE')) {
+          next = ['L', '', 2];
+        } else {
+          next = ['L', 2];
+        }
+      } else {
+        next = ['L', 1];
+      }
+    },
+    M() {
+      next = (sub(position + 1, position + 4) === 'UMB'
+              && (position + 1 === end || sub(position + 2, position + 4) === 'ER'))
+          || at(position + 1) === 'M' ? ['M', 2] : ['M', 1];
+    },
+    N() {
+      next = at(position + 1) === 'N' ? ['N', 2] : ['N', 1];
+    },
+    P() {
+      if (at(position + 1) === 'H') next = ['F', 2];
+      else if (['P', 'B'].includes(at(position + 1))) next = ['P', 2];
+      else next = ['P', 1];
+    },
+    Q() {
+      next = at(position + 1) === 'Q' ? ['K', 2] : ['K', 1];
+    },
+    R() {
+      next = position === end && !slavoGermanic && sub(position - 2, position) === 'IE'
+          && !['ME', 'MA'].includes(sub(position - 4, position - 2)) ? ['', 'R'] : ['R'];
+      next = next.concat(at(position + 1) === 'R' ? 2 : 1);
+    },
+    S() {
+      if (['ISL', 'YSL'].includes(sub(position - 1, position + 2))) {
+        next = [null, 1];
+      } else if (position === start && sub(start, start + 5) === 'SUGAR') {
+        next = ['X', 'S', 1];
+      } else if (sub(position, position + 2) === 'SH') {
+        next = ['HEIM', 'HOEK', 'HOLM', 'HOLZ'].includes(sub(position + 1, position + 5)) ? ['S', 2] : ['X', 2];
+      } else if (['SIO', 'SIA'].includes(sub(position, position + 3)) || sub(position, position + 4) === 'SIAN') {
+        next = slavoGermanic ? ['S', 3] : ['S', 'X', 3];
+      } else if ((position === start && ['M', 'N', 'L', 'W'].includes(at(position + 1))) || at(position + 1) === 'Z') {
+        next = ['S', 'X', at(position + 1) === 'Z' ? 2 : 1];
+      } else if (sub(position, position + 2) === 'SC') {
+        if (at(position + 2) === 'H') {
+          if (['OO', 'ER', 'EN', 'UY', 'ED', 'EM'].includes(sub(position + 3, position + 5))) {
+            next = ['ER', 'EN'].includes(sub(position + 3, position + 5)) ? ['X', 'SK', 3] : ['SK', 3];
+          } else if (position === start && !isVowel(start + 3) && at(start + 3) !== 'W') {
+            next = ['X', 'S', 3];
+          } else {
+            next = ['X', 3];
+          }
+        } else if (['I', 'E', 'Y'].includes(at(position + 2))) {
+          next = ['S', 3];
+        } else {
+          next = ['SK', 3];
+        }
+      } else if (position === end && ['AI', 'OI'].includes(sub(position - 2, position))) {
+        next = ['', 'S', 1];
+      } else {
+        next = ['S', ['S', 'Z'].includes(at(position + 1)) ? 2 : 1];
+      }
+    },
+    T() {
+      if (sub(position, position + 4) === 'TION') {
+        next = ['X', 3];
+      } else if (['TIA', 'TCH'].includes(sub(position, position + 3))) {
+        next = ['X', 3];
+      } else if (sub(position, position + 2) === 'TH' || sub(position, position + 3) === 'TTH') {
+        next = ['OM', 'AM'].includes(sub(position + 2, position + 4))
+            || ['VON ', 'VAN '].includes(sub(start, start + 4))
+            || sub(start, start + 3) === 'SCH' ? ['T', 2] : ['0', 'T', 2];
+      } else if (['T', 'D'].includes(at(position + 1))) {
+        next = ['T', 2];
+      } else {
+        next = ['T', 1];
+      }
+    },
+    V() {
+      next = at(position + 1) === 'V' ? ['F', 2] : ['F', 1];
+    },
+    W() {
+      if (sub(position, position + 2) === 'WR') {
+        next = ['R', 2];
+      } else if (position === start && (isVowel(position + 1) || sub(position, position + 2) === 'WH')) {
+        next = isVowel(position + 1) ? ['A', 'F', 1] : ['A', 1];
+      } else if ((position === end && isVowel(position - 1))
+          || ['EWSKI', 'EWSKY', 'OWSKI', 'OWSKY'].includes(sub(position - 1, position + 4))
+          || sub(start, start + 3) === 'SCH') {
+        next = ['', 'F', 1];
+      } else if (['WICZ', 'WITZ'].includes(sub(position, position + 4))) {
+        next = ['TS', 'FX', 4];
+      } else {
+        next = [null, 1];
+      }
+    },
+    X() {
+      next = position === end && (['IAU', 'EAU'].includes(sub(position - 3, position))
+          || ['AU', 'OU'].includes(sub(position - 2, position))) ? [null] : ['KS'];
+      next = next.concat(['C', 'X'].includes(at(position + 1)) ? 2 : 1);
+    },
+    Z() {
+      if (at(position + 1) === 'H') {
+        next = ['J'];
+      } else if (['ZO', 'ZI', 'ZA'].includes(sub(position + 1, position + 3))
+          || (slavoGermanic && position > start && at(position - 1) !== 'T')) {
+        next = ['S', 'TS'];
+      } else {
+        next = ['S'];
+      }
+      next = next.concat(at(position + 1) === 'Z' || at(position + 1) === 'H' ? 2 : 1);
+    },
+  };
+
+  while (position <= end) {
+    const character = at(position);
+    if (VOWELS.includes(character)) {
+      // all initial vowels map to 'A', the others are skipped
+      next = position === start ? ['A', 1] : [null, 1];
+    } else if (character === ' ') {
+      position += 1;
+      continue;
+    } else if (rules[character]) {
+      rules[character]();
+    }
+    // Any other character repeats the step before (like the Python package)
+    if (next.length === 2) {
+      if (next[0]) {
+        primary += next[0];
+        secondary += next[0];
+      }
+      position += next[1];
+    } else if (next.length === 3) {
+      if (next[0]) primary += next[0];
+      if (next[1]) secondary += next[1];
+      position += next[2];
+    }
+  }
+  return [primary, primary === secondary ? '' : secondary];
+}
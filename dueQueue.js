@@ -0,0 +1,159 @@
+// Due queue for the quiz: the quizzable cards in a binary min-heap keyed by the
+// nextReview timestamp. The heap keeps the position of every key, so a graded card
+// is moved in O(log n) and the next N due cards are found without scanning the deck.
+// Cards with the same nextReview come in deck order (Heisig order), like a stable
+// sort of the deck by nextReview would give them.
+
+// Same filter startQuiz used: active hanzi whose answer has more than one component
+function isQuizzable(card) {
+  return Boolean(card && card.isActive && card.isHanzi &&
+    Array.isArray(card.expanded_components) && card.expanded_components.flat().length > 1);
+}
+
+// Cards without nextReview are due right away (initSheduling sets it to now)
+function reviewTime(card) {
+  const time = Date.parse(card.nextReview);
+  return Number.isNaN(time) ? 0 : time;
+}
+
+class DueQueue {
+  constructor() {
+    this.keys = [];
+    this.times = [];
+    this.ranks = [];           // deck position of the card in each slot, breaks ties
+    this.position = new Map(); // key -> index in the heap
+    this.deckOrder = new Map(); // key -> deck position, kept when a card leaves the heap
+  }
+
+  static fromDatabase(database) {
+    const queue = new DueQueue();
+    for (const [key, card] of Object.entries(database)) {
+      queue.deckOrder.set(key, queue.deckOrder.size);
+      if (!isQuizzable(card)) continue;
+      queue.position.set(key, queue.keys.length);
+      queue.keys.push(key);
+      queue.times.push(reviewTime(card));
+      queue.ranks.push(queue.deckOrder.get(key));
+    }
+    // Bottom-up heapify, O(n)
+    for (let i = (queue.keys.length >> 1) - 1; i >= 0; i--) queue.siftDown(i);
+    return queue;
+  }
+
+  get size() {
+    return this.keys.length;
+  }
+
+  // Insert, move or drop a card after it changed (O(log n))
+  update(key, card) {
+    if (!isQuizzable(card)) {
+      this.remove(key);
+      return;
+    }
+    const time = reviewTime(card);
+    const i = this.position.get(key);
+    if (i === undefined) {
+      if (!this.deckOrder.has(key)) this.deckOrder.set(key, this.deckOrder.size);
+      this.push(key, time, this.deckOrder.get(key));
+    } else if (time < this.times[i]) {
+      this.times[i] = time;
+      this.siftUp(i);
+    } else {
+      this.times[i] = time;
+      this.siftDown(i);
+    }
+  }
+
+  remove(key) {
+    const i = this.position.get(key);
+    if (i === undefined) return;
+    const last = this.keys.length - 1;
+    this.swap(i, last);
+    this.keys.pop();
+    this.times.pop();
+    this.ranks.pop();
+    this.position.delete(key);
+    if (i < last) {
+      this.siftDown(i);
+      this.siftUp(i);
+    }
+  }
+
+  // Up to limit keys with nextReview <= now, most overdue first (then in deck order). Only the due part
+  // of the heap is visited (O(limit log limit)), the heap itself is not changed.
+  due(now = Date.now(), limit = Infinity) {
+    const result = [];
+    const frontier = new DueQueue(); // heap of heap indices, ordered like the slots they point at
+    if (this.size > 0 && this.times[0] <= now) frontier.push(0, this.times[0], this.ranks[0]);
+    while (frontier.size > 0 && result.length < limit) {
+      const i = frontier.pop();
+      result.push(this.keys[i]);
+      for (const child of [2 * i + 1, 2 * i + 2]) {
+        if (child < this.size && this.times[child] <= now) frontier.push(child, this.times[child], this.ranks[child]);
+      }
+    }
+    return result;
+  }
+
+  // Earliest nextReview after now (Infinity if there is none), i.e. when due() changes next
+  nextDue(now = Date.now()) {
+    let next = Infinity;
+    for (const time of this.times) {
+      if (time > now && time < next) next = time;
+    }
+    return next;
+  }
+
+  // -------------------- Heap internals --------------------
+  push(key, time, rank) {
+    this.position.set(key, this.keys.length);
+    this.keys.push(key);
+    this.times.push(time);
+    this.ranks.push(rank);
+    this.siftUp(this.keys.length - 1);
+  }
+
+  pop() {
+    const key = this.keys[0];
+    this.remove(key);
+    return key;
+  }
+
+  swap(a, b) {
+    [this.keys[a], this.keys[b]] = [this.keys[b], this.keys[a]];
+    [this.times[a], this.times[b]] = [this.times[b], this.times[a]];
+    [this.ranks[a], this.ranks[b]] = [this.ranks[b], this.ranks[a]];
+    this.position.set(this.keys[a], a);
+    this.position.set(this.keys[b], b);
+  }
+
+  // Slot a comes before slot b: earlier nextReview, or the same one and earlier in the deck
+  less(a, b) {
+    return this.times[a] < this.times[b] || (this.times[a] === this.times[b] && this.ranks[a] < this.ranks[b]);
+  }
+
+  siftUp(i) {
+    while (i > 0) {
+      const parent = (i - 1) >> 1;
+      if (!this.less(i, parent)) break;
+      this.swap(i, parent);
+      i = parent;
+    }
+  }
+
+  siftDown(i) {
+    const n = this.keys.length;
+    for (;;) {
+      let smallest = i;
+      const left = 2 * i + 1;
+      const right = left + 1;
+      if (left < n && this.less(left, smallest)) smallest = left;
+      if (right < n && this.less(right, smallest)) smallest = right;
+      if (smallest === i) return;
+      this.swap(i, smallest);
+      i = smallest;
+    }
+  }
+}
+
+module.exports = { DueQueue, isQuizzable };
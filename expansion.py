@@ -0,0 +1,419 @@
+import gc
+import hashlib
+import json
+import multiprocessing
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from collections import ChainMap, Counter, defaultdict, deque
+from itertools import islice
+
+from keyword_table import KeywordTable
+from component_graph import ComponentGraph
+
+#Expansion engine for expanded_components.
+#An answer for a character lists its components, where every component is either
+#kept as-is or replaced by an answer of its own components. Instead of building a
+#tree per character and enumerating it again and again, the answers of every
+#node are computed once, children first, and combined from the cached results.
+#For very deep characters iter_answers() streams the answers instead, with
+#count_answers() telling the size of the answer space up front.
+#With a compiled graph (compile_graph) circular decompositions are reported up
+#front and prepare() computes all nodes in one sweep over the topological order.
+
+
+def children_of(key, database):
+    """
+    The components key is decomposed into (its first primary group, without repeats).
+    Atomic characters (primary_components == [[key]]) have no children.
+    """
+    primary_components = database[key]["primary_components"]
+    if len(primary_components) == 1 and primary_components[0] == [key]:
+        return []
+    return list(dict.fromkeys(primary_components[0]))
+
+
+def dependents(database):
+    """Reverse decomposition edges: component -> keys that are decomposed into it."""
+    parents = defaultdict(set)
+    for key in database:
+        for child in children_of(key, database):
+            parents[child].add(key)
+    return parents
+
+
+def dirty_ancestors(keys, database, parents=None):
+    """The given keys and all their transitive ancestors, i.e. everything whose expansion depends on them."""
+    if parents is None:
+        parents = dependents(database)
+    dirty = set(keys)
+    queue = deque(dirty)
+    while queue:
+        key = queue.popleft()
+        for parent in parents.get(key, ()):
+            if parent not in dirty:
+                dirty.add(parent)
+                queue.append(parent)
+    return dirty
+
+
+def fingerprints(database):
+    """A short hash of the expansion input (the children) of every key, to find edits between runs."""
+    return {
+        key: hashlib.sha1(json.dumps(children_of(key, database), ensure_ascii=False).encode("utf-8")).hexdigest()[:16]
+        for key in database
+    }
+
+
+def compile_graph(database):
+    """Compiled graph of the expansion edges (children_of), raises CycleError listing every cycle."""
+    return ComponentGraph({key: children_of(key, database) for key in database}).compile()
+
+
+def unique_answers(answers):
+    """Remove duplicates and return sorted unique expansions."""
+    # use tuple to make them hashable
+    unique = {tuple(ans) for ans in answers}
+    # back to list of lists
+    deduped = [list(ans) for ans in unique]
+    # sort by length first, then lexicographically
+    deduped.sort(key=lambda x: (len(x), x))
+    return deduped
+
+
+class Expander:
+    """
+    Memoized bottom-up expansion over the decomposition DAG.
+
+    database: The JSON database (keyword -> entry)
+    graph: Optional compiled graph (compile_graph), enables prepare()
+
+    replacements[key] is the set of answers that replace key by its children,
+    i.e. the product of the answers of all children. The answers of a node as a
+    child are its replacements plus the node itself. Answers are kept as tuples
+    of keyword ids (see KeywordTable) and only turned back into keywords by expand().
+    """
+
+    def __init__(self, database, graph=None):
+        self.database = database
+        self.table = KeywordTable(database)
+        self.replacements = {}
+        self.graph = graph
+
+    def seed(self, key, answers):
+        """Reuse answers computed earlier (e.g. stored expanded_components of an unchanged key)."""
+        self.replacements[key] = {self.table.encode(answer) for answer in answers}
+
+    def topological_order(self, root, done=None):
+        """
+        Nodes reachable from root, children before parents (iterative DFS).
+        Every node is listed once, however many parents share it.
+        Nodes in done (default: the already expanded ones) are left out.
+        """
+        if done is None:
+            done = self.replacements
+        order = []
+        finished = set()
+        on_stack = {root}
+        stack = [(root, iter(self._children(root)))]
+        while stack:
+            key, children = stack[-1]
+            for child in children:
+                if child in on_stack or child in finished or child in done:
+                    continue
+                on_stack.add(child)
+                stack.append((child, iter(self._children(child))))
+                break
+            else:
+                stack.pop()
+                on_stack.discard(key)
+                finished.add(key)
+                order.append(key)
+        return order
+
+    def _children(self, key):
+        return children_of(key, self.database)
+
+    def _compute(self, key):
+        per_child = []
+        for child in self._children(key):
+            # A child without result is a circular reference, it is treated as a leaf
+            per_child.append({(self.table.intern(child),)} | self.replacements.get(child, set()))
+        if not per_child:
+            return set()
+        # Product of the children, one child at a time (tuple concatenation, early dedup)
+        combined = {()}
+        for options in per_child:
+            combined = {prefix + option for prefix in combined for option in options}
+        return combined
+
+    def prepare(self, keys):
+        """
+        Compute keys and everything below them in one linear sweep over the
+        compiled topological order (no DFS per key, the graph is known to be acyclic).
+        """
+        for node in self.graph.sweep(keys):
+            if node not in self.replacements:
+                self.replacements[node] = self._compute(node)
+
+    def answer_ids(self, key):
+        """All answers for key as a set of id tuples (cached per node)."""
+        if key not in self.replacements:
+            for node in self.topological_order(key):
+                self.replacements[node] = self._compute(node)
+        return self.replacements[key]
+
+    def answer_set(self, key):
+        """All answers for key as a set of keyword tuples."""
+        return {tuple(self.table.decode(ids)) for ids in self.answer_ids(key)}
+
+    def expand(self, key, max_answers=None, max_length=None):
+        """
+        Sorted list of answers for key, as stored in expanded_components.
+        With a cap (max_answers) or a pruning length (max_length) the answers are
+        streamed with iter_answers() instead of building the full answer set.
+        """
+        if max_answers is None and max_length is None:
+            # The id tuples are already unique, only decode and sort them
+            answers = [self.table.decode(ids) for ids in self.answer_ids(key)]
+            answers.sort(key=lambda x: (len(x), x))
+            return answers
+        return unique_answers(islice(self.iter_answers(key, max_length), max_answers))
+
+    # -------------------- Streaming --------------------
+
+    def iter_answers(self, key, max_length=None):
+        """
+        Yield the answers for key one by one, without building them all.
+        Memory only grows with the depth of the decomposition.
+
+        max_length: Skip every answer with more components (whole branches are pruned)
+
+        Answers come roughly shortest first (keeping a component comes before
+        replacing it). Different decompositions can spell the same answer, so a
+        stream may repeat itself where answer_set() would not.
+        """
+        yield from self._iter_product(self._children(key), (), max_length, frozenset([key]))
+
+    def _iter_node(self, key, max_length, path):
+        """Answers of key as a child: key itself, then its replacements."""
+        if max_length is not None and max_length < 1:
+            return
+        yield (key,)
+        if key in path:
+            return  # circular reference, treated as a leaf
+        children = self._children(key)
+        if children:
+            yield from self._iter_product(children, (), max_length, path | {key})
+
+    def _iter_product(self, children, prefix, max_length, path):
+        if not children:
+            if prefix:
+                yield prefix
+            return
+        # Every later child needs at least one token
+        budget = None if max_length is None else max_length - len(prefix) - (len(children) - 1)
+        for part in self._iter_node(children[0], budget, path):
+            yield from self._iter_product(children[1:], prefix + part, max_length, path)
+
+    def count_answers(self, key):
+        """
+        Number of component combinations for key, without enumerating them.
+        Dynamic programming over the DAG: a child offers itself plus all products of
+        its own children. This is an upper bound for len(answer_set(key)), the two
+        differ only if different decompositions spell the same answer.
+        """
+        counts = {}
+        for node in self.topological_order(key, counts):
+            children = self._children(node)
+            total = 0
+            if children:
+                total = 1
+                for child in children:
+                    total *= 1 + counts.get(child, 0)
+            counts[node] = total
+        return counts[key]
+
+
+# -------------------- Parallel expansion --------------------
+#The nodes are expanded level by level (a node's level is one more than the
+#highest level of its children), the nodes of a level do not depend on each
+#other. Every node is expanded by exactly one worker, which is picked so that it
+#already holds most of the node's children (whole subtrees stay in one worker).
+#Children owned by another worker are sent to it, only once and only to the
+#workers that need them, so no sub-DAG is expanded twice. Those answers stay id
+#tuples and pass the parent as bytes; only the final answers of the keys are
+#decoded (by the workers) and unpickled by the parent.
+
+_worker_expander = None
+
+
+def _worker_setup(database, seeds):
+    """
+    Expander of a worker. The children are interned in database order before
+    anything else, so every worker hands out the same ids and the id tuples can
+    be passed between workers as they are.
+    """
+    expander = Expander(database)
+    for key in database:
+        expander.table.encode(children_of(key, database))
+    for key, answers in seeds.items():
+        expander.seed(key, answers)
+    return expander
+
+
+def _level_worker(connection, database, seeds):
+    gc.disable() # a worker only builds sets, tuples and lists, none of them circular
+    expander = _worker_setup(database, seeds)
+    parent = multiprocessing.parent_process()
+    while True:
+        # A killed parent does not close the pipe when other workers inherited its end
+        while not connection.poll(1):
+            if not parent.is_alive():
+                return
+        message = connection.recv()
+        if message is None:
+            break
+        inbox, keys, exports, finals = message
+        for payload in inbox:
+            expander.replacements.update(pickle.loads(payload))
+        for key in keys:
+            expander.replacements[key] = expander._compute(key)
+        # The answers other workers need stay id tuples and are pickled once per
+        # receiving worker, the parent passes the bytes on without reading them
+        outbox = defaultdict(dict)
+        for key, receivers in exports.items():
+            for receiver in receivers:
+                outbox[receiver][key] = expander.replacements[key]
+        connection.send(({receiver: pickle.dumps(answers, pickle.HIGHEST_PROTOCOL) for receiver, answers in outbox.items()},
+                         {key: expander.expand(key) for key in finals}))
+    connection.close()
+
+
+def available_cores():
+    """Cores this process may run on, more workers than that are slower than the serial run."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def parallel_plan(database, keys, workers, seeds=None):
+    """
+    Levels and owners of the parallel expansion: a list of levels (lists of the
+    nodes below keys that are not seeded, children first) and node -> worker.
+    """
+    seeds = seeds or {}
+    expander = Expander(database)
+    level = {}
+    for key in keys:
+        if key in level or key in seeds:
+            continue
+        for node in expander.topological_order(key, ChainMap(level, seeds)):
+            # A child without level is seeded or a circular reference
+            level[node] = 1 + max((level.get(child, -1) for child in expander._children(node)), default=-1)
+    levels = [[] for _ in range(max(level.values(), default=-1) + 1)]
+    for node, value in level.items():
+        levels[value].append(node)
+
+    owner = {}
+    for nodes in levels:
+        capacity = -(-len(nodes) // workers) # the nodes of a level are spread evenly
+        load = [0] * workers
+        for node in nodes:
+            votes = Counter(owner[child] for child in expander._children(node) if child in owner)
+            worker = min((w for w in range(workers) if load[w] < capacity), key=lambda w: (-votes[w], load[w]))
+            owner[node] = worker
+            load[worker] += 1
+    return levels, owner
+
+
+def _expand_chunk(keys, max_answers, max_length):
+    return [_worker_expander.expand(key, max_answers, max_length) for key in keys]
+
+
+def _init_chunk_worker(database, seeds):
+    global _worker_expander
+    _worker_expander = _worker_setup(database, seeds)
+
+
+def expand_parallel(database, keys, workers, seeds=None, max_answers=None, max_length=None):
+    """
+    Expand keys in worker processes, the result is identical to Expander.expand() per key
+    (for a circular decomposition the cut can fall elsewhere than in the serial run).
+
+    seeds: Stored answers of unchanged keys (see Expander.seed)
+    Returns a dict key -> answers.
+
+    Callers have to be importable without side effects (a __main__ guard), the
+    workers may be started with spawn.
+    """
+    keys = list(keys)
+    seeds = seeds or {}
+    # Workers only need the decompositions, not the whole entries
+    slim = {key: {"primary_components": entry["primary_components"]} for key, entry in database.items()}
+    if max_answers is not None or max_length is not None:
+        # Streamed answers share nothing between keys, so plain chunks are enough
+        size = -(-len(keys) // workers)
+        chunks = [keys[i:i + size] for i in range(0, len(keys), size)]
+        results = {}
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_chunk_worker,
+                                 initargs=(slim, seeds)) as executor:
+            for chunk, answers in zip(chunks, executor.map(_expand_chunk, chunks,
+                                                           [max_answers] * len(chunks), [max_length] * len(chunks))):
+                results.update(zip(chunk, answers))
+        return results
+
+    levels, owner = parallel_plan(slim, keys, workers, seeds)
+    # Nodes another worker needs as a child: node -> those workers
+    needed_by = defaultdict(set)
+    for node, worker in owner.items():
+        for child in children_of(node, slim):
+            if child in owner and owner[child] != worker:
+                needed_by[child].add(worker)
+    wanted = set(keys)
+
+    connections, processes = [], []
+    for _ in range(workers):
+        connection, child_connection = multiprocessing.Pipe()
+        process = multiprocessing.Process(target=_level_worker, args=(child_connection, slim, seeds), daemon=True)
+        process.start()
+        child_connection.close()
+        connections.append(connection)
+        processes.append(process)
+
+    results = {}
+    inboxes = [[] for _ in range(workers)] # pickled answers from other workers, sent with the next level
+    # The answers come back as millions of small lists, collecting them would
+    # cost more than unpickling them (none of them are circular)
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        for nodes in levels:
+            assigned = [[] for _ in range(workers)]
+            for node in nodes:
+                assigned[owner[node]].append(node)
+            for worker, connection in enumerate(connections):
+                own = assigned[worker]
+                connection.send((inboxes[worker], own, {node: needed_by[node] for node in own if node in needed_by},
+                                 [node for node in own if node in wanted]))
+                inboxes[worker] = []
+            for connection in connections:
+                try:
+                    outbox, finals = connection.recv()
+                except EOFError:
+                    raise RuntimeError("An expansion worker stopped unexpectedly") from None
+                for receiver, payload in outbox.items():
+                    inboxes[receiver].append(payload)
+                results.update(finals)
+    finally:
+        if collecting:
+            gc.enable()
+        for connection in connections:
+            try:
+                connection.send(None)
+            except OSError:
+                pass
+            connection.close()
+        for process in processes:
+            process.join()
+    return {key: results[key] for key in keys if key in results}
@@ -0,0 +1,274 @@
+import argparse
+import json
+import time
+
+import numpy as np
+
+from database_store import DatabaseStore
+from deck_files import state_filename, update_state
+from deck_registry import DeckRegistry, database_filename, deck_argument
+from review_log import log_filename, read_review_log
+
+#FSRS (Free Spaced Repetition Scheduler, version 4.5) for the quiz.
+#The review history is replayed for all cards at once: the reviews are laid out
+#by position in each card's history, so step j updates the memory state of every
+#card that has a j-th review with a few NumPy operations. The loss (log loss of
+#the predicted recall) and its gradient (backpropagated through the steps) are
+#computed over all reviews in one forward and one backward sweep, the parameters
+#are fitted with Adam. The fitted stability / difficulty of every card is
+#written to the state file (state.json), the parameters to the database store.
+#  python fsrs.py [reviews.jsonl] [--reschedule] [--deck ID]
+
+DEFAULT_PARAMETERS = np.array([
+    0.4872, 1.4003, 3.7145, 13.8206, 5.1618, 1.2298, 0.8975, 0.031, 1.6474,
+    0.1367, 1.0461, 2.1072, 0.0793, 0.3246, 1.587, 0.2272, 2.8755,
+])
+LOWER = np.array([0.1, 0.1, 0.1, 0.1, 1.0, 0.1, 0.1, 0.0, 0.0, 0.1, 0.01, 0.5, 0.01, 0.01, 0.01, 0.0, 1.0])
+UPPER = np.array([100.0, 100.0, 100.0, 100.0, 10.0, 5.0, 5.0, 0.5, 3.0, 0.8, 2.5, 5.0, 0.2, 0.9, 2.0, 1.0, 4.0])
+
+DECAY = -0.5
+FACTOR = 19 / 81 # R = 0.9 after one stability
+MIN_STABILITY = 0.01
+MAX_STABILITY = 36500.0
+DAY = 86400.0
+
+AGAIN, HARD, GOOD, EASY = 1, 2, 3, 4 # the quiz only knows pass (GOOD) and fail (AGAIN)
+
+
+def retrievability(elapsed_days, stability):
+    """Probability of recall after elapsed_days."""
+    return (1 + FACTOR * elapsed_days / stability) ** DECAY
+
+
+def next_interval(stability, retention=0.9):
+    """Days until the recall probability drops to retention."""
+    return stability / FACTOR * (retention ** (1 / DECAY) - 1)
+
+
+def load_history(path=log_filename):
+    """Reviews from the review log as (keys, times in seconds, grades) arrays."""
+    log = read_review_log(path)
+    return log.key, log.time, np.where(log.passed, GOOD, AGAIN).astype(np.int8)
+
+
+class ReviewHistory:
+    """
+    Reviews laid out by step (position in the card's history).
+
+    Only the first review of a card per day counts, the quiz repeats a failed
+    card in the same session until it is answered correctly. Cards are ordered by
+    number of reviews (longest first), so the cards that have a j-th review are
+    always the first counts[j] cards.
+    """
+
+    def __init__(self, keys, times, grades):
+        card_names, card_ids = np.unique(keys.astype(str), return_inverse=True)
+        order = np.lexsort((times, card_ids))
+        card_ids, times, grades = card_ids[order], times[order], grades[order]
+
+        day = np.floor(times / DAY)
+        first_of_day = np.ones(len(times), dtype=bool)
+        first_of_day[1:] = (card_ids[1:] != card_ids[:-1]) | (day[1:] != day[:-1])
+        card_ids, times, grades = card_ids[first_of_day], times[first_of_day], grades[first_of_day]
+
+        lengths = np.bincount(card_ids, minlength=len(card_names))
+        starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        by_length = np.argsort(-lengths, kind="stable")
+
+        self.keys = list(card_names[by_length])
+        self.lengths = lengths[by_length]
+        self.starts = starts[by_length]
+        self.counts = [int(np.count_nonzero(self.lengths > j)) for j in range(int(self.lengths.max(initial=0)))]
+        self.grades = [grades[self.starts[:n] + j] for j, n in enumerate(self.counts)]
+        self.elapsed = [None] + [(times[self.starts[:n] + j] - times[self.starts[:n] + j - 1]) / DAY
+                                 for j, n in enumerate(self.counts) if j > 0]
+        self.last_review = times[self.starts + self.lengths - 1]
+        self.reviews = int(self.lengths.sum())
+
+    @classmethod
+    def from_file(cls, path):
+        return cls(*load_history(path))
+
+
+def _initial_state(w, grades):
+    stability = w[grades - 1]
+    difficulty_raw = w[4] - (grades - 3) * w[5]
+    return stability, np.clip(difficulty_raw, 1, 10), (difficulty_raw > 1) & (difficulty_raw < 10)
+
+
+def _step(w, stability, difficulty, elapsed, grades):
+    """One review for all active cards: prediction, new state and the local derivatives."""
+    u = 1 + FACTOR * elapsed / stability
+    recall = u ** DECAY
+    d_recall_d_s = -DECAY * u ** (DECAY - 1) * FACTOR * elapsed / stability ** 2
+    n = len(grades)
+    d_new_s_d_w = np.zeros((n, len(w)))
+    d_new_d_d_w = np.zeros((n, len(w)))
+
+    # Difficulty: step by grade, then mean reversion towards D0(EASY)
+    shifted = difficulty - w[6] * (grades - 3)
+    new_d_raw = w[7] * (w[4] - w[5]) + (1 - w[7]) * shifted
+    free_d = (new_d_raw > 1) & (new_d_raw < 10)
+    new_difficulty = np.clip(new_d_raw, 1, 10)
+    d_new_d_d_d = (1 - w[7]) * free_d
+    d_new_d_d_w[:, 4] = w[7] * free_d
+    d_new_d_d_w[:, 5] = -w[7] * free_d
+    d_new_d_d_w[:, 6] = -(1 - w[7]) * (grades - 3) * free_d
+    d_new_d_d_w[:, 7] = (w[4] - w[5] - shifted) * free_d
+
+    # Stability after a successful review
+    success = grades > AGAIN
+    hard = np.where(grades == HARD, w[15], 1.0)
+    easy = np.where(grades == EASY, w[16], 1.0)
+    core = np.exp(w[8]) * (11 - difficulty) * stability ** -w[9]
+    growth = np.exp(w[10] * (1 - recall))
+    a = core * (growth - 1) * hard * easy
+    s_success = stability * (1 + a)
+
+    # Stability after a lapse (never above the stability before it)
+    lapse_base = w[11] * difficulty ** -w[12]
+    lapse_growth = np.exp(w[14] * (1 - recall))
+    lapse = lapse_base * ((stability + 1) ** w[13] - 1) * lapse_growth
+    use_lapse = lapse < stability
+
+    new_s_raw = np.where(success, s_success, np.where(use_lapse, lapse, stability))
+    free_s = (new_s_raw > MIN_STABILITY) & (new_s_raw < MAX_STABILITY)
+    new_stability = np.clip(new_s_raw, MIN_STABILITY, MAX_STABILITY)
+
+    fail = ~success & use_lapse
+    keep = ~success & ~use_lapse
+    d_new_s_d_s = np.where(success, 1 + a * (1 - w[9]),
+                           np.where(fail, lapse_base * lapse_growth * w[13] * (stability + 1) ** (w[13] - 1), keep))
+    d_new_s_d_d = np.where(success, -stability * a / (11 - difficulty), np.where(fail, -w[12] * lapse / difficulty, 0))
+    d_new_s_d_r = np.where(success, -stability * core * hard * easy * growth * w[10], np.where(fail, -w[14] * lapse, 0))
+    d_new_s_d_w[:, 8] = np.where(success, stability * a, 0)
+    d_new_s_d_w[:, 9] = np.where(success, -stability * a * np.log(stability), 0)
+    d_new_s_d_w[:, 10] = np.where(success, stability * core * hard * easy * growth * (1 - recall), 0)
+    d_new_s_d_w[:, 11] = np.where(fail, lapse / w[11], 0)
+    d_new_s_d_w[:, 12] = np.where(fail, -lapse * np.log(difficulty), 0)
+    d_new_s_d_w[:, 13] = np.where(fail, lapse_base * lapse_growth * (stability + 1) ** w[13] * np.log(stability + 1), 0)
+    d_new_s_d_w[:, 14] = np.where(fail, lapse * (1 - recall), 0)
+    d_new_s_d_w[:, 15] = np.where(success & (grades == HARD), stability * core * (growth - 1) * easy, 0)
+    d_new_s_d_w[:, 16] = np.where(success & (grades == EASY), stability * core * (growth - 1) * hard, 0)
+    for derivative in (d_new_s_d_s, d_new_s_d_d, d_new_s_d_r):
+        derivative *= free_s
+    d_new_s_d_w *= free_s[:, None]
+
+    local = (d_recall_d_s, d_new_s_d_s, d_new_s_d_d, d_new_s_d_r, d_new_s_d_w, d_new_d_d_d, d_new_d_d_w)
+    return recall, new_stability, new_difficulty, local
+
+
+def replay(w, history, gradient=False):
+    """
+    Replay every card's history with the parameters w.
+    Returns (mean log loss, stability per card, difficulty per card[, gradient of the loss]).
+    """
+    w = np.asarray(w, dtype=float)
+    if not history.counts: # no card has a review yet
+        empty = np.zeros(0)
+        return (0.0, empty, empty, np.zeros(len(w))) if gradient else (0.0, empty, empty)
+    stability, difficulty, free_d0 = _initial_state(w, history.grades[0])
+    predictions = max(history.reviews - len(history.keys), 1)
+    total = 0.0
+    steps = []
+    for j in range(1, len(history.counts)):
+        n = history.counts[j]
+        grades = history.grades[j]
+        recall, new_stability, new_difficulty, local = _step(w, stability[:n], difficulty[:n], history.elapsed[j], grades)
+        passed = grades > AGAIN
+        p = np.clip(recall, 1e-6, 1 - 1e-6)
+        total -= np.sum(np.where(passed, np.log(p), np.log(1 - p)))
+        if gradient:
+            d_loss_d_r = np.where(passed, -1 / p, 1 / (1 - p)) / predictions
+            steps.append((n, d_loss_d_r, local))
+        stability[:n] = new_stability
+        difficulty[:n] = new_difficulty
+    loss = total / predictions
+    if not gradient:
+        return loss, stability, difficulty
+
+    # Backward sweep: g_s / g_d hold the gradient of the loss with respect to the
+    # state before the current step (zero for cards whose history already ended)
+    g_w = np.zeros(len(w))
+    g_s = np.zeros(len(history.keys))
+    g_d = np.zeros(len(history.keys))
+    for n, d_loss_d_r, local in reversed(steps):
+        d_recall_d_s, d_new_s_d_s, d_new_s_d_d, d_new_s_d_r, d_new_s_d_w, d_new_d_d_d, d_new_d_d_w = local
+        g_new_s, g_new_d = g_s[:n], g_d[:n]
+        g_recall = d_loss_d_r + g_new_s * d_new_s_d_r
+        g_w += g_new_s @ d_new_s_d_w + g_new_d @ d_new_d_d_w
+        g_s[:n], g_d[:n] = (g_recall * d_recall_d_s + g_new_s * d_new_s_d_s,
+                            g_new_d * d_new_d_d_d + g_new_s * d_new_s_d_d)
+    first = history.grades[0]
+    g_w[:4] += np.bincount(first - 1, weights=g_s, minlength=4)[:4]
+    g_w[4] += np.sum(g_d * free_d0)
+    g_w[5] += np.sum(-(first - 3) * g_d * free_d0)
+    return loss, stability, difficulty, g_w
+
+
+def fit(history, parameters=DEFAULT_PARAMETERS, iterations=300, learning_rate=0.04, tolerance=1e-7):
+    """Fit the parameters to the history with Adam (projected on the parameter bounds)."""
+    w = np.clip(np.array(parameters, dtype=float), LOWER, UPPER)
+    m = np.zeros_like(w)
+    v = np.zeros_like(w)
+    previous = np.inf
+    for i in range(1, iterations + 1):
+        loss, _, _, g = replay(w, history, gradient=True)
+        if abs(previous - loss) < tolerance:
+            break
+        previous = loss
+        m = 0.9 * m + 0.1 * g
+        v = 0.999 * v + 0.001 * g * g
+        w = np.clip(w - learning_rate * (m / (1 - 0.9 ** i)) / (np.sqrt(v / (1 - 0.999 ** i)) + 1e-8), LOWER, UPPER)
+    return w
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fit FSRS to the review history and update the cards")
+    parser.add_argument("history", nargs="?", help="review log written by the quiz (default: the one of the deck)")
+    parser.add_argument("--database", help="default: the database of the deck")
+    parser.add_argument("--state", help="state file of the quiz server (default: the one of the deck)")
+    parser.add_argument("--iterations", type=int, default=300)
+    parser.add_argument("--retention", type=float, default=0.9, help="desired recall probability for --reschedule")
+    parser.add_argument("--reschedule", action="store_true", help="also set nextReview from the fitted stability")
+    parser.add_argument("--dry-run", action="store_true", help="only print the fitted parameters")
+    deck_argument(parser)
+    args = parser.parse_args()
+
+    registry = DeckRegistry()
+    args.history = args.history or registry.deck_path(args.deck, log_filename)
+    args.database = args.database or registry.deck_path(args.deck, database_filename)
+    args.state = args.state or registry.deck_path(args.deck, state_filename)
+
+    history = ReviewHistory.from_file(args.history)
+    if not history.reviews:
+        raise SystemExit(f"ℹ No reviews to fit in {args.history} yet, the quiz writes them.")
+    print(f"{history.reviews} reviews of {len(history.keys)} cards")
+
+    start = time.perf_counter()
+    store = DatabaseStore(args.database)
+    saved = json.loads(store.get_meta("fsrs_parameters", "null"))
+    initial = DEFAULT_PARAMETERS if saved is None else np.array(saved)
+    initial_loss = replay(initial, history)[0]
+    w = fit(history, initial, args.iterations)
+    loss, stability, difficulty = replay(w, history)
+    print(f"log loss {initial_loss:.4f} -> {loss:.4f} in {time.perf_counter() - start:.2f} s")
+    print("parameters:", json.dumps([round(x, 4) for x in w.tolist()]))
+
+    if args.dry_run:
+        store.close()
+    else:
+        keys = set(store.keys())
+        changes = {}
+        for key, s, d, last in zip(history.keys, stability, difficulty, history.last_review):
+            if key not in keys:
+                continue
+            fields = {"stability": round(float(s), 4), "difficulty": round(float(d), 4)}
+            if args.reschedule:
+                due = last + next_interval(s, args.retention) * DAY
+                fields["nextReview"] = time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime(due))
+            changes[key] = fields
+        store.set_meta("fsrs_parameters", json.dumps(w.tolist()))
+        store.close()
+        update_state(changes, args.state)
+        print(f"✅ stability and difficulty of {len(changes)} cards updated")
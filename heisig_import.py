@@ -0,0 +1,42 @@
+import csv
+import re
+
+#Streaming reader for the Anki exports (heisig.txt, particles.txt).
+#Both are tab separated with two "#..." header lines; fields can be quoted with
+#"" like pandas.read_csv expects. Rows are read in a single pass with the csv
+#module, so importing does not need pandas.
+
+HEISIG_COLUMNS = ["Simplified", "Traditional", "Number", "Sequenz", "Keyword", "notes", "ComponentsSearch",
+                  "Story", "Stroke Count", "Pinyin", "InMyVocab", "Words", "audio", "common_rank"]
+
+PARTICLE_COLUMNS = ["Simplified", "Components", "Traditional", "Number", "Sequenz", "Keyword", "notes",
+                    "ComponentsSearch", "Story", "Stroke Count", "Pinyin", "InMyVocab", "Words", "audio",
+                    "common_rank"]
+
+# keyword:"..." inside the ComponentsSearch column
+KEYWORD_PATTERN = re.compile(r'keyword:"([^"]+)"')
+
+
+def read_rows(path, column_names, skiprows=2):
+    """Yield every row of an Anki export as a dict column -> string (missing fields are "")."""
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        for _ in range(skiprows):
+            f.readline()
+        for fields in csv.reader(f, delimiter="\t"):
+            if not fields:
+                continue
+            fields += [""] * (len(column_names) - len(fields))
+            yield dict(zip(column_names, fields))
+
+
+def component_keywords(raw):
+    """All keywords referenced in a ComponentsSearch value."""
+    return KEYWORD_PATTERN.findall(raw.lower())
+
+
+def particle_keyword(keyword):
+    """Keyword as used in the database: lower case, "p." becomes "particle:"."""
+    keyword = keyword.lower()
+    if keyword.startswith("p."):
+        keyword = keyword.replace("p.", "particle:")
+    return keyword
@@ -0,0 +1,49 @@
+#Interned keyword ids for the database passes.
+#Keywords like "particle:a drop of" are repeated thousands of times in the
+#component groups. Inside the passes every keyword is replaced by a small integer
+#id, so answers are tuples of ints and a component group can be turned into a
+#bitmask, which makes subset and duplicate checks single integer operations.
+#The JSON database with the full keywords is only the import/export format.
+
+
+class KeywordTable:
+    """
+    Two way mapping keyword <-> id (ids are handed out in first seen order).
+
+    keywords: Keywords to intern right away, e.g. the keys of the database
+    """
+
+    def __init__(self, keywords=()):
+        self.ids = {}
+        self.keywords = []
+        for keyword in keywords:
+            self.intern(keyword)
+
+    def __len__(self):
+        return len(self.keywords)
+
+    def intern(self, keyword):
+        """The id of keyword (a new one if it was not seen before)."""
+        id_ = self.ids.get(keyword)
+        if id_ is None:
+            id_ = self.ids[keyword] = len(self.keywords)
+            self.keywords.append(keyword)
+        return id_
+
+    def encode(self, group):
+        """Component group -> tuple of ids (order and repeats are kept)."""
+        return tuple(self.intern(keyword) for keyword in group)
+
+    def decode(self, ids):
+        """Tuple of ids -> component group."""
+        return list(map(self.keywords.__getitem__, ids))
+
+    def mask(self, group):
+        """
+        Component group -> bitmask of its ids (order and repeats are ignored, like set(group)).
+        A mask is as wide as the table, so for many small groups use a small table (e.g. one per entry).
+        """
+        mask = 0
+        for keyword in group:
+            mask |= 1 << self.intern(keyword)
+        return mask
@@ -1,8 +1,14 @@
-import difflib
-import json
+import argparse
+from collections import ChainMap
+
+from component_graph import ComponentGraph
+from deck_registry import DeckRegistry, deck_argument
+from suggestion_index import SuggestionIndex
 
 
 #Search for suspicious leafs in the total character tree
+#Components may also be typed as "<deck>::<keyword>" of another deck.
+#  python "leaf fixer.py" [--deck ID]
 
 def flatten(lst):
     """Simple flatten: list of lists -> flat list"""
@@ -17,10 +23,38 @@ def format_typed(typed):
     return typed
 
 
-def check_missing_decompositions(database):
+def resolve(typed, database, index):
+    """The keyword typed refers to: the keyword itself or the keyword of a unique alias (else None)."""
+    if typed in database:
+        return typed
+    keywords = index.lookup(typed)
+    if len(keywords) == 1:
+        print(f"ℹ '{typed}' is an alias of '{keywords[0]}'.")
+        return keywords[0]
+    return None
+
+
+def drop_implied(new_comps, known):
+    """
+    Remove the entered components that are already a component of another entered one.
+    known: the entries a component may be, including the ones of other decks
+    """
+    # Only the entries below the entered components are read, always the current ones
+    reduced = ComponentGraph.from_roots(known, new_comps).minimal(new_comps)
+    for c in new_comps:
+        if c not in reduced:
+            print(f"ℹ '{c}' is already part of another component, dropped.")
+    return reduced
+
+
+def check_missing_decompositions(database, store, references=None):
     """
     Interactive check for suspicious leaves.
+    Every decision is committed to the store right away.
+    references: entries of other decks the components point at (DeckRegistry.references)
     """
+    known = ChainMap(database, references) if references else database # what a component may be
+    index = SuggestionIndex(known, lazy=True) # keywords and aliases, for typos, built on the first typo
     for key, entry in database.items():
         comps = entry.get("primary_components", [])
         if not comps:
@@ -30,6 +64,7 @@ def check_missing_decompositions(database):
 
         # suspicious case: single component that is not itself
         if len(flat) == 1 and flat[0] != key:
+            entry = database[key] = dict(entry) # editable copy
             hanzi = entry.get("hanzi", key)
             print(f"\n⚠ Suspicious leaf found: {hanzi} ({key})")
             print(f"   Current components: {comps}")
@@ -38,8 +73,10 @@ def check_missing_decompositions(database):
                 choice = input("Options: [L]eaf / [M]anual / [A]dd /[S]kip ? / [Q]uit or add the keyword if only one needs to be added ").strip().lower()
                 typed = choice.strip()
                 typed = format_typed(typed)
-                if typed in database:
-                    new_comps = [flat[0],typed]
+                # Single letters are the options, aliases like "l" or "a" only count as keyword
+                keyword = typed if typed in known or len(typed) == 1 else resolve(typed, known, index)
+                if keyword in known:
+                    new_comps = drop_implied([flat[0],keyword], known)
                     entry["primary_components"] = [new_comps]
                     print(f"✅ Updated {key}: {entry['primary_components']}")
                     break
@@ -57,17 +94,18 @@ def check_missing_decompositions(database):
                         typed = format_typed(typed)
                         if not typed:
                             break
-                        if typed in database:
-                            new_comps.append(typed)
+                        keyword = resolve(typed, known, index)
+                        if keyword is not None:
+                            new_comps.append(keyword)
                         else:
-                            # Suggest closest matches
-                            suggestions = difflib.get_close_matches(typed, database.keys(), n=3, cutoff=0.6)
+                            # Suggest closest matches (keywords and aliases)
+                            suggestions = index.suggest(typed)
                             print(f"❌ '{typed}' not found in database.")
                             if suggestions:
                                 print("Did you mean:", ", ".join(suggestions))
                             continue
                     if new_comps:
-                        entry["primary_components"] = [new_comps]
+                        entry["primary_components"] = [drop_implied(new_comps, known)]
                         print(f"✅ Updated {key}: {entry['primary_components']}")
                     else:
                         print("⚠ No components entered, skipping.")
@@ -84,17 +122,18 @@ def check_missing_decompositions(database):
                         typed = format_typed(typed)
                         if not typed:
                             break
-                        if typed in database:
-                            new_comps.append(typed)
+                        keyword = resolve(typed, known, index)
+                        if keyword is not None:
+                            new_comps.append(keyword)
                         else:
-                            # Suggest closest matches
-                            suggestions = difflib.get_close_matches(typed, database.keys(), n=3, cutoff=0.6)
+                            # Suggest closest matches (keywords and aliases)
+                            suggestions = index.suggest(typed)
                             print(f"❌ '{typed}' not found in database.")
                             if suggestions:
                                 print("Did you mean:", ", ".join(suggestions))
                             continue
                     if new_comps:
-                        entry["primary_components"] = [new_comps]
+                        entry["primary_components"] = [drop_implied(new_comps, known)]
                         print(f"✅ Updated {key}: {entry['primary_components']}")
                     else:
                         print("⚠ No components entered, skipping.")
@@ -105,13 +144,24 @@ def check_missing_decompositions(database):
                 else:
                     print("❌ Invalid choice, try again.")
 
+            if entry["primary_components"] != comps:
+                store.put(key, entry)
+                store.commit()
+
+
+parser = argparse.ArgumentParser(description="Check the suspicious leaves of a deck one by one")
+deck_argument(parser)
+args = parser.parse_args()
 
-with open("database.json", "r", encoding="utf-8") as f:
-    database = json.load(f)
+registry = DeckRegistry()
+store = registry.store(args.deck)
+view = store.view()
+database = ChainMap({}, view) # edited entries as dicts over the compiled deck
 
-check_missing_decompositions(database)
+check_missing_decompositions(database, store, registry.references(args.deck, view))
 
-with open("database.json", "w", encoding="utf-8") as f:
-    json.dump(database, f, ensure_ascii=False, indent=2)
+store.export()
+view.close()
+registry.close()
 
 print("✅ Finished checking.")
\ No newline at end of file
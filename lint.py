@@ -0,0 +1,265 @@
+import argparse
+import json
+import multiprocessing
+import sys
+import time
+from collections import ChainMap, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from component_graph import CycleError
+from database_store import DatabaseStore
+from deck_registry import DeckRegistry, deck_argument
+from expansion import compile_graph
+
+#Lint for the database.
+#Every check is a rule in a registry. Entry rules look at one entry at a time
+#and all of them run during a single traversal of the database (optionally split
+#over processes), database rules look at the whole graph once. The report lists
+#every finding and how long each rule took, as text or as JSON.
+#Components that point into another deck are checked against that deck.
+#  python lint.py                      -> findings as text, exit code 1 on errors
+#  python lint.py --deck kanji         -> lint another deck of decks.json
+#  python lint.py --json lint.json     -> machine readable report
+
+ENTRY_RULES = {}
+DATABASE_RULES = {}
+
+COMPONENT_FIELDS = ["primary_components", "components", "expanded_components"]
+
+
+def rule(name, severity="error", scope="entry"):
+    """
+    Register a rule (severity "error", "warning" or "info", only errors fail the lint).
+    scope "entry":    check(key, entry, database) -> iterable of messages
+    scope "database": check(database) -> iterable of (key, message)
+    """
+    def register(check):
+        registry = ENTRY_RULES if scope == "entry" else DATABASE_RULES
+        registry[name] = {"check": check, "severity": severity, "description": (check.__doc__ or "").strip()}
+        return check
+    return register
+
+
+# -------------------- Entry rules --------------------
+
+@rule("missing-expanded")
+def missing_expanded(key, entry, database):
+    """Entry without expanded_components (the quiz can not grade it)."""
+    if not entry.get("expanded_components"):
+        yield "no expanded_components"
+
+
+@rule("malformed-components")
+def malformed_components(key, entry, database):
+    """Component fields that are not a list of non empty lists of keywords."""
+    for field in COMPONENT_FIELDS:
+        groups = entry.get(field)
+        if groups is None:
+            continue
+        if not isinstance(groups, list) or not all(isinstance(group, list) for group in groups):
+            yield f"{field} is not a list of lists"
+        elif any(not group for group in groups):
+            yield f"{field} contains an empty group"
+
+
+@rule("dangling-component")
+def dangling_component(key, entry, database):
+    """Components that are not a keyword of the database."""
+    for field in COMPONENT_FIELDS:
+        groups = entry.get(field) or []
+        dangling = {c for group in groups if isinstance(group, list) for c in group if c not in database}
+        for component in sorted(dangling):
+            yield f"{field} references unknown '{component}'"
+
+
+@rule("suspicious-leaf", severity="warning")
+def suspicious_leaf(key, entry, database):
+    """A single primary component that is not the character itself (see leaf fixer.py)."""
+    flat = [c for group in entry.get("primary_components", []) for c in group]
+    if len(flat) == 1 and flat[0] != key:
+        yield f"only component is '{flat[0]}'"
+
+
+@rule("duplicate-group", severity="warning")
+def duplicate_group(key, entry, database):
+    """The same component group (ignoring order) listed twice."""
+    for field in COMPONENT_FIELDS:
+        seen = set()
+        for group in entry.get(field) or []:
+            group_key = frozenset(group)
+            if group_key in seen:
+                yield f"{field} lists {sorted(group_key)} more than once"
+            seen.add(group_key)
+
+
+# -------------------- Database rules --------------------
+
+@rule("circular-decomposition", scope="database")
+def circular_decomposition(database):
+    """Circular references in primary_components (the expansion treats them as leaves)."""
+    try:
+        compile_graph(database)
+    except CycleError as error:
+        for cycle in error.cycles:
+            yield cycle[0], "circular: " + " <-> ".join(cycle)
+
+
+@rule("alias-clash", severity="info", scope="database")
+def alias_clash(database):
+    """An alias that is also the keyword or an alias of another character."""
+    owners = defaultdict(list)
+    for key, entry in database.items():
+        owners[key.lower()].append(key)
+        for alias in entry.get("Aliases", []):
+            if alias.strip() and key not in owners[alias.strip().lower()]:
+                owners[alias.strip().lower()].append(key)
+    for key, entry in database.items():
+        for alias in entry.get("Aliases", []):
+            others = [other for other in owners.get(alias.strip().lower(), []) if other != key]
+            if others:
+                yield key, f"alias '{alias}' is also used for {', '.join(others)}"
+
+
+# -------------------- Engine --------------------
+
+def run_entry_rules(database, keys, names):
+    """One traversal of keys with every entry rule, returns (findings, seconds per rule)."""
+    checks = [(name, ENTRY_RULES[name]["check"]) for name in names]
+    findings = []
+    seconds = dict.fromkeys(names, 0.0)
+    clock = time.perf_counter
+    for key in keys:
+        entry = database[key]
+        for name, check in checks:
+            start = clock()
+            for message in check(key, entry, database):
+                findings.append((name, key, message))
+            seconds[name] += clock() - start
+    return findings, seconds
+
+
+_worker_database = None
+
+
+def _init_worker(database):
+    global _worker_database
+    _worker_database = database
+
+
+def _lint_shard(keys, names):
+    return run_entry_rules(_worker_database, keys, names)
+
+
+def lint(database, rules=None, workers=1, references=None):
+    """
+    Run the rules (default: all registered) over the database.
+    references: entries of other decks the components point at (DeckRegistry.references),
+    the rules see them but only the entries of the database are checked.
+    Returns the report as a JSON-able dict.
+    """
+    if rules is None:
+        rules = list(ENTRY_RULES) + list(DATABASE_RULES)
+    unknown = [name for name in rules if name not in ENTRY_RULES and name not in DATABASE_RULES]
+    if unknown:
+        raise ValueError(f"Unknown lint rules: {', '.join(unknown)}")
+    entry_names = [name for name in rules if name in ENTRY_RULES]
+    database_names = [name for name in rules if name in DATABASE_RULES]
+
+    start = time.perf_counter()
+    keys = list(database)
+    if references:
+        database = ChainMap(database, references)
+    if workers > 1 and entry_names:
+        # Shards keep the database order, the findings are merged in that order
+        size = -(-len(keys) // workers)
+        shards = [keys[i:i + size] for i in range(0, len(keys), size)]
+        # The scripts have no __main__ guard, so fork (where available) avoids re-running them in the workers
+        context = multiprocessing.get_context("fork") if "fork" in multiprocessing.get_all_start_methods() else None
+        findings = []
+        seconds = dict.fromkeys(entry_names, 0.0)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=_init_worker, initargs=(database,)) as executor:
+            for shard_findings, shard_seconds in executor.map(_lint_shard, shards, [entry_names] * len(shards)):
+                findings.extend(shard_findings)
+                for name, value in shard_seconds.items():
+                    seconds[name] += value
+    else:
+        findings, seconds = run_entry_rules(database, keys, entry_names)
+
+    for name in database_names:
+        rule_start = time.perf_counter()
+        findings.extend((name, key, message) for key, message in DATABASE_RULES[name]["check"](database))
+        seconds[name] = time.perf_counter() - rule_start
+
+    registry = {**ENTRY_RULES, **DATABASE_RULES}
+    counts = defaultdict(int)
+    for name, _, _ in findings:
+        counts[name] += 1
+    return {
+        "entries": len(keys),
+        "seconds": time.perf_counter() - start,
+        "workers": workers,
+        "rules": {
+            name: {
+                "severity": registry[name]["severity"],
+                "description": registry[name]["description"],
+                "findings": counts[name],
+                "seconds": seconds[name],
+            }
+            for name in rules
+        },
+        "findings": [
+            {"rule": name, "severity": registry[name]["severity"], "key": key, "message": message}
+            for name, key, message in findings
+        ],
+    }
+
+
+def summary(report):
+    """One line: number of findings per severity and the time taken."""
+    counts = defaultdict(int)
+    for finding in report["findings"]:
+        counts[finding["severity"]] += 1
+    return (f"{report['entries']} entries: {counts['error']} errors, {counts['warning']} warnings, "
+            f"{counts['info']} infos ({report['seconds'] * 1000:.0f} ms)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the database with all lint rules in one pass")
+    parser.add_argument("database", nargs="?", help="database file (default: the one of the deck)")
+    parser.add_argument("--rules", nargs="+", metavar="RULE", help="only run these rules")
+    parser.add_argument("--workers", type=int, default=1, help="split the entry rules over this many processes")
+    parser.add_argument("--json", metavar="FILE", help="write the report as JSON ('-' for stdout)")
+    parser.add_argument("--list", action="store_true", help="list the rules and exit")
+    deck_argument(parser)
+    args = parser.parse_args()
+
+    if args.list:
+        for name, info in {**ENTRY_RULES, **DATABASE_RULES}.items():
+            print(f"{name:24s} {info['severity']:8s} {info['description']}")
+        sys.exit(0)
+
+    with DeckRegistry() as registry:
+        if args.database:
+            with DatabaseStore(args.database) as store:
+                database = store.load()
+        else:
+            database = registry.store(args.deck).load()
+        references = registry.references(args.deck, database)
+    report = lint(database, args.rules, args.workers, references)
+
+    if args.json == "-":
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    else:
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+        for finding in report["findings"]:
+            marker = {"error": "❌", "warning": "⚠", "info": "ℹ"}[finding["severity"]]
+            print(f"{marker} [{finding['rule']}] {finding['key']}: {finding['message']}")
+        for name, info in report["rules"].items():
+            print(f"  {name:24s} {info['findings']:5d} findings {info['seconds'] * 1000:8.2f} ms")
+        print(("✅ " if not any(f["severity"] == "error" for f in report["findings"]) else "❌ ") + summary(report))
+
+    sys.exit(1 if any(finding["severity"] == "error" for finding in report["findings"]) else 0)
@@ -4,118 +4,80 @@ Created on Sun Sep 24 13:15:51 2023
 
 @author: David
 """
-import re
-import pandas as pd
-from itertools import product
 import json
+from heisig_import import HEISIG_COLUMNS, component_keywords, read_rows
+from component_graph import ComponentGraph
+from expansion import Expander
+from deck_registry import DeckRegistry
 
 #Initial funtions used to extract the database from the anki deck (heisig.txt)
+#python "make database json.py" -> database_base.json
 
-def decompose(char, db):
-    comps_list = db.get(char, [])
-    
-    # If no components → return leaf
-    if not comps_list:
-        return {char: {}}   # empty dict, not set
-    
-    elif len(comps_list) <= 2:
-        # each component is a leaf
-        return {c: {} for c in comps_list}
-    else:
-        minimal = []
-        for c in comps_list:
-            if any(c in db[other] for other in comps_list if other != c):
-                continue
-            else:
-                minimal.append(c)
-        return {a: decompose(a, db) for a in minimal}
-
-# Pretty printing of decomposition tree
-def print_tree(tree, indent=0):
-    for key in tree.keys():
-        print("    " * indent + key)
-        if isinstance(tree[key], dict) and len(tree[key]) > 1:
-            print_tree(tree[key], indent + 1)
-
-def expand(node):
+def import_expander(db, graph):
     """
-    Recursively expand a node into all valid answer sets.
-    Each node must either be kept as-is, or replaced entirely by expansions of its children.
+    Expander over the decomposition trees of decomposition.decompose: a character
+    with up to two components is decomposed into them as leaves, one with more into
+    its minimal components, which are decomposed the same way. Every shared
+    component is expanded once (see expansion.Expander).
     """
-    results = []
-
-    for key, children in node.items():
-        if not children:  # leaf node
-            return [[key]]
-
-        # Option 1: keep this node
-        keep_self = [[key]]
-
-        # Option 2: expand all children
-        child_expansions = [expand({c: g}) for c, g in children.items()]
-        replace_self = []
-        for prod in product(*child_expansions):
-            replace_self.append([x for sublist in prod for x in sublist])
-
-        # Combine both options
-        node_expansions = keep_self + replace_self
-
-        # If multiple keys at this level → combine their expansions
-        if len(node) > 1:
-            sibling_expansions = []
-            for prod in product(*[expand({k: v}) for k, v in node.items()]):
-                sibling_expansions.append([x for sublist in prod for x in sublist])
-            return sibling_expansions
+    database = {}
+    leaves = {}
+    for keyword, components in db.items():
+        if not components:
+            database[keyword] = {"primary_components": [[keyword]]}
+        elif len(components) <= 2:
+            # The components stay leaves, so their answers are fixed
+            database[keyword] = {"primary_components": [components]}
+            leaves[keyword] = [list(dict.fromkeys(components))]
         else:
-            return node_expansions
-        
-def unique_answers(answers):
-    """Remove duplicates and return sorted unique expansions."""
-    # use tuple to make them hashable
-    unique = {tuple(ans) for ans in answers}
-    # back to list of lists
-    deduped = [list(ans) for ans in unique]
-    # sort by length first, then lexicographically
-    deduped.sort(key=lambda x: (len(x), x))
-    return deduped
-
-
-column_names = ["Simplified", "Traditional", "Number", "Sequenz", "Keyword","notes", "ComponentsSearch",
-                "Story", "Stroke Count", "Pinyin","InMyVocab", "Words", "audio", "common_rank"]
+            database[keyword] = {"primary_components": [graph.minimal(components)]}
+    for entry in list(database.values()):
+        for component in entry["primary_components"][0]:
+            database.setdefault(component, {"primary_components": [[component]]}) # not in the export: a leaf
+    expander = Expander(database)
+    for keyword, answers in leaves.items():
+        expander.seed(keyword, answers)
+    return expander
+
+
+def import_answers(keyword, db, expander):
+    """The answers of keyword as imported (components), sorted like expanded_components."""
+    components = db[keyword]
+    if not components:
+        return [[keyword]]
+    if len(components) <= 2:
+        # The tree walk this replaces stopped at the first leaf, components_backup was imported that way
+        return [[components[0]]]
+    return expander.expand(keyword)
 
 
 path = "heisig.txt"
+active_limit = DeckRegistry().setting(None, "active_limit") # cut off point for which characters to include
 
-# Read CSV
-df = pd.read_csv(path, sep="\t",index_col=False, dtype=str, keep_default_na=False,skiprows=2,names=column_names)
+# Read the export once, the decomposition needs the components of every keyword
+rows = list(read_rows(path, HEISIG_COLUMNS))
 db = {}
 all_chars_json = {}
 
-for _, row in df.iterrows():
+for row in rows:
     keyword = row["Keyword"].lower()
-    raw = row["ComponentsSearch"].lower()
-    # Extract all keywords inside keyword:"..." or hanzi:...
-    matches = re.findall(r'keyword:"([^"]+)"', raw)
-    db[keyword] = matches
-
-for i in range(len(df)):
-    hanzi = df.at[i, "Simplified"]
-    keyword = df.at[i, "Keyword"].lower()
-    if keyword.startswith("p."):
-        isHanzi = False
-    else:
-        isHanzi = True
+    # Extract all keywords inside keyword:"..."
+    db[keyword] = component_keywords(row["ComponentsSearch"])
+graph = ComponentGraph(db) # transitive closure, computed once for all keywords
+expander = import_expander(db, graph)
 
-    Sequenz = df.at[i, "Sequenz"]
-    Number = df.at[i, "Number"]
+for row in rows:
+    hanzi = row["Simplified"]
+    keyword = row["Keyword"].lower()
+    isHanzi = not keyword.startswith("p.")
 
-    isActive = int(Sequenz)<1342 # cut off point for which characters to include
+    Sequenz = row["Sequenz"]
+    Number = row["Number"]
 
-    decomp = decompose(keyword, db)
+    isActive = active_limit is None or int(Sequenz)<active_limit
 
     # Generate all possible answers
-    all_answers = expand(decomp)
-    all_answers = unique_answers(all_answers)
+    all_answers = import_answers(keyword, db, expander)
 
     char_entry = {
         "hanzi": hanzi,
@@ -138,5 +100,3 @@ for i in range(len(df)):
 # Write entire database to JSON
 with open("database_base.json", "w", encoding="utf-8") as f:
     json.dump(all_chars_json, f, ensure_ascii=False, indent=2)
-
-
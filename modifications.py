@@ -1,11 +1,18 @@
-import json
-import pandas as pd
+import argparse
+import os
 import re
+from collections import ChainMap
+from component_cleanup import apply_rules, clean_implied, clean_obsoletes, load_rules, remove_duplicate_component_groups
+from component_index import ComponentIndex, flat_set
+from component_graph import ComponentGraph
+from suggestion_index import SuggestionIndex
+from deck_registry import DeckRegistry, deck_argument, keyword_of
+from lint import lint
+from heisig_import import PARTICLE_COLUMNS, particle_keyword, read_rows
 #All purpose script for manipulating the database
+#  python modifications.py [--deck ID] ...
 
 
-filename = "database.json"
-
 def clean_water(database):
     modified = []
 
@@ -21,82 +28,52 @@ def clean_water(database):
 
     return modified
 
-def clean_doubles(database,a,b):
+def clean_doubles(database,a,b,index=None,graph=None):
+    """
+    Remove a from the components of every entry that also contains b.
+    With a ComponentGraph, a is also removed next to every component that has b
+    somewhere below it (one bitwise AND per component).
+    """
+    if index is None:
+        index = ComponentIndex(database, ["components"])
     modified = []
 
-    for key, entry in database.items():
+    # Only the entries that contain both a and b are touched
+    if graph is None:
+        candidates = index.containing("components", a, b)
+    else:
+        candidates = [key for key in index.containing("components", a)
+                      if any(c == b or graph.implies(c, b) for c in flat_set(database[key]["components"]) if c != a)]
+    for key in candidates:
+        entry = database[key]
         components = entry.get("components", [])
-        # Flatten components for checking
-        flat_comps = [c for group in components for c in group]
-
-        if a in flat_comps and b in flat_comps:
-            # Remove all "water" from each component group
-            entry["components"] = [[c for c in group if c != a] for group in components]
-            modified.append(key)
+        # Remove all "a" from each component group
+        entry["components"] = [[c for c in group if c != a] for group in components]
+        index.update(key, "components", components, entry["components"])
+        modified.append(key)
 
     return modified
 
 
-def clean_doubles_primary(database,a,b):
+def clean_doubles_primary(database,a,b,index=None):
+    """Remove a from the primary_components of every entry that also contains b."""
+    if index is None:
+        index = ComponentIndex(database, ["primary_components"])
     modified = []
 
-    for key, entry in database.items():
+    for key in index.containing("primary_components", a, b):
+        entry = database[key]
         components = entry.get("primary_components", [])
-        # Flatten components for checking
-        flat_comps = [c for group in components for c in group]
-
-        if a in flat_comps and b in flat_comps:
-            # Remove all "water" from each component group
-            entry["primary_components"] = [[c for c in group if c != a] for group in components]
-            modified.append(key)
-
-    return modified
-
-def clean_obsoletes(database):
-    modified = []
-
-    for key, entry in database.items():
-        groups = entry.get("components", [])
-        new_groups = []
-
-        # Convert each group to a set for easy subset checking
-        group_sets = [set(group) for group in groups]
-
-        for i, g in enumerate(group_sets):
-            # Check if there exists another group that strictly contains g
-            redundant = any(g < other for j, other in enumerate(group_sets) if i != j)
-            if not redundant:
-                new_groups.append(groups[i])
-
-        if len(new_groups) != len(groups):
-            entry["components"] = new_groups
-            modified.append(key)
-
-    return modified
-
-
-def remove_duplicate_component_groups(database):
-    modified = []
-
-    for key, entry in database.items():
-        groups = entry.get("components", [])
-        seen = set()
-        new_groups = []
-
-        for group in groups:
-            # Use frozenset to ignore order (so ["a","b"] == ["b","a"])
-            group_key = frozenset(group)
-            if group_key not in seen:
-                seen.add(group_key)
-                new_groups.append(group)
-
-        if len(new_groups) != len(groups):
-            entry["components"] = new_groups
-            modified.append(key)
+        # Remove all "a" from each component group
+        entry["primary_components"] = [[c for c in group if c != a] for group in components]
+        index.update(key, "primary_components", components, entry["primary_components"])
+        modified.append(key)
 
     return modified
 
-def split_primary_secondary(database):
+def split_primary_secondary(database, references=None):
+    """references: entries of other decks the components point at (DeckRegistry.references)"""
+    known = ChainMap(database, references) if references else database
     modified = []
 
     for key, entry in database.items():
@@ -125,10 +102,14 @@ def split_primary_secondary(database):
             print(f"Hanzi: {entry['hanzi']} ({key})")
             for i, g in enumerate(shortest_groups, 1):
                 print(f"  {i}: {g}")
+            # Only the offered components (with their aliases) can be typed instead of a number
+            offered = SuggestionIndex({c: known.get(c, {}) for g in shortest_groups for c in g})
+            for c in {c for g in shortest_groups for c in g}:
+                offered.add(c, keyword_of(c)) # components of other decks by their keyword
             choice = None
             while choice is None:
                 try:
-                    inp = input(f"Choose primary [1-{len(shortest_groups)}]: ").strip()
+                    inp = input(f"Choose primary [1-{len(shortest_groups)}] or type a component of it: ").strip()
                     idx = int(inp) - 1
                     if idx == 99:
                         return modified #quit early if 100 is entered
@@ -137,7 +118,15 @@ def split_primary_secondary(database):
                     else:
                         print("❌ Invalid choice, try again.")
                 except ValueError:
-                    print("❌ Please enter a number.")
+                    component = (offered.lookup(inp) or offered.suggest(inp, n=1) or [None])[0]
+                    groups_with = [i for i, g in enumerate(shortest_groups) if component in g]
+                    if len(groups_with) == 1:
+                        print(f"➡ {component}: {shortest_groups[groups_with[0]]}")
+                        choice = groups_with[0]
+                    elif groups_with:
+                        print(f"❌ '{component}' is in more than one group, enter a number.")
+                    else:
+                        print("❌ Please enter a number or a component.")
             chosen = shortest_groups[choice]
 
         # Assign new properties
@@ -147,12 +136,32 @@ def split_primary_secondary(database):
 
     return modified
 
-def deep_clean(database,a,b):
-    changed = clean_doubles(database,a,b)
-    changed2 = clean_obsoletes(database)
-    changed3 = remove_duplicate_component_groups(database)
+def deep_clean(database,a,b,index=None):
+    """
+    clean_doubles followed by clean_obsoletes and remove_duplicate_component_groups.
+    The follow-up passes only look at the entries clean_doubles changed, everything
+    else was already cleaned by earlier runs. Pass the same index for repeated calls.
+    """
+    if index is None:
+        index = ComponentIndex(database, ["components"])
+    changed = clean_doubles(database,a,b,index)
+    changed2 = clean_obsoletes(database, changed, index)
+    changed3 = remove_duplicate_component_groups(database, changed, index)
     return changed
 
+def rules_from_particles(rows):
+    """Rules from particles.txt: every listed component is implied by the particle itself."""
+    rules = []
+    for row in rows:
+        keyword = particle_keyword(row["Keyword"])
+        if keyword == "particle:umbrella":
+            continue
+        for a in row["Components"].split(','):
+            a = particle_keyword(a.strip())
+            if a:
+                rules.append((a, keyword))
+    return rules
+
 def normalize_components(database):
     modified = []
 
@@ -220,12 +229,8 @@ def normalize_components5(database):
     return modified
 
 def search(database):
-    found = []
-    for key, entry in database.items():
-        comps = entry.get("expanded_components", [])
-        if not comps:
-            found.append(key)
-    return found
+    """Keys without expanded_components (lint rule missing-expanded)."""
+    return [finding["key"] for finding in lint(database, ["missing-expanded"])["findings"]]
 
 def add_particles_alias(database):
     modified = []
@@ -255,53 +260,49 @@ def flatten(xss):
     return [x for xs in xss for x in xs]
 
 def check_missing_decompositions(database):
-    missing_decompositions = []
-
-    for key, entry in database.items():
-        comps = entry.get("primary_components", [])
-        # Check if it's a flat list of strings (not a list of lists)
-        if len(flatten(comps)) == 1 and flatten(comps)[0] != key:
-            missing_decompositions.append(key)
+    """Keys with a single primary component that is not the key itself (lint rule suspicious-leaf)."""
+    return [finding["key"] for finding in lint(database, ["suspicious-leaf"])["findings"]]
 
-    return missing_decompositions
 
+parser = argparse.ArgumentParser(description="All purpose script for manipulating the database")
+parser.add_argument("--rules", help="tab separated file of (redundant, implying) component pairs to apply in one pass")
+parser.add_argument("--particle-rules", action="store_true", help="derive the rules from the particles.txt of the deck")
+parser.add_argument("--field", default="primary_components", help="component field the rules are applied to")
+parser.add_argument("--implied", action="store_true",
+                    help="remove components implied by another component of the same group (component graph)")
+deck_argument(parser)
+args = parser.parse_args()
 
-with open(filename, "r", encoding="utf-8") as f:
-    database = json.load(f)
+registry = DeckRegistry()
+store = registry.store(args.deck)
+database = store.load()
+references = registry.references(args.deck, database) # entries of other decks the components point at
 
 
 
-column_names = ["Simplified","Components",  "Traditional", "Number", "Sequenz", "Keyword","notes", "ComponentsSearch",
-                "Story", "Stroke Count", "Pinyin","InMyVocab", "Words", "audio", "common_rank"]
+path = registry.deck_path(args.deck, "particles.txt")
+if not os.path.exists(path): # decks without their own particles use the shared file next to the scripts
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "particles.txt")
 
-path = "particles.txt"
-
-# Read CSV
-df = pd.read_csv(path, sep="\t",index_col=False, dtype=str, keep_default_na=False,skiprows=2,names=column_names)
+particles = list(read_rows(path, PARTICLE_COLUMNS)) # single pass, no pandas
 """
-for i in range(len(df)):
-    hanzi = df.at[i, "Simplified"]
-    keyword = df.at[i, "Keyword"].lower()
-    if keyword.startswith("p."):
-        keyword = keyword.replace("p.", "particle:")
+index = ComponentIndex(database, ["components"]) # built once, kept up to date by deep_clean
+for row in particles:
+    hanzi = row["Simplified"]
+    keyword = particle_keyword(row["Keyword"])
     if keyword == "particle:umbrella":
         continue
-    components = df.at[i, "Components"].lower()
-    split_comp = [s.strip() for s in components.split(',')]
-    for j in range(len(split_comp)):
-        if split_comp[j].startswith("p."):
-            split_comp[j] = split_comp[j].replace("p.", "particle:")
+    split_comp = [particle_keyword(s.strip()) for s in row["Components"].split(',')]
     b = keyword
     for a in split_comp:
-        changed = deep_clean(database,a,b)
+        changed = deep_clean(database,a,b,index)
 """
 
 """
-for i in range(len(df)):
-    hanzi = df.at[i, "Simplified"]
-    keyword = df.at[i, "Keyword"].lower()
-    if keyword.startswith("p."):
-        keyword = keyword.replace("p.", "particle:")
+index = ComponentIndex(database, ["components"])
+for row in particles:
+    hanzi = row["Simplified"]
+    keyword = particle_keyword(row["Keyword"])
     if keyword == "particle:umbrella":
         continue
     comps = database[keyword]["components"]
@@ -311,92 +312,18 @@ for i in range(len(df)):
     #print(b)
     for a in comps[0]:
         #print(a)
-        changed = deep_clean(database,a,b)
+        changed = deep_clean(database,a,b,index)
         print("✅ Split primary/secondary components for:", changed)
 
 
 """
 
 
-a = "half"
-b = "particle:quarter"
-
-a = "bow (n.) (weapon)"
-b = "particle:snare"
-
-a = "bow (n.) (weapon)"
-b = "particle:snare"
-
-a = "bow (n.) (weapon)"
-b = "particle:slingshot"
-
-a = "particle:a drop of"
-b = "particle:maestro"
-
-a = "particle:elbow"
-b = "particle:thread"
-
-a = "particle:cocoon"
-b = "particle:floss"
-
-a = "particle:stamp"
-b = "particle:chop"
-
-a = "particle:stamp"
-b = "particle:fingerprint"
-
-a = "particle:salad"
-b = "particle:wire mesh"
-
-a = "particle:flower"
-b = "particle:hamster cage"
-
-a = "soil"
-b = "particle:grow up"
-
-a = "particle:grow up"
-b = "plentiful"
-
-a = "particle:grow up"
-b = "particle:bonsai"
-
-a = "plentiful"
-b = "particle:cornstalk"
-
-a = "particle:a drop of"
-b = "small"
-
-a = "small"
-b = "few"
-
-a = "month"
-b = "evening"
-
-a = "evening"
-b = "many"
-
-a = "particle:arrow"
-b = "halberd"
-
-a = "particle:mending"
-b = "particle:zoo"
-
-a = "correct"
-b = "particle:zoo"
-
-a = "one"
-b = "particle:zoo"
-
-a = "stop (v.)"
-b = "particle:zoo"
-
-
-
 #changed = clean_doubles(database,a,b)
 #changed = clean_obsoletes(database)
 #changed = remove_duplicate_component_groups(database)
 
-#changed = split_primary_secondary(database)
+#changed = split_primary_secondary(database, references)
 
 a = "one"
 b = "particle:hamster cage"
@@ -408,11 +335,27 @@ b = "two"
 
 #found = add_particles_alias(database)
 
-changed = clean_doubles_primary(database,a,b)
-
-print("found:", changed)
-
-
-with open(filename, "w", encoding="utf-8") as f:
-    json.dump(database, f, ensure_ascii=False, indent=2)
+if args.rules or args.particle_rules: # batch mode: all rules in one pass and one write
+    rules = load_rules(args.rules) if args.rules else []
+    if args.particle_rules:
+        rules += rules_from_particles(particles)
+    hits, changed = apply_rules(database, rules, args.field)
+    for (a, b), count in zip(rules, hits):
+        print(f"{count:5d}  {a} <- {b}")
+    print(f"✅ {len(rules)} rules changed {len(changed)} entries")
+elif args.implied:
+    # Components of other decks are not leaves, the graph goes on into their decks
+    graph = ComponentGraph.from_database(ChainMap(database, references))
+    changed, skipped = clean_implied(database, graph, field=args.field)
+    for key in skipped:
+        print(f"⚠ {key}: on a circular decomposition, left as is: {database[key][args.field]}")
+    print(f"✅ {len(changed)} entries had implied components:", changed)
+else:
+    changed = clean_doubles_primary(database,a,b)
+    print("found:", changed)
+
+
+store.save(database) # only the changed entries are written
+store.export()
+registry.close()
 
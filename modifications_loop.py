@@ -1,66 +1,26 @@
-import json
-import pandas as pd
-filename = "database.json"
+import argparse
+from component_cleanup import clean_obsoletes, remove_duplicate_component_groups
+from component_index import ComponentIndex
+from deck_registry import DeckRegistry, deck_argument
 
 #All purpose script for manipulating the database
+#  python modifications_loop.py [--deck ID]
 
 
-def clean_doubles(database,a,b):
+def clean_doubles(database,a,b,index=None):
+    """Remove a from the components of every entry that also contains b."""
+    if index is None:
+        index = ComponentIndex(database, ["components"])
     modified = []
 
-    for key, entry in database.items():
+    # Only the entries that contain both a and b are touched
+    for key in index.containing("components", a, b):
+        entry = database[key]
         components = entry.get("components", [])
-        # Flatten components for checking
-        flat_comps = [c for group in components for c in group]
-
-        if a in flat_comps and b in flat_comps:
-            # Remove all "water" from each component group
-            entry["components"] = [[c for c in group if c != a] for group in components]
-            modified.append(key)
-
-    return modified
-
-def clean_obsoletes(database):
-    modified = []
-
-    for key, entry in database.items():
-        groups = entry.get("components", [])
-        new_groups = []
-
-        # Convert each group to a set for easy subset checking
-        group_sets = [set(group) for group in groups]
-
-        for i, g in enumerate(group_sets):
-            # Check if there exists another group that strictly contains g
-            redundant = any(g < other for j, other in enumerate(group_sets) if i != j)
-            if not redundant:
-                new_groups.append(groups[i])
-
-        if len(new_groups) != len(groups):
-            entry["components"] = new_groups
-            modified.append(key)
-
-    return modified
-
-
-def remove_duplicate_component_groups(database):
-    modified = []
-
-    for key, entry in database.items():
-        groups = entry.get("components", [])
-        seen = set()
-        new_groups = []
-
-        for group in groups:
-            # Use frozenset to ignore order (so ["a","b"] == ["b","a"])
-            group_key = frozenset(group)
-            if group_key not in seen:
-                seen.add(group_key)
-                new_groups.append(group)
-
-        if len(new_groups) != len(groups):
-            entry["components"] = new_groups
-            modified.append(key)
+        # Remove all "a" from each component group
+        entry["components"] = [[c for c in group if c != a] for group in components]
+        index.update(key, "components", components, entry["components"])
+        modified.append(key)
 
     return modified
 
@@ -115,10 +75,17 @@ def split_primary_secondary(database):
 
     return modified
 
-def deep_clean(database,a,b):
-    changed = clean_doubles(database,a,b)
-    changed2 = clean_obsoletes(database)
-    changed3 = remove_duplicate_component_groups(database)
+def deep_clean(database,a,b,index=None):
+    """
+    clean_doubles followed by clean_obsoletes and remove_duplicate_component_groups.
+    The follow-up passes only look at the entries clean_doubles changed, everything
+    else was already cleaned by earlier runs. Pass the same index for repeated calls.
+    """
+    if index is None:
+        index = ComponentIndex(database, ["components"])
+    changed = clean_doubles(database,a,b,index)
+    changed2 = clean_obsoletes(database, changed, index)
+    changed3 = remove_duplicate_component_groups(database, changed, index)
     return changed
 
 def normalize_components(database):
@@ -133,8 +100,13 @@ def normalize_components(database):
 
     return modified
 
-with open(filename, "r", encoding="utf-8") as f:
-    database = json.load(f)
+parser = argparse.ArgumentParser(description="All purpose script for manipulating the database")
+deck_argument(parser)
+args = parser.parse_args()
+
+registry = DeckRegistry()
+store = registry.store(args.deck)
+database = store.load()
 
 
 #changed = normalize_components(database)
@@ -154,6 +126,7 @@ changed = split_primary_secondary(database)
 print("✅ Split primary/secondary components for:", changed)
 
 
-with open(filename, "w", encoding="utf-8") as f:
-    json.dump(database, f, ensure_ascii=False, indent=2)
+store.save(database) # only the changed entries are written
+store.export()
+registry.close()
 
@@ -0,0 +1,87 @@
+import json
+import os
+
+import numpy as np
+
+#Reader for the review log (reviews.jsonl).
+#The server appends one line per graded answer and never rewrites the file:
+#  {"t": epoch ms, "key": ..., "pass": 0/1, "transcript": ..., "phonetic": 0/1, "override": 0/1}
+#phonetic: the answer was only accepted by the Double Metaphone fallback
+#override: the answer was graded wrong and the user said it was right (false negative)
+#The reader turns the log into one array per column for analytics and schedule
+#fitting (fsrs.py), the database is not needed for that.
+
+log_filename = "reviews.jsonl"
+
+
+class ReviewLog:
+    """
+    The review log as columns, one row per graded answer (in log order).
+
+    time:       epoch seconds (float64)
+    key_id:     index into keys (int32)
+    passed, phonetic, override: bool
+    transcript: str objects
+    """
+
+    def __init__(self, time, key_id, passed, phonetic, override, transcript, keys):
+        self.time = time
+        self.key_id = key_id
+        self.passed = passed
+        self.phonetic = phonetic
+        self.override = override
+        self.transcript = transcript
+        self.keys = keys
+
+    def __len__(self):
+        return len(self.time)
+
+    @property
+    def key(self):
+        """Key per review as an object array."""
+        return np.array(self.keys, dtype=object)[self.key_id]
+
+
+def read_review_log(path=log_filename):
+    """
+    Load the log into a ReviewLog, empty if there is no log yet. A torn last line
+    (crash while appending) and records without a key (written before the server
+    checked them) are ignored.
+    """
+    times, key_ids, passed, phonetic, override, transcripts = [], [], [], [], [], []
+    ids = {}
+    if os.path.exists(path): # the server creates the log with the first review
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if not isinstance(record, dict) or not isinstance(record.get("key"), str):
+                    continue
+                times.append(record["t"] / 1000)
+                key_ids.append(ids.setdefault(record["key"], len(ids)))
+                passed.append(record["pass"])
+                phonetic.append(record.get("phonetic", 0))
+                override.append(record.get("override", 0))
+                transcripts.append(record.get("transcript", ""))
+    return ReviewLog(
+        time=np.array(times, dtype=np.float64),
+        key_id=np.array(key_ids, dtype=np.int32),
+        passed=np.array(passed, dtype=bool),
+        phonetic=np.array(phonetic, dtype=bool),
+        override=np.array(override, dtype=bool),
+        transcript=np.array(transcripts, dtype=object),
+        keys=list(ids),
+    )
+
+
+if __name__ == "__main__":
+    import sys
+
+    log = read_review_log(sys.argv[1] if len(sys.argv) > 1 else log_filename)
+    print(f"{len(log)} reviews of {len(log.keys)} cards")
+    if len(log):
+        print(f"passed:             {log.passed.mean():.1%}")
+        print(f"phonetic fallback:  {log.phonetic.mean():.1%}")
+        print(f"false negatives:    {log.override.mean():.1%}")
@@ -1,44 +1,93 @@
-import { doubleMetaphone } from 'https://esm.sh/double-metaphone@2?bundle';
+// Same codes as the metaphone package answer_index.py builds the phonetic keys with
+import { doubleMetaphone } from './doubleMetaphone.js';
 
 // -------------------- Database helpers --------------------
+// The deck to study (?deck=<id>, see decks.json), the server's default deck without it
+const DECK = new URLSearchParams(location.search).get('deck');
+const API = DECK ? `/api/decks/${encodeURIComponent(DECK)}` : '/api';
+
 let database = {};
 let characters = [];
+let dueKeys = [];
 let currentChar = null;
 let changedKeys = [];
+let answerIndex = null;
+let maxPhraseWords = 1;
+const answerKeyCache = {};
 
+// Only the due cards with the fields the quiz uses (see quizPayload in server.js),
+// an unchanged payload is answered with 304 from the browser cache
 async function loadDatabase() {
-  const res = await fetch('/api/database');
-  database = await res.json();
-  characters = Object.keys(database); // <-- Move this here
+  const res = await fetch(`${API}/quiz`);
+  const payload = await res.json();
+  database = payload.cards;
+  characters = Object.keys(database);
+  dueKeys = payload.due; // most overdue first
+  await loadAnswerIndex(); // 304 while answer_index.json is unchanged
 }
 
-async function updateDatabaseEntry(key, entry) {
-  await fetch(`/api/database/${encodeURIComponent(key)}`, {
-    method: 'PATCH',
-    headers: { 'Content-Type': 'application/json' },
-    body: JSON.stringify(entry)
-  });
+async function loadAnswerIndex() { // compiled by answer_index.py
+  const res = await fetch(`${API}/answer_index.json`);
+  answerIndex = await res.json();
+  const keys = Object.keys(answerIndex.phrases).concat(Object.keys(answerIndex.phonetic || {}));
+  maxPhraseWords = Math.max(1, ...keys.map(k => k.split(' ').length));
 }
 
 function markChanged(key) {
   if (!changedKeys.includes(key)) changedKeys.push(key);
 }
 
-async function saveChanges() {
-  for (const key of changedKeys) {
-    await updateDatabaseEntry(key, database[key]);
+// Fields the quiz changes, the server merges them into the stored entries
+const STATE_FIELDS = ['interval', 'repetition', 'ease', 'nextReview', 'isDue',
+  'isFalseNegative', 'falseNegativeAnswer', 'skipped', 'isMarked'];
+
+// Many entries in one request, the server writes the file once for all of them
+async function updateDatabaseEntries(keys) {
+  const entries = {};
+  for (const key of keys) {
+    const state = {};
+    for (const field of STATE_FIELDS) {
+      if (field in database[key]) state[field] = database[key][field];
+    }
+    entries[key] = state;
   }
+  const res = await fetch(`${API}/database`, {
+    method: 'PATCH',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify(entries)
+  });
+  if (!res.ok) throw new Error(`Saving failed: ${res.status}`);
+}
+
+async function saveChanges() {
+  if (changedKeys.length === 0) return;
+  await updateDatabaseEntries(changedKeys);
+  changedKeys = [];
 }
 
 async function saveAll() {
-  for (const key of characters) {
-    await updateDatabaseEntry(key, database[key]);
-  }
+  await updateDatabaseEntries(characters);
+}
+
+// Every graded answer goes to the server's append-only review log
+async function logReview(key, passed, transcript, check) {
+  await fetch(`${API}/reviews`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({
+      t: Date.now(),
+      key,
+      pass: passed,
+      transcript,
+      phonetic: check.phonetic,
+      override: check.override,
+    }),
+  });
 }
 
 async function updateQuizStatus() {
   const today = new Date().toISOString().slice(0, 10); // YYYY-MM-DD
-  await fetch('/api/quiz-status', {
+  await fetch(`${API}/quiz-status`, {
     method: 'POST',
     headers: { 'Content-Type': 'application/json' },
     body: JSON.stringify({ lastCompleted: today }),
@@ -71,18 +120,6 @@ function initSheduling() {
   }
 }
 
-async function updateDueCards() {
-  const today = new Date();
-  for (const key of Object.keys(database)) {
-    const card = database[key];
-    const nextReview = new Date(card.nextReview);
-    if (key == "ancient"){
-      console.log(nextReview <= today)
-    }
-    card.isDue = nextReview <= today;
-  }
-}
-
 async function processAnswer(currentChar, passed) {
   const card = database[currentChar];
   
@@ -145,43 +182,6 @@ function setSkipButton(enabled) {
 // FIXME: add a button to mark the last or current character
 
 
-// ---------- Plural helpers ----------
-function guessPlurals(word) {
-  const guesses = new Set();
-  const lower = word.toLowerCase();
-
-  // Always add plain "s"
-  guesses.add(word + "s");
-
-  // Rule: words ending in s, x, z, ch, sh → add "es"
-  if (/(s|x|z|ch|sh)$/.test(lower)) {
-    guesses.add(word + "es");
-  }
-
-  // Rule: words ending in consonant + y → drop y, add "ies"
-  if (/[^aeiou]y$/.test(lower)) {
-    guesses.add(word.slice(0, -1) + "ies");
-  }
-
-  // Rule: words ending in f/fe → ves
-  if (/fe?$/.test(lower)) {
-    guesses.add(word.replace(/fe?$/, "ves"));
-  }
-
-  // Limit to at most 3 guesses
-  return Array.from(guesses).slice(0, 3);
-}
-
-function extendWithPlurals(words) {
-  const extended = new Set(words); // keep originals
-  for (const word of words) {
-    for (const plural of guessPlurals(word)) {
-      extended.add(plural);
-    }
-  }
-  return Array.from(extended);
-}
-
 // -------------------- Quiz flow --------------------
 async function askQuestion() {
   document.getElementById('result').innerText = 'Listening...';
@@ -200,13 +200,7 @@ export async function startQuiz() {
   await loadDatabase();
   initSheduling(); //obsolte until new characters are added
   initDatabase();
-  await updateDueCards()
-  let remaining = characters.filter(
-    c => database[c].isDue &&
-         database[c].isActive &&
-         database[c].isHanzi &&
-         database[c].expanded_components.flat().length > 1
-  );
+  let remaining = dueKeys;
 
   let batch = remaining.slice(0,Math.min(10,remaining.length))
   while (batch.length > 0) {
@@ -296,6 +290,7 @@ function listenForComponents() {
 
       const words = transcript.split(/,?\s+/);
       const isCorrect = await checkAnswer(words);
+      logReview(currentChar, isCorrect, transcript, lastCheck).catch(err => console.error('Review not logged:', err));
 
       document.getElementById('character-display').textContent = database[currentChar].hanzi;
       if (isCorrect){
@@ -386,76 +381,96 @@ function listenForYesOrNo(time = 5000) {
 }
 
 // -------------------- Answer checking --------------------
-function remove_a_from_b(a, b, remember_match = false) {
-  let needed = [...b];
-  let matches = [];
-
-  const stripPunct = str => str.replace(/[.,!?;:]/g, '').toLowerCase();
-
-  for (let comboLen = a.length; comboLen >= 1; comboLen--) {
-    for (let start = 0; start <= a.length - comboLen; start++) {
-      const combo = stripPunct(a.slice(start, start + comboLen).join(' '));
-      for (let i = 0; i < needed.length; i++) {
-        if (combo === stripPunct(needed[i])) {
-          if (remember_match) matches.push([combo, needed[i]]);
-          needed.splice(i, 1);
-          break;
-        }
+const stripPunct = str => str.replace(/[.,!?;:]/g, '').toLowerCase();
+
+// Components of other decks are "<deck>::<keyword>" (deck_registry.py), only the keyword is spoken
+const keywordOf = component => component.replace(/^[a-z0-9][a-z0-9_-]*::/, '');
+
+// Spoken words -> component ids, longest phrase first. lookup(start, len) returns the
+// ids the words in that span can mean, words that name none of the components in
+// relevant are ignored. Each entry of the result holds the ids a phrase can mean.
+function resolveComponents(wordCount, relevant, lookup) {
+  const resolved = [];
+  let i = 0;
+  while (i < wordCount) {
+    let matched = false;
+    for (let len = Math.min(maxPhraseWords, wordCount - i); len >= 1; len--) {
+      const ids = lookup(i, len).filter(id => relevant.has(id));
+      if (ids.length > 0) {
+        resolved.push(ids);
+        i += len;
+        matched = true;
+        break;
       }
     }
+    if (!matched) i++;
   }
-  return remember_match ? [needed, matches] : needed;
+  return resolved;
 }
 
-function get_possible_answers(currentChar) {
-  function getAllNames(name) {
-    let names = [name];
-    if (database[name] && Array.isArray(database[name].Aliases)) {
-      names = names.concat(database[name].Aliases);
+// Every component of the answer needs its own spoken phrase (small bipartite matching)
+function coversAnswer(resolved, answer) {
+  const owner = new Array(resolved.length).fill(-1);
+  function assign(slot, seen) {
+    for (let p = 0; p < resolved.length; p++) {
+      if (seen[p] || !resolved[p].includes(answer[slot])) continue;
+      seen[p] = true;
+      if (owner[p] === -1 || assign(owner[p], seen)) {
+        owner[p] = slot;
+        return true;
+      }
     }
-    names = extendWithPlurals(names);
-    return names;
+    return false;
   }
+  return answer.every((_, slot) => assign(slot, new Array(resolved.length).fill(false)));
+}
 
-  function expandComponentList(list) {
-    const options = list.map(getAllNames);
-    return options.reduce((a, b) => a.flatMap(d => b.map(e => d.concat([e]))), [[]]);
-  }
+function matchesAnswerIndex(key, wordCount, lookup) {
+  const answers = answerIndex.answers[key] || [];
+  const relevant = new Set(answers.flat());
+  const resolved = resolveComponents(wordCount, relevant, lookup);
 
-  let correctSets = [];
-  database[currentChar].expanded_components.forEach(set => {
-    correctSets = correctSets.concat(expandComponentList(set));
-  });
-  return correctSets;
+  // Fast path: every phrase is unambiguous and together they spell an accepted answer
+  if (resolved.every(ids => ids.length === 1)) {
+    if (!answerKeyCache[key]) answerKeyCache[key] = new Set(answers.map(a => a.join(',')));
+    const spoken = resolved.map(ids => ids[0]).sort((a, b) => a - b).join(',');
+    if (answerKeyCache[key].has(spoken)) return true;
+  }
+  // Otherwise (extra components or ambiguous aliases) check the few accepted answers
+  return answers.some(answer => coversAnswer(resolved, answer));
 }
 
+let lastCheck = { phonetic: false, override: false }; // how the last answer was graded, for the review log
+
 async function checkAnswer(userWords) {
-  const correctSets = get_possible_answers(currentChar);
+  const correctAnswer = database[currentChar].answer.map(keywordOf);
     database[currentChar].isFalseNegative = false;
+  lastCheck = { phonetic: false, override: false };
 
-  for (const set of correctSets) {
-    if (remove_a_from_b(userWords, set).length === 0) {
-      document.getElementById('result').innerText = '✅ Correct!';
-      await getNextAudio('Correct!');
-      return true;
-    }
+  const phraseLookup = (start, len) => answerIndex.phrases[stripPunct(userWords.slice(start, start + len).join(' '))] || [];
+  if (matchesAnswerIndex(currentChar, userWords.length, phraseLookup)) {
+    document.getElementById('result').innerText = '✅ Correct!';
+    await getNextAudio('Correct!');
+    return true;
   }
 
   if (secondaryCheck(userWords)) {
+    lastCheck.phonetic = true;
     document.getElementById('result').innerText = '✅ Secondary match found!';
     await getNextAudio('Correct!');
     return true;
   }
 
-  document.getElementById('result').innerText = `❌ \"${userWords.join(' ')}\" is incorrect. The correct answer is: ${correctSets[0].join(' ')}`;
+  document.getElementById('result').innerText = `❌ \"${userWords.join(' ')}\" is incorrect. The correct answer is: ${correctAnswer.join(' ')}`;
   document.getElementById('character-display').textContent = database[currentChar].hanzi;
 
-  await getNextAudio(`You said: ${userWords.join(', ')}. The correct answer is: ${correctSets[0].join(', and ')}. Were you correct?`);
+  await getNextAudio(`You said: ${userWords.join(', ')}. The correct answer is: ${correctAnswer.join(', and ')}. Were you correct?`);
   recognition.stop();
 
   const answer = await listenForYesOrNo();
   console.log(answer)
   if (answer == true) {
+    lastCheck.override = true;
     database[currentChar].isFalseNegative = true;
     database[currentChar].falseNegativeAnswer = userWords;
     return true;
@@ -463,14 +478,18 @@ async function checkAnswer(userWords) {
   return false;
 }
 
+// Phonetic fallback: the same lookup on the Double Metaphone codes that answer_index.py
+// precomputed for every name. Each spoken word may be heard as its primary or secondary code.
 function secondaryCheck(userWords) {
-  const correctSets = get_possible_answers(currentChar);
-  const inputCodes = userWords.map(word => doubleMetaphone(word)).flat();
+  if (!answerIndex.phonetic) return false;
+  const wordCodes = userWords.map(word => [...new Set(doubleMetaphone(stripPunct(word)).filter(Boolean))]);
 
-  for (let set of correctSets) {
-    set = set.map(word => doubleMetaphone(word)[0]);
-    const [missing] = remove_a_from_b(inputCodes, set, true);
-    if (missing.length === 0) return true;
+  function phoneticLookup(start, len) {
+    let keys = [''];
+    for (const codes of wordCodes.slice(start, start + len)) {
+      keys = keys.flatMap(k => codes.map(c => (k ? k + ' ' + c : c)));
+    }
+    return [...new Set(keys.flatMap(k => answerIndex.phonetic[k] || []))];
   }
-  return false;
+  return matchesAnswerIndex(currentChar, userWords.length, phoneticLookup);
 }
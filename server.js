@@ -2,68 +2,186 @@
 
 const express = require('express');
 const fs = require('fs');
-const path = require('path');
 const PORT = 3000;
-const quizStatusPath = path.join(__dirname, 'quiz_status.json');
 const https = require('https');
+const { sendCached } = require('./cachedResponse');
+const { DeckRegistry } = require('./decks');
 
 const app = express();
 
-const dbPath = path.join(__dirname, 'database.json');
+// Decks of decks.json, each one is loaded on its first request (see decks.js).
+// Every /api route exists once per deck under /api/decks/<id>/ and once for the
+// default deck under /api/, which is what the quiz uses without ?deck=.
+const registry = new DeckRegistry(__dirname);
 
-app.use(express.json());
-app.use(express.static(__dirname)); // Serve static files (HTML, JS, etc.)
+app.use(express.json({ limit: '50mb' })); // a full database upload is ~3 MB
 
-// Get database
-app.get('/api/database', (req, res) => {
-    fs.readFile(dbPath, 'utf8', (err, data) => {
-        if (err) return res.status(500).json({ error: 'Failed to read database.' });
-        // Create backup
-        const backupPath = path.join(__dirname, 'database_backup.json');
-        fs.writeFile(backupPath, data, backupErr => {
-            if (backupErr) console.error('Failed to create backup:', backupErr);
-        });
-        res.json(JSON.parse(data));
-    });
+app.get('/api/decks', (req, res) => {
+    res.json(registry.list());
+});
+
+const api = express.Router({ mergeParams: true });
+
+api.use((req, res, next) => {
+    req.deck = registry.get(req.params.deck);
+    if (!req.deck) return res.status(404).json({ error: `Unknown deck '${req.params.deck}', see /api/decks.` });
+    next();
+});
+
+api.get('/quiz', (req, res) => {
+    let payload;
+    try {
+        payload = req.deck.quizPayload();
+    } catch (err) {
+        return res.status(500).json({ error: 'Failed to read database.' });
+    }
+    sendCached(req, res, payload);
+});
+
+function sendAnswerIndex(req, res) {
+    let index;
+    try {
+        index = req.deck.answerIndex();
+    } catch (err) {
+        return res.status(404).json({ error: 'No answer index, run answer_index.py.' });
+    }
+    sendCached(req, res, index);
+}
+
+api.get('/answer_index.json', sendAnswerIndex);
+
+// Content build, its URL changes with the content so it can be cached forever
+api.get('/content', (req, res) => {
+    try {
+        req.deck.getDatabase();
+    } catch (err) {
+        return res.status(500).json({ error: 'Failed to read database.' });
+    }
+    res.json({ hash: req.deck.content.hash, url: `${req.baseUrl}/content/${req.deck.content.hash}` });
+});
+
+api.get('/content/:hash', (req, res) => {
+    try {
+        req.deck.getDatabase();
+    } catch (err) {
+        return res.status(500).json({ error: 'Failed to read database.' });
+    }
+    const content = req.deck.content;
+    if (req.params.hash !== content.hash) return res.status(404).json({ error: 'Outdated content, see /api/content.' });
+    sendCached(req, res, content, 'public, max-age=31536000, immutable');
+});
+
+// Scheduling state of every card
+api.get('/state', (req, res) => {
+    try {
+        req.deck.getDatabase();
+    } catch (err) {
+        return res.status(500).json({ error: 'Failed to read database.' });
+    }
+    res.json(req.deck.state);
 });
 
-// Update database (replace whole file)
-app.post('/api/database', (req, res) => {
-    fs.writeFile(dbPath, JSON.stringify(req.body, null, 2), err => {
-        if (err) return res.status(500).json({ error: 'Failed to write database.' });
+// Get database (content and state, the quiz itself only needs /api/quiz)
+api.get('/database', (req, res) => {
+    let database;
+    try {
+        database = req.deck.getDatabase();
+    } catch (err) {
+        return res.status(500).json({ error: 'Failed to read database.' });
+    }
+    req.deck.backupState();
+    res.json(database);
+});
+
+// Update database (whole database, only the state of the entries is stored)
+api.post('/database', async (req, res) => {
+    try {
+        await req.deck.updateEntries(req.body);
         res.json({ success: true });
-    });
+    } catch (err) {
+        res.status(500).json({ error: 'Failed to write database.' });
+    }
+});
+
+// Update many entries at once: body { key: fields, ... }, one write for all of them
+api.patch('/database', async (req, res) => {
+    try {
+        await req.deck.updateEntries(req.body);
+        res.json({ success: true, updated: Object.keys(req.body).length });
+    } catch (err) {
+        res.status(500).json({ error: 'Failed to write database.' });
+    }
 });
 
 // Update a single entry
-app.patch('/api/database/:key', (req, res) => {
-    fs.readFile(dbPath, 'utf8', (err, data) => {
-        if (err) return res.status(500).json({ error: 'Failed to read database.' });
-        let db = JSON.parse(data);
-        db[req.params.key] = req.body;
-        fs.writeFile(dbPath, JSON.stringify(db, null, 2), err => {
-            if (err) return res.status(500).json({ error: 'Failed to write database.' });
-            res.json({ success: true });
-        });
+api.patch('/database/:key', async (req, res) => {
+    try {
+        await req.deck.updateEntries({ [req.params.key]: req.body });
+        res.json({ success: true });
+    } catch (err) {
+        res.status(500).json({ error: 'Failed to write database.' });
+    }
+});
+
+// Next due cards, most overdue first: /api/due?limit=10
+api.get('/due', (req, res) => {
+    try {
+        req.deck.getDatabase();
+    } catch (err) {
+        return res.status(500).json({ error: 'Failed to read database.' });
+    }
+    const limit = parseInt(req.query.limit, 10);
+    res.json({ keys: req.deck.dueQueue.due(Date.now(), Number.isNaN(limit) ? Infinity : limit) });
+});
+
+// Append graded answers to the review log, one JSON record per line
+api.post('/reviews', (req, res) => {
+    const records = Array.isArray(req.body) ? req.body : [req.body];
+    // review_log.py groups the log by key, a record without one cannot be read back
+    if (!records.every(r => r && typeof r.key === 'string')) {
+        return res.status(400).json({ error: 'Every review needs a string key.' });
+    }
+    const lines = records.map(r => JSON.stringify({
+        t: r.t ?? Date.now(),
+        key: r.key,
+        pass: r.pass ? 1 : 0,
+        transcript: r.transcript ?? '',
+        phonetic: r.phonetic ? 1 : 0,
+        override: r.override ? 1 : 0,
+    }) + '\n').join('');
+    fs.appendFile(req.deck.reviewLogPath, lines, err => {
+        if (err) return res.status(500).json({ error: 'Failed to write review log.' });
+        res.json({ success: true });
     });
 });
 
 // Get last completed date
-app.get('/api/quiz-status', (req, res) => {
-    fs.readFile(quizStatusPath, 'utf8', (err, data) => {
+api.get('/quiz-status', (req, res) => {
+    fs.readFile(req.deck.quizStatusPath, 'utf8', (err, data) => {
         if (err) return res.status(500).json({ error: 'Failed to read quiz status.' });
         res.json(JSON.parse(data));
     });
 });
 
 // Update last completed date
-app.post('/api/quiz-status', (req, res) => {
-    fs.writeFile(quizStatusPath, JSON.stringify(req.body, null, 2), err => {
+api.post('/quiz-status', (req, res) => {
+    fs.writeFile(req.deck.quizStatusPath, JSON.stringify(req.body, null, 2), err => {
         if (err) return res.status(500).json({ error: 'Failed to write quiz status.' });
         res.json({ success: true });
     });
 });
 
+app.use('/api/decks/:deck', api);
+app.use('/api', api);
+
+// Answer index of the default deck at its old URL (it is also a file in the directory)
+app.get('/answer_index.json', (req, res) => {
+    req.deck = registry.get();
+    sendAnswerIndex(req, res);
+});
+
+app.use(express.static(__dirname)); // Serve static files (HTML, JS, etc.)
+
 /* app.listen(PORT, () => {
     console.log(`Server running at http://0.0.0.0:${PORT}/`);
 }); */
@@ -1,88 +1,123 @@
 
+import argparse
 import json
 import shutil
 import os
+from collections import ChainMap
+from database_store import DatabaseStore
+from deck_registry import DeckRegistry, database_filename, deck_argument
+from change_journal import ChangeJournal
+from suggestion_index import SuggestionIndex
 i = 0
 
+parser = argparse.ArgumentParser(description="Add the aliases of the components one by one")
+deck_argument(parser)
+args = parser.parse_args()
+registry = DeckRegistry()
+
 # Load your JSON file
-filename = "database.json"
+filename = registry.deck_path(args.deck, database_filename)
 backup_filename = filename + ".bak"
-progress_file = "progress.json"
+journal_file = registry.deck_path(args.deck, "aliases.journal")
+progress_file = registry.deck_path(args.deck, "progress.json") # only read once, older runs kept the cursor there
+
+compact_every = 25 # journal records after which they are written into the store
 
 # Make a backup before overwriting
 shutil.copy(filename, backup_filename)
 print(f"📂 Backup created: {backup_filename}")
 
-with open(filename, "r", encoding="utf-8") as f:
-    data = json.load(f)
+store = DatabaseStore(filename)
+journal = ChangeJournal(journal_file, cursor_name="alias_cursor")
+
 
+Sequenz_limit = registry.setting(args.deck, "sequenz_limit") # Limit up to which i aliases are added (None: all)
 
-Sequenz_limit = 1347 # Limit up to which i aliases are added
+
+def check_alias(key, alias, index):
+    """Warn if alias is (almost) the keyword or alias of another character, then index it."""
+    clashes = [other for other in index.lookup(alias) if other != key]
+    if clashes:
+        print(f"⚠️ '{alias}' is already used for: {', '.join(clashes)}")
+    else:
+        similar = [f"{other} ({name})" for other, name, _ in index.matches(alias, cutoff=0.85) if other != key]
+        if similar:
+            print(f"⚠️ '{alias}' is close to: {', '.join(similar)}")
+    index.add(key, alias)
 
 
-# Load progress
-start_index = 0
-if os.path.exists(progress_file):
+# Load progress (a journal left over from a crashed run is applied first)
+start_index = journal.compact(store)
+if start_index is None and os.path.exists(progress_file):
     with open(progress_file, "r", encoding="utf-8") as pf:
-        progress = json.load(pf)
-        start_index = progress.get("last_index", 0)
-        print(f"▶️ Resuming from index {start_index}")
+        start_index = json.load(pf).get("last_index", 0)
+if start_index is None:
+    start_index = 0
+else:
+    print(f"▶️ Resuming from index {start_index}")
+
+view = store.view()
+data = ChainMap({}, view) # edited entries as dicts over the compiled deck
+index = SuggestionIndex(data, lazy=True) # keywords and aliases, to catch clashes while typing (built on first use)
 
-# Step 1: Collect all component references
-used_components = set()
-for entry in data.values():
-    for comp_group in entry.get("primary_components", []):
-        for comp in comp_group:
-            used_components.add(comp)
+# Step 1: Collect all component references (straight from the deck, only aliases are edited here)
+used_components = view.strings("primary_components")
 
 # Step 2: Only check elements that appear in components elsewhere
 keys = list(data.keys())
 i = start_index
-while i < len(keys) and i<Sequenz_limit:
-    key = keys[i]
-    entry = data[key]
-
-    if key not in used_components:
-        print(f"⏩ Skipping {key} (not used as a component)")
-        i += 1
-        continue
-
-    print(f"Word: {key}")
-    print(f"Hanzi: {entry['hanzi']}")
-    print(f"Current Aliases: {entry.get('Aliases', [])}")
-    
-    user_input = input("Enter aliases (comma-separated), 'redo' to repeat, or Enter to skip: ").strip()
-
-    if user_input.lower() == "redo":
-        print("🔄 Redo requested. Will repeat this entry next time.")
-        # Move progress back one step (but not below 0)
-        i = max(i - 2, 0)
-        with open(progress_file, "w", encoding="utf-8") as pf:
-            json.dump({"last_index": i}, pf)
-        break  # Exit so next run starts at this element again
-
-    elif user_input.lower().startswith("new: "):
-        new_value = user_input[5:].strip()
-        if new_value:
-            entry["Aliases"] = [new_value]
-            print(f"🆕 Aliases overwritten: {entry['Aliases']}")
+try:
+    while i < len(keys) and (Sequenz_limit is None or i<Sequenz_limit):
+        key = keys[i]
+        entry = data[key] = dict(data[key]) # editable copy
+
+        if key not in used_components:
+            print(f"⏩ Skipping {key} (not used as a component)")
+            i += 1
+            continue
+
+        print(f"Word: {key}")
+        print(f"Hanzi: {entry['hanzi']}")
+        print(f"Current Aliases: {entry.get('Aliases', [])}")
+
+        user_input = input("Enter aliases (comma-separated), 'redo' to repeat, or Enter to skip: ").strip()
+
+        if user_input.lower() == "redo":
+            print("🔄 Redo requested. Will repeat this entry next time.")
+            # Move progress back one step (but not below 0)
+            i = max(i - 2, 0)
+            journal.append(i)
+            break  # Exit so next run starts at this element again
+
+        elif user_input.lower().startswith("new: "):
+            new_value = user_input[5:].strip()
+            if new_value:
+                check_alias(key, new_value, index)
+                entry["Aliases"] = [new_value]
+                print(f"🆕 Aliases overwritten: {entry['Aliases']}")
+            else:
+                print("⚠️ No value provided after 'new:', skipping.")
+
+        elif user_input:
+            aliases_list = [alias.strip() for alias in user_input.split(",") if alias.strip()]
+            for alias in aliases_list:
+                check_alias(key, alias, index)
+            entry["Aliases"].extend(aliases_list)
+            print(f"✅ Updated Aliases: {entry['Aliases']}")
         else:
-            print("⚠️ No value provided after 'new:', skipping.")
-
-    elif user_input:
-        aliases_list = [alias.strip() for alias in user_input.split(",") if alias.strip()]
-        entry["Aliases"].extend(aliases_list)
-        print(f"✅ Updated Aliases: {entry['Aliases']}")
-    else:
-        print("Skipped.")
-
-    print("-" * 40)
+            print("Skipped.")
 
-    # Save progress and data after each step
-    i += 1
-    with open(progress_file, "w", encoding="utf-8") as pf:
-        json.dump({"last_index": i}, pf)
-    with open(filename, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+        print("-" * 40)
 
-print(f"✅ Progress saved in {progress_file}, file updated: {filename}")
+        # Journal progress and data after each step
+        i += 1
+        journal.append(i, key, {"Aliases": entry.get("Aliases", [])})
+        if journal.pending >= compact_every:
+            journal.compact(store)
+finally:
+    journal.append(i) # also keeps the cursor for skipped entries at the end
+    journal.compact(store)
+    store.export()
+    store.close()
+
+print(f"✅ Progress saved (index {i}), file updated: {filename}")
@@ -0,0 +1,109 @@
+import difflib
+from collections import Counter, defaultdict
+from heapq import nlargest
+from itertools import chain
+
+#Typo tolerant lookup of keywords and aliases for the interactive scripts.
+#Every keyword and alias is split into trigrams once and an inverted index
+#trigram -> names is kept. A query only counts the trigrams it shares with the
+#names in its posting lists. Only the few best candidates by trigram overlap are
+#then ranked with difflib's ratio (which also handles swapped letters), instead of
+#running difflib over every key on every typo. A match on an alias suggests the
+#keyword the alias belongs to.
+#With lazy=True nothing is read before the first lookup, so an interactive script
+#only pays for the index once the user actually types a name.
+
+
+def trigrams(text):
+    """Trigrams of a name, padded so that short names and word starts count too."""
+    padded = f"  {text.strip().lower()} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SuggestionIndex:
+    """
+    Suggestion index over the keywords and aliases of a database.
+
+    database: The JSON database (keyword -> entry), more names can be added with add()
+    lazy: Index the database on first use instead of right away
+    """
+
+    def __init__(self, database=None, lazy=False):
+        self.names = []                   # name per id
+        self.keywords = []                # keyword the name belongs to, per id
+        self.sizes = []                   # number of trigrams, per id
+        self.postings = defaultdict(list) # trigram -> ids
+        self.exact = defaultdict(list)    # lower case name -> keywords
+        self._database = database
+        if not lazy:
+            self._build()
+
+    def _build(self):
+        database, self._database = self._database, None
+        if database is not None:
+            for key, entry in database.items():
+                self._add(key, key)
+                for alias in entry.get("Aliases", []):
+                    self._add(key, alias)
+
+    def add(self, keyword, name):
+        """Make keyword findable under name (its own keyword or an alias)."""
+        self._build()
+        self._add(keyword, name)
+
+    def _add(self, keyword, name):
+        lower = name.strip().lower()
+        if not lower or keyword in self.exact[lower]:
+            return
+        self.exact[lower].append(keyword)
+        id_ = len(self.names)
+        grams = trigrams(lower)
+        self.names.append(name)
+        self.keywords.append(keyword)
+        self.sizes.append(len(grams))
+        for gram in grams:
+            self.postings[gram].append(id_)
+
+    def lookup(self, text):
+        """Keywords that have text (case insensitive) as keyword or alias."""
+        self._build()
+        return list(self.exact.get(text.strip().lower(), []))
+
+    def matches(self, text, n=3, cutoff=0.6, candidates=10):
+        """
+        Ranked (keyword, matched name, score) for text, best first, one per keyword.
+        score is difflib's ratio (like get_close_matches), it is only computed for
+        the candidates names with the most shared trigrams.
+        """
+        self._build()
+        query = text.strip().lower()
+        grams = trigrams(query)
+        shared = Counter(chain.from_iterable(self.postings[gram] for gram in grams if gram in self.postings))
+        if not shared:
+            return []
+        # Dice coefficient of the trigrams as pre-filter, names sharing less than
+        # half of the best overlap are not considered at all
+        floor = shared.most_common(1)[0][1] / 2
+        top = nlargest(candidates, [id_ for id_, count in shared.items() if count >= floor],
+                       key=lambda id_: shared[id_] / (len(grams) + self.sizes[id_]))
+        best = {}
+        matcher = difflib.SequenceMatcher()
+        matcher.set_seq2(query)
+        for id_ in top:
+            matcher.set_seq1(self.names[id_].lower())
+            if matcher.real_quick_ratio() < cutoff or matcher.quick_ratio() < cutoff:
+                continue
+            score = matcher.ratio()
+            if score < cutoff:
+                continue
+            keyword = self.keywords[id_]
+            # Prefer a match on the keyword itself over an equally good alias
+            rank = (score, self.names[id_] == keyword)
+            if keyword not in best or rank > best[keyword][1]:
+                best[keyword] = (self.names[id_], rank)
+        ranked = sorted(best.items(), key=lambda item: (-item[1][1][0], not item[1][1][1], item[0]))
+        return [(keyword, name, rank[0]) for keyword, (name, rank) in ranked[:n]]
+
+    def suggest(self, text, n=3, cutoff=0.6):
+        """Keywords closest to text, best first (same use as difflib.get_close_matches)."""
+        return [keyword for keyword, _, _ in self.matches(text, n, cutoff)]
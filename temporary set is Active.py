@@ -1,39 +1,51 @@
+import argparse
 import json
 import shutil
 import os
+from database_store import DatabaseStore
+from change_journal import ChangeJournal
+from deck_registry import DeckRegistry, database_filename, deck_argument
 
-# File paths
-filename = "database.json"
+parser = argparse.ArgumentParser(description="Deactivate the cards the alias script has not reached yet")
+deck_argument(parser)
+args = parser.parse_args()
+registry = DeckRegistry()
+
+# File paths (the ones of set aliases.py for the same deck)
+filename = registry.deck_path(args.deck, database_filename)
 backup_filename = filename + ".bak"
-progress_file = "progress.json"
+journal_file = registry.deck_path(args.deck, "aliases.journal")
+progress_file = registry.deck_path(args.deck, "progress.json") # only read if the store has no cursor yet
 
 # Make a backup before overwriting
 if not os.path.exists(backup_filename):
     shutil.copy(filename, backup_filename)
     print(f"📂 Backup created: {backup_filename}")
 
-# Load progress
-if not os.path.exists(progress_file):
-    print("❌ No progress.json found. Run the alias script first.")
+# Load data and progress (the cursor is kept in the store by the alias script)
+store = DatabaseStore(filename)
+last_index = ChangeJournal(journal_file, cursor_name="alias_cursor").compact(store)
+if last_index is None and os.path.exists(progress_file):
+    with open(progress_file, "r", encoding="utf-8") as pf:
+        last_index = json.load(pf).get("last_index", 0)
+if last_index is None:
+    print("❌ No alias progress found. Run the alias script first.")
+    store.close()
     exit(1)
-
-with open(progress_file, "r", encoding="utf-8") as pf:
-    progress = json.load(pf)
-    last_index = progress.get("last_index", 0)
-    print(f"▶️ Last edited index: {last_index}")
-
-# Load data
-with open(filename, "r", encoding="utf-8") as f:
-    data = json.load(f)
+print(f"▶️ Last edited index: {last_index}")
 
 # Deactivate items beyond last_index
-keys = list(data.keys())
+keys = store.keys()
 for i, key in enumerate(keys):
     if i >= last_index:
-        data[key]["isActive"] = False
+        entry = store.get(key)
+        if entry["isActive"]:
+            entry["isActive"] = False
+            store.put(key, entry)
 
 # Save changes
-with open(filename, "w", encoding="utf-8") as f:
-    json.dump(data, f, ensure_ascii=False, indent=2)
+store.commit()
+store.export()
+store.close()
 
 print(f"✅ All items from index {last_index} onward have isActive = false. Updated file: {filename}")
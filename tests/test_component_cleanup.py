@@ -0,0 +1,47 @@
+from component_cleanup import apply_rules, clean_implied, load_rules
+
+
+def entry(*group):
+    return {"primary_components": [list(group)]}
+
+
+def test_clean_implied_leaves_circular_entries_alone():
+    database = {
+        "factory": entry("factory"),
+        "mouth": entry("mouth"),
+        "hall": entry("hall", "factory"),        # refers to itself
+        "yin": entry("yang", "mouth"),           # yin <-> yang
+        "yang": entry("yin"),
+        "roar": entry("mouth", "yin"),           # a member of a cycle
+        "word": entry("mouth", "tongue"),
+        "tongue": entry("mouth"),
+        "speak": entry("word", "mouth"),
+    }
+    modified, skipped = clean_implied(database, field="primary_components")
+
+    assert modified == ["word", "speak"]
+    assert skipped == ["hall", "yin", "yang", "roar"]
+    assert database["hall"]["primary_components"] == [["hall", "factory"]]
+    assert database["roar"]["primary_components"] == [["mouth", "yin"]]
+    assert database["speak"]["primary_components"] == [["word"]]
+    assert database["word"]["primary_components"] == [["tongue"]]
+
+
+def test_apply_rules_rewrites_primary_components(tmp_path):
+    rules_path = tmp_path / "rules.tsv"
+    rules_path.write_text("# redundant<TAB>implying\none\ttwo\nmouth\tsay\n", encoding="utf-8")
+    database = {
+        "two": entry("one", "one"),
+        "three": entry("one", "two"),
+        "speak": {"primary_components": [["mouth", "say"], ["say", "mouth"]]},
+        "say": entry("mouth", "tongue"),
+    }
+    rules = load_rules(rules_path)
+    hits, modified = apply_rules(database, rules)
+
+    assert rules == [("one", "two"), ("mouth", "say")]
+    assert hits == [1, 1]
+    assert modified == ["three", "speak"]
+    assert database["three"]["primary_components"] == [["two"]]
+    assert database["speak"]["primary_components"] == [["say"]]  # the duplicate group is gone
+    assert database["say"]["primary_components"] == [["mouth", "tongue"]]
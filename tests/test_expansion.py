@@ -0,0 +1,42 @@
+import time
+
+from expansion import Expander
+
+
+def diamond_chain(levels):
+    """levels diamonds on top of each other, every level shares the one below twice."""
+    database = {"bottom": {"primary_components": [["bottom"]]}, "stroke": {"primary_components": [["stroke"]]}}
+    below = "bottom"
+    for level in range(levels):
+        left, right, top = f"left{level}", f"right{level}", f"top{level}"
+        database[left] = {"primary_components": [[below]]}
+        database[right] = {"primary_components": [[below, "stroke"]]}
+        database[top] = {"primary_components": [[left, right]]}
+        below = top
+    return database, below
+
+
+def test_topological_order_lists_shared_nodes_once():
+    database, top = diamond_chain(20)
+    order = Expander(database).topological_order(top)
+    assert len(order) == len(database)
+    assert len(set(order)) == len(database)
+    assert order[-1] == top
+
+
+def test_answers_of_a_diamond_chain():
+    database, top = diamond_chain(3)
+    expander = Expander(database)
+    assert expander.answer_set("top0") == {("left0", "right0"), ("bottom", "right0"), ("left0", "bottom", "stroke"),
+                                           ("bottom", "bottom", "stroke")}
+    assert len(expander.answer_set(top)) <= expander.count_answers(top)
+
+
+def test_count_answers_of_a_deep_diamond_chain_is_linear():
+    database, top = diamond_chain(200)
+    expander = Expander(database)
+    start = time.perf_counter()
+    expander.count_answers("top12")
+    assert time.perf_counter() - start < 1.0
+    order = expander.topological_order(top, {})
+    assert len(order) == len(database)
@@ -0,0 +1,14 @@
+import numpy as np
+
+import fsrs
+
+
+def test_replay_and_fit_without_reviews(tmp_path):
+    log = tmp_path / "reviews.jsonl"
+    log.write_text("")
+    history = fsrs.ReviewHistory.from_file(str(log))
+
+    assert history.reviews == 0
+    loss, stability, difficulty = fsrs.replay(fsrs.DEFAULT_PARAMETERS, history)
+    assert loss == 0.0 and len(stability) == 0 and len(difficulty) == 0
+    assert np.allclose(fsrs.fit(history, iterations=3), fsrs.DEFAULT_PARAMETERS)
@@ -0,0 +1,17 @@
+from review_log import read_review_log
+
+
+def test_missing_log_is_empty(tmp_path):
+    log = read_review_log(str(tmp_path / "reviews.jsonl"))
+    assert len(log) == 0 and log.keys == []
+
+
+def test_records_without_key_and_torn_lines_are_skipped(tmp_path):
+    path = tmp_path / "reviews.jsonl"
+    path.write_text('{"t": 1000, "key": "one", "pass": 1}\n'
+                    '{"t": 2000, "pass": 1}\n'
+                    '[1, 2]\n'
+                    '{"t": 3000, "key": "two", "pa', encoding="utf-8")
+    log = read_review_log(str(path))
+    assert log.keys == ["one"]
+    assert log.time.tolist() == [1.0]